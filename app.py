@@ -1,6 +1,12 @@
 import rumps
-from record import MouseRecorder, StatusBarApp, setup_logging
-from play import MousePlayer, check_accessibility_permissions
+from record import MouseRecorder, StatusBarApp
+from logging_setup import setup_logging
+from play import DEFAULT_CATCH_UP, MousePlayer, check_accessibility_permissions
+from stats import format_summary, read_snapshot
+from library import RecordingLibrary
+from playlist import Playlist, PlaylistEntry
+from hotkey import DEFAULT_STOP_HOTKEY, StopHotkey
+from segments import recover_segments
 import threading
 from AppKit import NSApplication
 import os
@@ -8,6 +14,15 @@ import sys
 from pathlib import Path
 import logging
 
+# Speed factors offered in the Playback Speed menu
+SPEED_CHOICES = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+# Longest pause between events when idle compression is on, seconds
+IDLE_GAP = 0.5
+# Output rates offered in the Smooth Playback menu, Hz
+OUTPUT_RATES = (120, 240)
+# Most recent recordings listed in the Recordings menu
+RECORDINGS_MENU_LIMIT = 20
+
 def get_resource_path(filename):
     """Get the correct path for a resource file, whether running from source or in a bundle."""
     if getattr(sys, 'frozen', False):
@@ -31,8 +46,11 @@ class AutoMouseApp(rumps.App):
         super().__init__("", icon=icon_path)  # Empty title initially, will be set based on state
         
         self.status_app = StatusBarApp()
-        self.recorder = MouseRecorder(self.status_app)
+        self.recorder = MouseRecorder(self.status_app, streaming=True)
         self.player = MousePlayer()
+        # Rebuild recordings from segments a crashed session left behind; once, before anything records
+        self.recovered_recordings = recover_segments(self.player.recording_file.parent)
+        self.library = RecordingLibrary(self.player.recording_file.parent)
         self.is_playing = False  # Track playback state
         self._ui_update_timer = None  # Instance variable for UI update timer
         
@@ -40,6 +58,27 @@ class AutoMouseApp(rumps.App):
         self.record_button = rumps.MenuItem("Start Recording", callback=self.toggle_recording)
         self.play_button = rumps.MenuItem("Play Recording", callback=self.play_recording)
         self.repeat_play_button = rumps.MenuItem("Repeat Play...", callback=self.repeat_play)
+        self.stop_play_button = rumps.MenuItem("Stop Playback")  # Enabled only while playing
+        self.stop_hotkey = StopHotkey(self.stop_playback, DEFAULT_STOP_HOTKEY)
+        self.hotkey_button = rumps.MenuItem(f"Stop Hotkey: {self.stop_hotkey.hotkey}", callback=self.set_stop_hotkey)
+        self.speed_menu = rumps.MenuItem("Playback Speed")
+        for speed in SPEED_CHOICES:
+            item = rumps.MenuItem(f"{speed:g}x", callback=self.set_speed)
+            item.state = speed == self.player.speed
+            self.speed_menu.add(item)
+        self.idle_button = rumps.MenuItem("Compress Idle Gaps", callback=self.toggle_idle_compression)
+        self.clicks_only_button = rumps.MenuItem("Clicks Only", callback=self.toggle_clicks_only)
+        self.catch_up_button = rumps.MenuItem("Catch Up When Late", callback=self.toggle_catch_up)
+        self.precision_button = rumps.MenuItem("Precision Playback", callback=self.toggle_precision)
+        self.smooth_menu = rumps.MenuItem("Smooth Playback")
+        off = rumps.MenuItem("Off", callback=self.set_output_rate)
+        off.state = True
+        self.smooth_menu.add(off)
+        for rate in OUTPUT_RATES:
+            self.smooth_menu.add(rumps.MenuItem(f"{rate} Hz", callback=self.set_output_rate))
+        self.curved_button = rumps.MenuItem("Curved Paths", callback=self.toggle_curved_paths)
+        self.recordings_menu = rumps.MenuItem("Recordings")
+        self.stats_button = rumps.MenuItem("Session Stats", callback=self.show_stats)
         self.about_button = rumps.MenuItem("About", callback=self.show_about)
         
         # Add items to menu (no need for quit, rumps adds it automatically)
@@ -47,21 +86,62 @@ class AutoMouseApp(rumps.App):
             self.record_button,
             self.play_button,
             self.repeat_play_button,
+            self.stop_play_button,
+            self.recordings_menu,
+            None,
+            self.speed_menu,
+            self.idle_button,
+            self.clicks_only_button,
+            self.catch_up_button,
+            self.precision_button,
+            self.smooth_menu,
+            self.curved_button,
+            self.hotkey_button,
             None,
+            self.stats_button,
             self.about_button
         ]
         
         # Initially disable play buttons if no recording exists
         self.update_play_buttons()
+        self.update_recordings_menu()
+        self.stop_hotkey.start()
         logging.info("AutoMouseApp initialization complete")
 
+    def has_recording(self):
+        """Whether the selected recording exists; answered from the recording cache when possible."""
+        path = self.player.recording_file
+        return self.player.recording_cache.known(path) or path.exists()
+
     def update_play_buttons(self):
         """Enable/disable play buttons based on recording existence."""
-        has_recording = self.player.recording_file.exists()
+        has_recording = self.has_recording()
         logging.info(f"Updating play buttons, recording exists: {has_recording}")
         self.play_button.set_callback(self.play_recording if has_recording else None)
         self.repeat_play_button.set_callback(self.repeat_play if has_recording else None)
 
+    def update_recordings_menu(self):
+        """List the most recent recordings from the library index."""
+        self.library.refresh()
+        if self.recordings_menu.values():
+            self.recordings_menu.clear()
+        for row in self.library.list(limit=RECORDINGS_MENU_LIMIT):
+            item = rumps.MenuItem(
+                f"{row['name']} ({row['duration']:.1f} s, {row['clicks']} clicks)",
+                callback=self.select_recording,
+            )
+            item.path = row['path']
+            item.state = row['path'] == str(self.player.recording_file)
+            self.recordings_menu.add(item)
+
+    def select_recording(self, sender):
+        """Play the chosen recording from now on."""
+        self.player.recording_file = Path(sender.path)
+        for item in self.recordings_menu.values():
+            item.state = item is sender
+        logging.info(f"Selected recording {sender.path}")
+        self.update_play_buttons()
+
     def schedule_ui_update(self, update_func):
         """Schedule a UI update to run on the main thread."""
         # Stop previous timer if it exists
@@ -114,13 +194,15 @@ class AutoMouseApp(rumps.App):
             self.recorder.start_recording()
         else:
             logging.info("Stopping recording")
-            # Remove the last click event before stopping
-            self.recorder.remove_last_click()
             self.title = ""  # Remove indicator when not recording
             self.record_button.title = "Start Recording"
-            self.recorder.stop_recording()
+            # Drop the click that stopped the recording before saving
+            self.recorder.stop_recording(trim_last_click=True)
+            # A new recording is what plays next
+            self.player.recording_file = self.recorder.recording_file
             # Update play buttons state after recording
             self.update_play_buttons()
+            self.update_recordings_menu()
 
     def reset_ui_state(self, _=None):
         """Reset the UI state after playback."""
@@ -128,8 +210,9 @@ class AutoMouseApp(rumps.App):
         
         def do_reset():
             self.is_playing = False
+            self.stop_play_button.set_callback(None)
             self.title = ""  # Clear the play icon
-            has_recording = self.player.recording_file.exists()
+            has_recording = self.has_recording()
             if has_recording:
                 self.play_button.set_callback(self.play_recording)
                 self.repeat_play_button.set_callback(self.repeat_play)
@@ -148,7 +231,7 @@ class AutoMouseApp(rumps.App):
         if not self.check_permissions():
             return
             
-        if not self.player.recording_file.exists():
+        if not self.has_recording():
             logging.warning("No recording file exists")
             rumps.alert("Error", "Please record something first.")
             return
@@ -158,6 +241,7 @@ class AutoMouseApp(rumps.App):
         self.is_playing = True
         self.play_button.set_callback(None)
         self.repeat_play_button.set_callback(None)
+        self.stop_play_button.set_callback(self.stop_playback)
         
         # Set play emoji immediately on main thread
         self.title = "▶️"
@@ -196,7 +280,7 @@ class AutoMouseApp(rumps.App):
         if not self.check_permissions():
             return
             
-        if not self.player.recording_file.exists():
+        if not self.has_recording():
             rumps.alert("Error", "Please record something first.")
             return
 
@@ -218,29 +302,37 @@ class AutoMouseApp(rumps.App):
                     self.is_playing = True
                     self.play_button.set_callback(None)
                     self.repeat_play_button.set_callback(None)
+                    self.stop_play_button.set_callback(self.stop_playback)
                     
                     # Set initial play emoji immediately on main thread
                     self.title = f"▶️ [1/{repeat_count}]"
                     
+                    def update_title(entry_index, run, repeats):
+                        if run > 1:  # Skip first update since we set it above
+                            def set_title():
+                                self.title = f"▶️ [{run}/{repeats}]"
+                            self.schedule_ui_update(set_title)
+
                     def play_thread():
                         try:
-                            for i in range(repeat_count):
-                                if i > 0:  # Skip first update since we set it above
-                                    def update_title(i=i):
-                                        self.title = f"▶️ [{i+1}/{repeat_count}]"
-                                    self.schedule_ui_update(update_title)
-                                
-                                success, error_msg = self.player.play_recording()
-                                if not success:  # If playback was interrupted
-                                    def show_error():
-                                        print("Showing error during repeat")  # Debug log
-                                        if error_msg:
-                                            rumps.alert("Error", error_msg)
-                                        self.reset_ui_state()
-                                    self.schedule_ui_update(show_error)
-                                    break
-                            
-                            if success:  # Only reset if we completed successfully
+                            # The playlist compiles the recording once and reuses it for every run
+                            playlist = Playlist(
+                                self.player,
+                                [PlaylistEntry(self.player.recording_file, repeat_count)],
+                                on_progress=update_title,
+                            )
+                            self.player.reset_stats()
+                            success, error_msg = playlist.run()
+                            self.player.save_stats()
+
+                            if not success:  # If playback was interrupted
+                                def show_error():
+                                    print("Showing error during repeat")  # Debug log
+                                    if error_msg:
+                                        rumps.alert("Error", error_msg)
+                                    self.reset_ui_state()
+                                self.schedule_ui_update(show_error)
+                            else:
                                 self.reset_ui_state()
                         
                         except Exception as e:
@@ -258,6 +350,75 @@ class AutoMouseApp(rumps.App):
             except ValueError:
                 rumps.alert("Error", "Please enter a valid number")
 
+    def stop_playback(self, _=None):
+        """Stop playback; also called from the global hotkey's thread."""
+        if not self.is_playing:
+            return
+        self.player.stop()
+
+    def set_stop_hotkey(self, sender):
+        window = rumps.Window(
+            message="Enter the global shortcut that stops playback, e.g. <ctrl>+<alt>+x:",
+            title="Stop Hotkey",
+            default_text=self.stop_hotkey.hotkey,
+            dimensions=(200, 20),
+            ok="Save",
+            cancel="Cancel"
+        )
+        NSApplication.sharedApplication().activateIgnoringOtherApps_(True)
+        response = window.run()
+        if not response.clicked:
+            return
+        success, error_msg = self.stop_hotkey.set_hotkey(response.text.strip())
+        if not success:
+            rumps.alert("Error", error_msg)
+            return
+        sender.title = f"Stop Hotkey: {self.stop_hotkey.hotkey}"
+        logging.info(f"Stop hotkey set to {self.stop_hotkey.hotkey}")
+
+    def set_speed(self, sender):
+        self.player.speed = float(sender.title.rstrip('x'))
+        for item in self.speed_menu.values():
+            item.state = item is sender
+        logging.info(f"Playback speed set to {self.player.speed}x")
+
+    def toggle_idle_compression(self, sender):
+        sender.state = not sender.state
+        self.player.max_gap = IDLE_GAP if sender.state else None
+        logging.info(f"Idle compression {'on' if sender.state else 'off'}")
+
+    def toggle_clicks_only(self, sender):
+        sender.state = not sender.state
+        self.player.clicks_only = bool(sender.state)
+        logging.info(f"Clicks only playback {'on' if sender.state else 'off'}")
+
+    def toggle_catch_up(self, sender):
+        sender.state = not sender.state
+        self.player.catch_up_after = DEFAULT_CATCH_UP if sender.state else None
+        logging.info(f"Catch-up playback {'on' if sender.state else 'off'}")
+
+    def toggle_precision(self, sender):
+        sender.state = not sender.state
+        self.player.precision = bool(sender.state)
+        logging.info(f"Precision playback {'on' if sender.state else 'off'}")
+
+    def set_output_rate(self, sender):
+        self.player.output_rate = None if sender.title == "Off" else int(sender.title.split()[0])
+        for item in self.smooth_menu.values():
+            item.state = item is sender
+        logging.info(f"Playback output rate set to {self.player.output_rate}")
+
+    def toggle_curved_paths(self, sender):
+        sender.state = not sender.state
+        self.player.interpolation = 'catmull-rom' if sender.state else 'linear'
+        logging.info(f"Playback interpolation set to {self.player.interpolation}")
+
+    def show_stats(self, sender):
+        """Show counters and latencies of the last recording and playback."""
+        summary = format_summary(read_snapshot(self.player.recording_file))
+        NSApplication.sharedApplication().activateIgnoringOtherApps_(True)
+        rumps.alert("Session Stats", summary)
+
     def show_about(self, sender):
         window = rumps.Window(
             message="RecMouse lets you record and replay mouse movements.\nVersion 1.0\nCreated with ❤️\n\nrecmouse.com",
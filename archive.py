@@ -0,0 +1,277 @@
+"""Seekable, block-compressed recording archives (``.rmz``).
+
+An archive holds the same columns as a ``.rmrec`` file, cut into blocks of
+``BLOCK_EVENTS`` events that are compressed one by one:
+
+- time, x and y are stored as deltas between the int64 bit patterns of
+  consecutive float64 values, which is exactly reversible; bytes are then
+  grouped by significance, so the mostly zero high bytes of small deltas
+  compress well
+- each block starts from zero, so it decodes on its own
+- a footer index lists every block's first timestamp and file offset
+
+Reading a section therefore costs a binary search of the index and
+decompressing only the blocks that overlap it, however long the recording
+is. Layout::
+
+    ARCHIVE_HEADER, button table (JSON), block, ..., block,
+    INDEX_ENTRY per block, TRAILER
+"""
+import json
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, chain
+from operator import sub
+from pathlib import Path
+from recording_format import (
+    ARCHIVE_MAGIC,
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    Recording,
+    RecordingFormatError,
+    is_archive,
+    load_recording,
+    time_range,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ARCHIVE_VERSION = 1
+BLOCK_EVENTS = 4096  # Events per compressed block
+
+CODECS = {'zlib': 1, 'lzma': 2}
+DEFAULT_CODEC = 'zlib'
+
+# magic, version, flags, event count, button table length, codec
+ARCHIVE_HEADER = struct.Struct('<5sBHQIB')
+# first timestamp, first event index, file offset, compressed size, event count
+INDEX_ENTRY = struct.Struct('<dQQII')
+# index offset, block count, duration, CRC-32 of the index, magic
+TRAILER = struct.Struct('<QIdI5s')
+
+_WRAP = 1 << 64
+_HALF = 1 << 63
+
+
+def _compressor(codec):
+    if codec == 'zlib':
+        return zlib.compress, zlib.decompress
+    if codec == 'lzma':
+        import lzma
+        return lzma.compress, lzma.decompress
+    raise ValueError(f"Unknown codec {codec!r}, expected one of {tuple(CODECS)}")
+
+
+def _shuffle(data, width=8):
+    """Group the bytes of ``width``-byte values by position: all first bytes, then all second..."""
+    return b''.join(data[k::width] for k in range(width))
+
+
+def _unshuffle(data, width=8):
+    count = len(data) // width
+    out = bytearray(len(data))
+    for k in range(width):
+        out[k::width] = data[k * count:(k + 1) * count]
+    return out
+
+
+def _encode_floats(column):
+    """Deltas of the int64 bit patterns of a float64 column, shuffled."""
+    if np is not None:
+        bits = np.frombuffer(column, dtype='<i8')
+        return _shuffle(np.diff(bits, prepend=np.int64(0)).tobytes())  # Wraps around like the decoder
+    bits = array('q')
+    bits.frombytes(column)
+    deltas = array('q', ((d + _HALF) % _WRAP - _HALF for d in map(sub, bits, chain((0,), bits))))
+    return _shuffle(deltas.tobytes())
+
+
+def _decode_floats(data):
+    raw = bytes(_unshuffle(data))
+    values = array('d')
+    if np is not None:
+        values.frombytes(np.cumsum(np.frombuffer(raw, dtype='<i8'), dtype=np.int64).tobytes())
+        return values
+    deltas = array('q')
+    deltas.frombytes(raw)
+    values.frombytes(array('q', ((v + _HALF) % _WRAP - _HALF for v in accumulate(deltas))).tobytes())
+    return values
+
+
+def _encode_block(recording, start, stop):
+    parts = []
+    for name in FLOAT_COLUMNS:
+        parts.append(_encode_floats(memoryview(getattr(recording, name))[start:stop].cast('B')))
+    for name in BYTE_COLUMNS:
+        parts.append(memoryview(getattr(recording, name))[start:stop].tobytes())
+    return b''.join(parts)
+
+
+def save_archive(recording, path, codec=DEFAULT_CODEC, block_events=BLOCK_EVENTS):
+    """Write ``recording`` to ``path`` as an archive, renamed into place once complete."""
+    compress, _ = _compressor(codec)
+    path = Path(path)
+    count = len(recording)
+    table = json.dumps(list(recording.button_names)).encode('utf-8')
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, recording.flags, count, len(table),
+                                        CODECS[codec]))
+            f.write(table)
+            index = []
+            for start in range(0, count, block_events):
+                stop = min(start + block_events, count)
+                data = compress(_encode_block(recording, start, stop))
+                index.append(INDEX_ENTRY.pack(recording.times[start], start, f.tell(), len(data), stop - start))
+                f.write(data)
+            blocks = len(index)
+            index = b''.join(index)
+            index_offset = f.tell()
+            f.write(index)
+            f.write(TRAILER.pack(index_offset, blocks, recording.duration, zlib.crc32(index), ARCHIVE_MAGIC))
+        os.replace(tmp_path, path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class Archive:
+    """An open archive that decompresses blocks on demand.
+
+    Usage:
+        with Archive('long.rmz') as archive:
+            section = archive.load(750.0, 840.0)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(path, 'rb')
+        try:
+            self._read_index()
+        except Exception:
+            self._file.close()
+            raise
+        self.blocks_read = 0
+
+    def _read_index(self):
+        f = self._file
+        size = os.fstat(f.fileno()).st_size
+        if size < ARCHIVE_HEADER.size + TRAILER.size:
+            raise RecordingFormatError("Archive file is truncated")
+        header = f.read(ARCHIVE_HEADER.size)
+        magic, version, self.flags, self.count, table_len, codec = ARCHIVE_HEADER.unpack(header)
+        if magic != ARCHIVE_MAGIC:
+            raise RecordingFormatError("Not a RecMouse archive")
+        if version != ARCHIVE_VERSION:
+            raise RecordingFormatError(f"Unsupported archive version: {version}")
+        codec_name = next((name for name, code in CODECS.items() if code == codec), None)
+        if codec_name is None:
+            raise RecordingFormatError(f"Unknown archive codec: {codec}")
+        self.codec = codec_name
+        self._decompress = _compressor(codec_name)[1]
+        self.button_names = json.loads(f.read(table_len).decode('utf-8'))
+
+        f.seek(size - TRAILER.size)
+        index_offset, blocks, self.duration, crc, end_magic = TRAILER.unpack(f.read(TRAILER.size))
+        if end_magic != ARCHIVE_MAGIC or index_offset + blocks * INDEX_ENTRY.size != size - TRAILER.size:
+            raise RecordingFormatError("Archive file is truncated")
+        f.seek(index_offset)
+        index = f.read(blocks * INDEX_ENTRY.size)
+        if zlib.crc32(index) != crc:
+            raise RecordingFormatError("Archive index is corrupted")
+        self._index = list(INDEX_ENTRY.iter_unpack(index))
+        self.block_times = array('d', (entry[0] for entry in self._index))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def block_count(self):
+        return len(self._index)
+
+    def block_at(self, t):
+        """Index of the first block that can hold events at time ``t`` or later."""
+        # A block starting exactly at t may be preceded by one ending with events at t
+        return max(bisect_left(self.block_times, t) - 1, 0)
+
+    def read_block(self, i):
+        """Decompress block ``i`` into a recording."""
+        _, _, offset, size, count = self._index[i]
+        self._file.seek(offset)
+        data = self._decompress(self._file.read(size))
+        if len(data) != count * (8 * len(FLOAT_COLUMNS) + len(BYTE_COLUMNS)):
+            raise RecordingFormatError(f"Archive block {i} is corrupted")
+        self.blocks_read += 1
+        columns = {}
+        offset = 0
+        for name in FLOAT_COLUMNS:
+            columns[name] = _decode_floats(data[offset:offset + count * 8])
+            offset += count * 8
+        for name in BYTE_COLUMNS:
+            columns[name] = array('B', data[offset:offset + count])
+            offset += count
+        return Recording(button_names=self.button_names, flags=self.flags, source=self.path, **columns)
+
+    def iter_chunks(self, start=None, end=None):
+        """Yield the events with ``start <= time < end`` a block at a time."""
+        first = self.block_at(start) if start is not None else 0
+        for i in range(first, len(self._index)):
+            if end is not None and self.block_times[i] >= end:
+                return
+            block = self.read_block(i)
+            lo, hi = time_range(block, start, end)
+            if lo < hi:
+                yield block if hi - lo == len(block) else block.slice(lo, hi)
+
+    def load(self, start=None, end=None):
+        """Return the events with ``start <= time < end`` as one recording."""
+        columns = {name: array('d') for name in FLOAT_COLUMNS}
+        columns.update({name: array('B') for name in BYTE_COLUMNS})
+        for chunk in self.iter_chunks(start, end):
+            for name, column in columns.items():
+                column.extend(getattr(chunk, name))
+        return Recording(button_names=self.button_names, flags=self.flags, source=self.path, **columns)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_archive(path):
+    """Load a whole archive into memory."""
+    with Archive(path) as archive:
+        return archive.load()
+
+
+def iter_archive_chunks(path, start=None, end=None):
+    """Yield a section of an archive block by block, keeping the file open only while iterating."""
+    with Archive(path) as archive:
+        yield from archive.iter_chunks(start, end)
+
+
+def load_section(path, start=None, end=None):
+    """Load the events with ``start <= time < end`` from a recording in any format.
+
+    Archives are read by seeking to the blocks involved; other formats are
+    loaded and cut.
+    """
+    if is_archive(path):
+        with Archive(path) as archive:
+            return archive.load(start, end)
+    recording = load_recording(path)
+    try:
+        return recording.slice(*time_range(recording, start, end))
+    finally:
+        recording.close()
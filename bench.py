@@ -0,0 +1,284 @@
+"""Benchmarks for recording I/O, playback and capture.
+
+Runs ``MousePlayer`` and ``MouseRecorder`` against the headless controller
+and listener, so no display or accessibility permission is needed, and
+writes the results as JSON. Pass ``--baseline`` to compare against an
+earlier results file; the exit status is 1 if any metric regressed by more
+than ``--tolerance``.
+
+Usage:
+    python bench.py [--sizes 1000,100000] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import threading
+import tracemalloc
+from array import array
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from headless import HeadlessController, HeadlessListener
+from plan import OP_MOVE, compile_plan, resolve_button_name
+from play import MousePlayer
+from record import MouseRecorder, StatusBarApp
+from recording_format import (
+    EVENT_CLICK,
+    Recording,
+    ROW_SIZE,
+    export_json,
+    import_json,
+    load_binary,
+    save_recording,
+)
+from scheduler import lateness_summary
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+JSON_SIZE_LIMIT = 1_000_000  # Legacy JSON gets too slow to be useful beyond this
+CLICK_EVERY = 500  # One press/release pair per this many events
+SAMPLE_RATE = 250  # Hz of the synthetic recordings
+
+# Garbage-collector load during the GC jitter runs, like a long-running app's
+GC_LIVE_OBJECTS = 300_000  # Long-lived containers every full collection has to walk
+GC_BURST_OBJECTS = 2_000  # Allocated every GC_BURST_INTERVAL, some kept for a while
+GC_BURST_INTERVAL = 0.01
+
+# Metrics where a higher value is better; every other metric is a cost
+HIGHER_IS_BETTER = ('events_per_s',)
+
+
+def synthetic_recording(count, rate=SAMPLE_RATE):
+    """Build a recording of ``count`` events sweeping the screen at ``rate`` Hz."""
+    times = array('d', (i / rate for i in range(count)))
+    xs = array('d', (float(i % 1920) for i in range(count)))
+    ys = array('d', (float(i // 1920 % 1080) for i in range(count)))
+    types = array('B', bytes(count))
+    buttons = array('B', bytes(count))
+    pressed = array('B', bytes(count))
+
+    presses = range(CLICK_EVERY - 2, count - 1, CLICK_EVERY)
+    for i in presses:
+        types[i] = types[i + 1] = EVENT_CLICK
+        buttons[i] = buttons[i + 1] = 1
+        pressed[i] = 1
+    return Recording(times, xs, ys, types, buttons, pressed, ['', 'Button.left'])
+
+
+def bench_io(recording, workdir):
+    path = workdir / 'bench.rmrec'
+    n = len(recording)
+
+    start = perf_counter()
+    save_recording(recording, path)
+    save_s = perf_counter() - start
+
+    start = perf_counter()
+    loaded = load_binary(path)
+    load_s = perf_counter() - start
+
+    tracemalloc.start()
+    start = perf_counter()
+    # Button names resolve without pynput; a recording has only a couple of them anyway
+    plan = compile_plan(loaded, resolve_button_name)
+    compile_s = perf_counter() - start
+    plan_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    loaded.close()
+
+    result = {
+        'save_s': save_s,
+        'load_s': load_s,
+        'compile_s': compile_s,
+        'file_bytes_per_event': path.stat().st_size / n,
+        'plan_bytes_per_event': plan_bytes / n,
+    }
+    del plan
+    path.unlink()
+
+    if n <= JSON_SIZE_LIMIT:
+        json_path = workdir / 'bench.json'
+        start = perf_counter()
+        export_json(recording, json_path)
+        result['json_save_s'] = perf_counter() - start
+        start = perf_counter()
+        import_json(json_path)
+        result['json_load_s'] = perf_counter() - start
+        result['json_bytes_per_event'] = json_path.stat().st_size / n
+        json_path.unlink()
+    return result
+
+
+def bench_throughput(recording):
+    """Dispatch rate with every deadline already due."""
+    n = len(recording)
+    unscheduled = Recording(array('d', bytes(8 * n)), recording.xs, recording.ys, recording.types,
+                            recording.buttons, recording.pressed, recording.button_names)
+    plan = compile_plan(unscheduled, resolve_button_name)
+    controller = HeadlessController()
+    player = MousePlayer(controller=controller)
+
+    start = perf_counter()
+    player.play_plan(plan)
+    elapsed = perf_counter() - start
+    return {'events_per_s': n / elapsed, 'controller_calls': len(controller.times)}
+
+
+def _gc_pressure(stop):
+    """Allocate in bursts on another thread until ``stop`` is set, keeping some objects alive."""
+    survivors = []
+    while not stop.wait(GC_BURST_INTERVAL):
+        burst = [[] for _ in range(GC_BURST_OBJECTS)]
+        for item in burst:
+            item.append(item)  # A cycle, so only the collector can free it
+        survivors.append(burst)
+        if len(survivors) > 20:
+            survivors.clear()
+
+
+def bench_jitter(seconds, rate=SAMPLE_RATE, gc_pressure=False, precision=False):
+    """Scheduling accuracy of a real-time replay.
+
+    ``gc_pressure`` replays next to a large heap and a thread allocating
+    garbage, so collections happen during playback; ``precision`` runs the
+    replay in precision.PrecisionMode.
+    """
+    plan = compile_plan(synthetic_recording(int(seconds * rate), rate), resolve_button_name)
+    controller = HeadlessController()
+    player = MousePlayer(controller=controller)
+    player.precision = precision
+    if gc_pressure:
+        live = [[] for _ in range(GC_LIVE_OBJECTS)]
+        stop = threading.Event()
+        allocator = threading.Thread(target=_gc_pressure, args=(stop,), daemon=True)
+        allocator.start()
+    try:
+        player.play_plan(plan)
+    finally:
+        if gc_pressure:
+            stop.set()
+            allocator.join()
+            del live
+
+    scheduler = player.scheduler.summary()
+    # Lateness as the controller saw it: first action of each event vs its deadline
+    observed = array('d')
+    k = 0
+    for deadline, op in zip(plan.deadlines, plan.ops):
+        observed.append(controller.times[k] - player.scheduler.start_time - deadline)
+        k += 1 if op == OP_MOVE else 2
+    injected = lateness_summary(observed)
+    return {
+        'events': len(plan),
+        'p50_ms': scheduler['p50_ms'],
+        'p99_ms': scheduler['p99_ms'],
+        'max_ms': scheduler['max_ms'],
+        'injected_p50_ms': injected['p50_ms'],
+        'injected_p99_ms': injected['p99_ms'],
+        'injected_max_ms': injected['max_ms'],
+        'precision': player.last_precision if precision else None,
+    }
+
+
+def bench_capture(count, workdir):
+    """Listener callback cost and capture memory per event."""
+    recorder = MouseRecorder(StatusBarApp(), listener_factory=HeadlessListener)
+    recorder.recording_file = workdir / 'capture.rmrec'
+    recorder.start_recording()
+    listener = recorder.mouse_listener
+
+    start = perf_counter()
+    for i in range(count):
+        if i % CLICK_EVERY == 0:
+            # Buttons are only hashed and named, as in MouseRecorder.check_callback_budget
+            listener.feed_click(i % 1920, 500, 'Button.left', True)
+            listener.feed_click(i % 1920, 500, 'Button.left', False)
+        else:
+            # Slow arcs with a turn every 40 samples, so sampling keeps some of them
+            listener.feed_move(i % 1920, 500 + (i % 40) * (i // 40 % 2))
+    elapsed = perf_counter() - start
+
+    kept = len(recorder.recording)
+    capture_bytes = recorder.recording.capacity * ROW_SIZE
+    start = perf_counter()
+    recorder.stop_recording()
+    stop_s = perf_counter() - start
+    recorder.recording_file.unlink(missing_ok=True)
+    return {
+        'callback_us': elapsed / count * 1e6,
+        'kept_events': kept,
+        'buffer_bytes': capture_bytes,
+        'bytes_per_kept_event': capture_bytes / max(kept, 1),
+        'stop_s': stop_s,
+    }
+
+
+def run(sizes, jitter_seconds):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for size in sizes:
+            print(f"Benchmarking {size} events...", file=sys.stderr)
+            recording = synthetic_recording(size)
+            results[f'io_{size}'] = bench_io(recording, workdir)
+            results[f'throughput_{size}'] = bench_throughput(recording)
+            results[f'capture_{size}'] = bench_capture(size, workdir)
+        print(f"Benchmarking {jitter_seconds} s real-time replay...", file=sys.stderr)
+        results['jitter'] = bench_jitter(jitter_seconds)
+        print(f"Benchmarking {jitter_seconds} s replays under GC load, without and with precision mode...",
+              file=sys.stderr)
+        results['jitter_gc'] = bench_jitter(jitter_seconds, gc_pressure=True)
+        results['jitter_gc_precision'] = bench_jitter(jitter_seconds, gc_pressure=True, precision=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of metrics that regressed by more than ``tolerance``."""
+    regressions = []
+    for case, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(case, {}).get(name)
+            if not old or not isinstance(value, float):
+                continue
+            change = (value - old) / abs(old)
+            if name in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{case}.{name}: {old:.6g} -> {value:.6g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark RecMouse recording I/O and playback.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated event counts, e.g. 1000,10000000")
+    parser.add_argument('--jitter-seconds', type=float, default=5.0, help="length of the real-time replay")
+    parser.add_argument('--output', type=Path, default=Path('bench-results.json'))
+    parser.add_argument('--baseline', type=Path, help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run(sizes, args.jitter_seconds),
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report['results'], indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())['results']
+        regressions = compare(report['results'], baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
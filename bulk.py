@@ -0,0 +1,257 @@
+"""Validate or convert a whole tree of recordings in parallel.
+
+``run_bulk`` finds every recording under a directory and hands each file to
+a process pool, which loads it with ``recording_format.load_recording`` and
+checks it:
+
+- timestamps never go backwards
+- every press is released before the same button is pressed again, and no
+  button is released without a press or left held at the end
+- coordinates are finite and inside ``bounds``
+
+In ``convert`` mode the recording is also written out in the other format.
+Results are reported as they arrive and appended to a journal file; running
+the same job again skips every file whose last journal entry is 'ok' with
+the same size and mtime, so an interrupted run picks up where it stopped
+and files that failed are tried again.
+"""
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from recording_format import EVENT_CLICK, export_json, is_binary_recording, load_recording, save_recording
+
+MODES = ('validate', 'convert')
+FORMATS = {'rmrec': '.rmrec', 'json': '.json'}
+RECORDING_PATTERNS = ('*.json', '*.rmrec')
+JOURNAL_NAME = ".recmouse-bulk-{mode}.jsonl"
+
+# Sanity bounds of the global display coordinate space: (min x, min y, max x, max y)
+DEFAULT_BOUNDS = (-32768.0, -32768.0, 32767.0, 32767.0)
+# Files in flight per worker; keeps memory flat however large the tree is
+QUEUE_DEPTH = 4
+
+
+def find_recordings(root):
+    """Yield every recording file under ``root`` in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if name.startswith('.') or name.endswith('.stats.json'):
+                continue
+            if any(path.match(pattern) for pattern in RECORDING_PATTERNS):
+                yield path
+
+
+def check_recording(recording, bounds=DEFAULT_BOUNDS):
+    """Check a loaded recording.
+
+    Returns:
+        dict: problem kind -> [count, index of the first offending event];
+        empty if the recording is valid
+    """
+    problems = {}
+
+    def problem(kind, index):
+        found = problems.get(kind)
+        if found is None:
+            problems[kind] = [1, index]
+        else:
+            found[0] += 1
+
+    min_x, min_y, max_x, max_y = bounds
+    held = {}  # Button code -> index of the press still held
+    previous = -math.inf
+    isfinite = math.isfinite
+    rows = zip(recording.times, recording.xs, recording.ys, recording.types, recording.buttons, recording.pressed)
+    for i, (t, x, y, kind, button, pressed) in enumerate(rows):
+        if not isfinite(t):
+            problem('time not finite', i)
+        elif t < previous:
+            problem('time goes backwards', i)
+        else:
+            previous = t
+        if not (isfinite(x) and isfinite(y)):
+            problem('coordinates not finite', i)
+        elif not (min_x <= x <= max_x and min_y <= y <= max_y):
+            problem('coordinates out of bounds', i)
+        if kind == EVENT_CLICK:
+            if pressed:
+                if button in held:
+                    problem('press without release', held[button])
+                held[button] = i
+            elif held.pop(button, None) is None:
+                problem('release without press', i)
+    for index in held.values():
+        problem('held at end', index)
+    return problems
+
+
+def output_path(path, root, output, to):
+    """Mirror ``path`` from ``root`` into ``output`` with the ``to`` format's suffix."""
+    return Path(output) / Path(path).relative_to(root).with_suffix(FORMATS[to])
+
+
+def process_file(path, root, mode='validate', output=None, to='rmrec', bounds=DEFAULT_BOUNDS):
+    """Load, check and optionally convert one file; runs in a worker process.
+
+    Returns:
+        dict: path, size, mtime_ns, status ('ok', 'invalid' or 'error'),
+        events, problems, error, output and seconds
+    """
+    started = time.perf_counter()
+    stat = os.stat(path)
+    result = {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'status': 'error',
+              'events': 0, 'problems': {}, 'error': None, 'output': None}
+    try:
+        recording = load_recording(path)
+        try:
+            result['events'] = len(recording)
+            result['problems'] = check_recording(recording, bounds)
+            # Files already in the target format only need checking
+            if mode == 'convert' and is_binary_recording(path) != (to == 'rmrec'):
+                dst = output_path(path, root, output, to)
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if to == 'json':
+                    export_json(recording, dst)
+                else:
+                    save_recording(recording, dst)
+                result['output'] = str(dst)
+        finally:
+            recording.close()
+        result['status'] = 'invalid' if result['problems'] else 'ok'
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def read_journal(journal):
+    """Return {path: result} of the files already done.
+
+    The journal is append-only, so only the last entry of each path counts,
+    and a path whose last result isn't 'ok' isn't done.
+    """
+    last = {}
+    try:
+        with open(journal, 'r') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by the interruption
+                last[result['path']] = result
+    except FileNotFoundError:
+        pass
+    return {path: result for path, result in last.items() if result['status'] == 'ok'}
+
+
+class BulkReport:
+    """Running totals of a bulk run."""
+
+    def __init__(self):
+        self.files = 0
+        self.events = 0
+        self.resumed = 0
+        self.statuses = {'ok': 0, 'invalid': 0, 'error': 0}
+        self.problems = {}  # Kind -> number of files with it
+        self.worker_seconds = 0.0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, result, resumed=False):
+        self.statuses[result['status']] += 1
+        for kind in result['problems']:
+            self.problems[kind] = self.problems.get(kind, 0) + 1
+        if resumed:
+            self.resumed += 1
+            return
+        self.files += 1
+        self.events += result['events']
+        self.worker_seconds += result.get('seconds', 0.0)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def format(self):
+        elapsed = self.elapsed or 1e-9
+        lines = [
+            f"Files:      {self.files} processed, {self.resumed} already done",
+            f"Results:    {self.statuses['ok']} ok, {self.statuses['invalid']} invalid, "
+            f"{self.statuses['error']} unreadable",
+            f"Events:     {self.events}",
+            f"Elapsed:    {self.elapsed:.2f} s ({self.worker_seconds:.2f} s of worker time)",
+            f"Throughput: {self.files / elapsed:.1f} files/s, {self.events / elapsed:.0f} events/s",
+        ]
+        for kind, count in sorted(self.problems.items(), key=lambda item: -item[1]):
+            lines.append(f"  {count:6} files: {kind}")
+        return "\n".join(lines)
+
+
+def run_bulk(root, mode='validate', output=None, to='rmrec', bounds=DEFAULT_BOUNDS,
+             workers=None, journal=None, restart=False, on_result=None):
+    """Validate or convert every recording under ``root`` with a process pool.
+
+    Args:
+        output: directory converted files are mirrored into (convert only)
+        to: target format of convert, 'rmrec' or 'json'
+        journal: resume file, defaults to a hidden file in ``root``
+        restart: ignore and truncate an existing journal
+        on_result: called with each result dict as soon as it arrives
+
+    Returns:
+        BulkReport
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    if to not in FORMATS:
+        raise ValueError(f"Unknown format {to!r}, expected one of {tuple(FORMATS)}")
+    if mode == 'convert' and output is None:
+        raise ValueError("Converting needs an output directory")
+    root = Path(root)
+    journal = Path(journal) if journal else root / JOURNAL_NAME.format(mode=mode)
+    workers = workers or os.cpu_count() or 1
+
+    report = BulkReport()
+    done = {} if restart else read_journal(journal)
+    output_root = Path(output).resolve() if output else None
+
+    def pending_files():
+        for path in find_recordings(root):
+            if output_root is not None and output_root in path.resolve().parents:
+                continue  # Don't pick up our own output when it lives inside root
+            stat = path.stat()
+            result = done.get(str(path))
+            if result is not None and (result['size'], result['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                report.add(result, resumed=True)
+            else:
+                yield path
+
+    with open(journal, 'w' if restart else 'a') as log, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        files = pending_files()
+        in_flight = set()
+        while True:
+            # Top the queue up without listing the whole tree first
+            while len(in_flight) < workers * QUEUE_DEPTH:
+                path = next(files, None)
+                if path is None:
+                    break
+                in_flight.add(executor.submit(process_file, path, root, mode, output, to, bounds))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                log.write(json.dumps(result) + "\n")
+                log.flush()
+                report.add(result)
+                if on_result:
+                    on_result(result)
+    report.finish()
+    logging.info(f"Bulk {mode} of {root}: {report.files} files, {report.events} events in {report.elapsed:.2f} s")
+    return report
@@ -0,0 +1,541 @@
+"""Headless command line interface to RecMouse.
+
+Each subcommand imports only what it needs: ``info`` and ``convert`` never
+load the GUI or the platform input stack, and ``record``/``play`` load
+``pynput`` only when they start capturing or injecting. ``startup``
+measures the cold import cost of every subcommand with
+``python -X importtime`` and checks it against ``STARTUP_BUDGET_MS``.
+
+Usage:
+    python cli.py info [PATH]
+    python cli.py list [--name TEXT] [--min-duration S] [--min-clicks N]
+    python cli.py convert SRC DST
+    python cli.py play [PATH] [--repeat N] [--speed X] [--headless]
+    python cli.py playlist PATH[:REPEATS[:GAP]]... [--loops N]
+    python cli.py record [PATH] [--seconds S]
+    python cli.py bulk validate|convert ROOT [--output DIR] [--workers N]
+    python cli.py simulate PATH[:REPEATS[:GAP]]... [--timeline CSV]
+    python cli.py bench [BENCH ARGS...]
+    python cli.py startup
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Modules each subcommand imports before it starts working
+SUBCOMMAND_MODULES = {
+    'info': ('recording_format',),
+    'list': ('library',),
+    'convert': ('recording_format',),
+    'play': ('play',),
+    'playlist': ('play', 'playlist'),
+    'record': ('record',),
+    'bulk': ('bulk',),
+    'simulate': ('simulate',),
+    'store': ('store', 'recording_format'),
+    'bench': ('bench',),
+}
+
+# Cold import budget per subcommand, milliseconds
+STARTUP_BUDGET_MS = {
+    'info': 80,
+    'list': 80,
+    'convert': 80,
+    'play': 150,
+    'playlist': 150,
+    'record': 150,
+    'bulk': 150,
+    'simulate': 150,
+    'store': 200,
+    'bench': 400,
+}
+
+# Modules that must not be imported just to start a subcommand
+GUI_MODULES = ('rumps', 'AppKit', 'colorama', 'ApplicationServices', 'CoreFoundation')
+INPUT_MODULES = ('pynput', 'numpy')
+STARTUP_FORBIDDEN = {
+    'info': GUI_MODULES + INPUT_MODULES,
+    'list': GUI_MODULES + INPUT_MODULES,
+    'convert': GUI_MODULES + INPUT_MODULES,
+    'play': GUI_MODULES + INPUT_MODULES,
+    'playlist': GUI_MODULES + INPUT_MODULES,
+    'record': GUI_MODULES + INPUT_MODULES,
+    'bulk': GUI_MODULES + INPUT_MODULES,
+    'simulate': GUI_MODULES + INPUT_MODULES,
+    'store': GUI_MODULES + ('pynput',),  # Chunking uses numpy when it is installed
+    'bench': GUI_MODULES,
+}
+
+
+def app_data_path():
+    return Path.home() / "Library" / "Application Support" / "RecMouse"
+
+
+def default_recording_path():
+    from recording_format import RECORDING_FILENAME
+    return app_data_path() / RECORDING_FILENAME
+
+
+def cmd_info(args):
+    from recording_format import is_archive, is_manifest, read_summary
+
+    path = args.path or default_recording_path()
+    summary = read_summary(path)
+    min_x, min_y, max_x, max_y = summary['bbox']
+    print(f"Path:      {path}")
+    version = summary['version']
+    if is_archive(path):
+        print("Format:    block-compressed archive")
+    elif is_manifest(path):
+        print(f"Format:    store manifest v{version}")
+    else:
+        print(f"Format:    {f'binary v{version}' if version else 'legacy JSON'}")
+    print(f"Size:      {Path(path).stat().st_size} bytes")
+    print(f"Events:    {summary['events']}")
+    print(f"Clicks:    {summary['clicks']}")
+    print(f"Duration:  {summary['duration']:.3f} s")
+    print(f"Bounds:    ({min_x:g}, {min_y:g}) - ({max_x:g}, {max_y:g})")
+    print(f"Checksum:  {summary['checksum']:08x}")
+    return 0
+
+
+def cmd_list(args):
+    from library import RecordingLibrary
+
+    library = RecordingLibrary(args.directory or app_data_path())
+    try:
+        library.refresh()
+        rows = library.list(name=args.name, min_duration=args.min_duration, max_duration=args.max_duration,
+                            min_clicks=args.min_clicks, order=args.order, limit=args.limit)
+    finally:
+        library.close()
+    for row in rows:
+        print(f"{row['name']:32} {row['duration']:9.1f} s {row['events']:9} events {row['clicks']:6} clicks")
+    print(f"{len(rows)} recordings", file=sys.stderr)
+    return 0
+
+
+def cmd_convert(args):
+    from recording_format import convert
+
+    convert(args.src, args.dst, args.start, args.end)
+    print(f"Converted {args.src} -> {args.dst}")
+    return 0
+
+
+def _timestamp(text):
+    """Seconds from '750', '12:30' or '1:02:30.5'."""
+    try:
+        seconds = 0.0
+        for part in text.split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected seconds or [H:]MM:SS, got {text!r}")
+    return seconds
+
+
+def _make_player(args):
+    from play import MousePlayer
+
+    controller = None
+    if args.headless:
+        from headless import HeadlessController
+        controller = HeadlessController()
+    return _apply_playback_modes(MousePlayer(controller=controller), args)
+
+
+def _apply_playback_modes(player, args):
+    player.speed = args.speed
+    player.max_gap = args.max_gap
+    player.clicks_only = args.clicks_only
+    player.output_rate = args.rate
+    player.interpolation = 'catmull-rom' if args.curved else 'linear'
+    player.catch_up_after = args.catch_up
+    player.precision = args.precision
+    return player
+
+
+def _stop_on_interrupt(stop):
+    """Make Ctrl-C call ``stop`` so held buttons are released before exiting."""
+    signal.signal(signal.SIGINT, lambda signum, frame: stop())
+
+
+def cmd_play(args):
+    player = _make_player(args)
+    if args.path:
+        player.recording_file = Path(args.path)
+    if args.stream:
+        return _play_stream(player, args)
+    plan, error_msg = player.load_plan(start=args.start, end=args.end)
+    if plan is None:
+        print(error_msg, file=sys.stderr)
+        return 1
+    player.reset_stats()
+    _stop_on_interrupt(player.stop)
+    success, error_msg = player.play_plan(plan, args.repeat)
+    player.save_stats()
+    if not success and error_msg is None:
+        print(f"Stopped after {player.last_stop_latency * 1000:.2f} ms", file=sys.stderr)
+        return 130
+    if not success:
+        print(error_msg, file=sys.stderr)
+        return 1
+    lateness = player.stats()['histograms']['lateness']
+    print(f"Played {len(plan)} events x{args.repeat}: lateness p50 {lateness['p50_ms']:.3f} ms, "
+          f"p99 {lateness['p99_ms']:.3f} ms, max {lateness['max_ms']:.3f} ms")
+    _print_run_modes(player)
+    return 0
+
+
+def _print_run_modes(player):
+    if player.last_precision is not None:
+        applied = ', '.join(f"{name} {value}" for name, value in player.last_precision.items())
+        print(f"Precision mode: {applied or 'nothing could be applied'}")
+    stats = player.stats()
+    coalesced = stats['counters'].get('coalesced')
+    if coalesced:
+        recovered = stats['histograms']['catch_up']
+        print(f"Caught up {recovered['count']} times, coalescing {coalesced} late moves; "
+              f"most recovered at once {recovered['max_ms']:.1f} ms")
+
+
+def _play_stream(player, args):
+    player.reset_stats()
+    _stop_on_interrupt(player.stop)
+    success, error_msg = player.play_stream(repeat_count=args.repeat, start=args.start, end=args.end)
+    player.save_stats()
+    if not success and error_msg is None:
+        print(f"Stopped after {player.last_stop_latency * 1000:.2f} ms", file=sys.stderr)
+        return 130
+    if not success:
+        print(error_msg, file=sys.stderr)
+        return 1
+    stats = player.stats()
+    lateness = stats['histograms']['lateness']
+    print(f"Streamed {stats['counters']['events']} events, first after "
+          f"{stats['histograms']['first_event']['max_ms']:.2f} ms: lateness p50 {lateness['p50_ms']:.3f} ms, "
+          f"p99 {lateness['p99_ms']:.3f} ms, max {lateness['max_ms']:.3f} ms")
+    _print_run_modes(player)
+    return 0
+
+
+def cmd_playlist(args):
+    from playlist import Playlist, PlaylistEntry
+
+    player = _make_player(args)
+    entries = [PlaylistEntry.parse(spec) for spec in args.entries]
+
+    def show_progress(index, run, repeats):
+        print(f"{entries[index].path.name} run {run}/{repeats or '∞'}", file=sys.stderr)
+
+    playlist = Playlist(player, entries, loops=args.loops or None, on_progress=show_progress)
+    _stop_on_interrupt(playlist.stop)
+    success, error_msg = playlist.run()
+    for stats in playlist.item_stats:
+        print(f"{Path(stats['path']).name:32} {stats['runs']:6} runs {stats['play_s']:9.2f} s playing "
+              f"{stats['load_s'] * 1000:8.1f} ms loading  max lateness {stats['max_lateness_ms']:.3f} ms")
+    if not success and error_msg is None:
+        print(f"Stopped after {player.last_stop_latency * 1000:.2f} ms", file=sys.stderr)
+        return 130
+    if not success:
+        print(error_msg, file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_simulate(args):
+    from playlist import PlaylistEntry
+    from simulate import simulate_playlist, simulated_player
+
+    player = _apply_playback_modes(simulated_player(per_event=args.per_event), args)
+    entries = [PlaylistEntry.parse(spec) for spec in args.entries]
+    if any(entry.repeats is None for entry in entries):
+        raise ValueError("A simulation can't repeat an entry forever")
+    result, playlist = simulate_playlist(player, entries, loops=args.loops)
+    if args.timeline:
+        result.write_csv(args.timeline)
+    if not result.success:
+        print(result.error_msg, file=sys.stderr)
+        return 1
+    summary = result.summary()
+    for stats in playlist.item_stats:
+        print(f"{Path(stats['path']).name:32} {stats['runs']:6} runs {stats['play_s']:11.3f} s simulated")
+    print(f"Simulated {summary['actions']} actions ({summary['presses']} presses, {summary['releases']} releases) "
+          f"covering {summary['simulated_s']:.3f} s in {summary['wall_s']:.3f} s, "
+          f"{summary['actions_per_s']:.0f} actions/s")
+    return 0
+
+
+def cmd_record(args):
+    from record import MouseRecorder, StatusBarApp
+
+    recorder = MouseRecorder(StatusBarApp(), streaming=args.streaming, sampling=args.sampling)
+    if args.store:
+        from recording_format import MANIFEST_SUFFIX
+        from store import MANIFEST_DIRNAME, STORE_DIRNAME
+        recorder.recording_file = app_data_path() / STORE_DIRNAME / MANIFEST_DIRNAME / f"{args.store}{MANIFEST_SUFFIX}"
+    else:
+        recorder.recording_file = Path(args.path) if args.path else default_recording_path()
+    recorder.start_recording()
+    print("Recording, press Ctrl-C to stop..." if args.seconds is None
+          else f"Recording for {args.seconds} s...", file=sys.stderr)
+    try:
+        if args.seconds is None:
+            while True:
+                time.sleep(0.1)
+        else:
+            time.sleep(args.seconds)
+    except KeyboardInterrupt:
+        pass
+    recorder.stop_recording()
+    counters = recorder.stats()['counters']
+    print(f"Saved {recorder.recording_file}: {counters['moves_kept']} moves, "
+          f"{counters['clicks']} click events in {counters['duration_s']:.1f} s")
+    return 0
+
+
+def cmd_bulk(args):
+    import bulk
+
+    def show_result(result):
+        if result['status'] == 'error':
+            print(f"ERROR    {result['path']}: {result['error']}")
+        elif result['status'] == 'invalid':
+            problems = ', '.join(f"{kind} x{count} (first at event {first})"
+                                 for kind, (count, first) in result['problems'].items())
+            print(f"INVALID  {result['path']}: {problems}")
+        elif args.verbose:
+            print(f"ok       {result['path']}: {result['events']} events")
+
+    report = bulk.run_bulk(args.root, mode=args.mode, output=args.output, to=args.to,
+                           bounds=args.bounds or bulk.DEFAULT_BOUNDS, workers=args.workers,
+                           journal=args.journal, restart=args.restart, on_result=show_result)
+    print(report.format(), file=sys.stderr)
+    return 0 if report.statuses['ok'] == report.files + report.resumed else 1
+
+
+def _bounds(text):
+    bounds = tuple(float(value) for value in text.split(','))
+    if len(bounds) != 4:
+        raise argparse.ArgumentTypeError("expected MIN_X,MIN_Y,MAX_X,MAX_Y")
+    return bounds
+
+
+def cmd_store(args):
+    from recording_format import load_recording, save_as
+    from store import STORE_DIRNAME, RecordingStore
+
+    store = RecordingStore(args.store or app_data_path() / STORE_DIRNAME)
+    if args.action == 'put':
+        recording = load_recording(args.path)
+        try:
+            written = store.save(args.name or args.path.stem, recording)
+        finally:
+            recording.close()
+        print(f"Stored {args.name or args.path.stem}: {written['chunks']} chunks, "
+              f"{written['new_chunks']} new, {written['bytes_written']} bytes written")
+    elif args.action == 'get':
+        save_as(store.load(args.name), args.path)
+        print(f"Wrote {args.name} -> {args.path}")
+    elif args.action == 'list':
+        for name in store.names():
+            print(name)
+    elif args.action == 'rm':
+        store.delete(args.name)
+        print(f"Removed {args.name}; run gc to free its chunks")
+    elif args.action == 'gc':
+        removed, freed = store.gc(dry_run=args.dry_run, grace=args.grace)
+        print(f"{'Would remove' if args.dry_run else 'Removed'} {removed} chunks, {freed} bytes")
+    else:
+        stats = store.stats()
+        ratio = stats['logical_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0.0
+        print(f"Recordings: {stats['recordings']} ({stats['events']} events)")
+        print(f"Chunks:     {stats['chunks']}")
+        print(f"Stored:     {stats['stored_bytes']} bytes")
+        print(f"As files:   {stats['logical_bytes']} bytes ({ratio:.1f}x)")
+    return 0
+
+
+def cmd_bench(args):
+    import bench
+    return bench.main(args.extra)
+
+
+def measure_startup(name, python=sys.executable):
+    """Cold-import a subcommand's modules in a fresh interpreter.
+
+    Returns:
+        tuple: (total import time in ms, forbidden modules that got imported)
+    """
+    modules = SUBCOMMAND_MODULES[name]
+    code = (
+        "import importlib, sys\n"
+        f"for name in {modules!r}: importlib.import_module(name)\n"
+        f"print(','.join(m for m in {STARTUP_FORBIDDEN[name]!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1'),
+    )
+    # Lines are "import time: self [us] | cumulative | package"; the self column sums to the total
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            total_us += int(line.split(':', 1)[1].split('|')[0])
+    loaded = [m for m in result.stdout.strip().split(',') if m]
+    return total_us / 1000, loaded
+
+
+def cmd_startup(args):
+    failed = False
+    for name in SUBCOMMAND_MODULES:
+        # Take the best of a few runs; the first one may still be warming the OS file cache
+        runs = [measure_startup(name) for _ in range(args.runs)]
+        total_ms = min(ms for ms, _ in runs)
+        loaded = runs[0][1]
+        budget = STARTUP_BUDGET_MS[name]
+        status = 'ok'
+        if total_ms > budget or loaded:
+            status = 'OVER BUDGET' if total_ms > budget else 'IMPORTS ' + ','.join(loaded)
+            failed = True
+        print(f"{name:8} {total_ms:8.1f} ms  (budget {budget} ms)  {status}")
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='recmouse', description="Record and replay mouse input.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log progress to the console")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    info = commands.add_parser('info', help="describe a recording")
+    info.add_argument('path', nargs='?', type=Path)
+    info.set_defaults(func=cmd_info)
+
+    listing = commands.add_parser('list', help="list and filter the recordings library")
+    listing.add_argument('--directory', type=Path, help="library directory, defaults to the app data directory")
+    listing.add_argument('--name', help="substring of the recording name")
+    listing.add_argument('--min-duration', type=float)
+    listing.add_argument('--max-duration', type=float)
+    listing.add_argument('--min-clicks', type=int)
+    listing.add_argument('--order', default='newest', choices=('newest', 'name', 'duration', 'events'))
+    listing.add_argument('--limit', type=int)
+    listing.set_defaults(func=cmd_list)
+
+    # Section of a recording, for play and convert
+    section = argparse.ArgumentParser(add_help=False)
+    section.add_argument('--start', type=_timestamp, help="skip events before this time, seconds or [H:]MM:SS")
+    section.add_argument('--end', type=_timestamp, help="stop before events at this time")
+
+    convert = commands.add_parser('convert', help="convert between .rmrec, .rmz and .json", parents=[section])
+    convert.add_argument('src', type=Path)
+    convert.add_argument('dst', type=Path)
+    convert.set_defaults(func=cmd_convert)
+
+    # Playback modes shared by play and playlist
+    playback = argparse.ArgumentParser(add_help=False)
+    playback.add_argument('--speed', type=float, default=1.0, help="0.25 to 50")
+    playback.add_argument('--max-gap', type=float, help="cap idle gaps at this many seconds")
+    playback.add_argument('--clicks-only', action='store_true')
+    playback.add_argument('--rate', type=int, help="interpolate moves up to this many Hz")
+    playback.add_argument('--curved', action='store_true', help="Catmull-Rom instead of linear interpolation")
+    playback.add_argument('--headless', action='store_true', help="time playback without moving the mouse")
+    playback.add_argument('--catch-up', type=float, metavar='SECONDS',
+                          help="when this late, skip stale moves to the latest one due; clicks are never skipped")
+    playback.add_argument('--precision', action='store_true',
+                          help="pause the garbage collector and raise thread priority while playing")
+
+    play = commands.add_parser('play', help="replay a recording", parents=[playback, section])
+    play.add_argument('path', nargs='?', type=Path)
+    play.add_argument('--repeat', type=int, default=1)
+    play.add_argument('--stream', action='store_true', help="start playing while the file is still being read")
+    play.set_defaults(func=cmd_play)
+
+    playlist = commands.add_parser('playlist', help="replay recordings back to back", parents=[playback])
+    playlist.add_argument('entries', nargs='+', metavar='PATH[:REPEATS[:GAP]]',
+                          help="REPEATS of 0 repeats forever; GAP is seconds after each run")
+    playlist.add_argument('--loops', type=int, default=1, help="times through the list, 0 for forever")
+    playlist.set_defaults(func=cmd_playlist)
+
+    simulate = commands.add_parser('simulate', help="play recordings on a simulated clock, as fast as possible",
+                                   parents=[playback])
+    simulate.add_argument('entries', nargs='+', metavar='PATH[:REPEATS[:GAP]]')
+    simulate.add_argument('--loops', type=int, default=1, help="times through the list")
+    simulate.add_argument('--timeline', type=Path, help="write every injected action to this CSV file")
+    simulate.add_argument('--per-event', action='store_true',
+                          help="wait for every event through the scheduler instead of batching plans")
+    simulate.set_defaults(func=cmd_simulate)
+
+    record = commands.add_parser('record', help="record mouse input")
+    record.add_argument('path', nargs='?', type=Path)
+    record.add_argument('--seconds', type=float, help="stop after this long instead of on Ctrl-C")
+    record.add_argument('--sampling', default='balanced', choices=('precise', 'balanced', 'compact'))
+    record.add_argument('--streaming', action='store_true', help="write crash-safe segments while recording")
+    record.add_argument('--store', metavar='NAME',
+                        help="save into the recording store in the app data folder, sharing chunks with its recordings")
+    record.set_defaults(func=cmd_record)
+
+    bulk = commands.add_parser('bulk', help="validate or convert a tree of recordings in parallel")
+    bulk.add_argument('mode', choices=('validate', 'convert'))
+    bulk.add_argument('root', type=Path)
+    bulk.add_argument('--output', type=Path, help="directory converted files are written to")
+    bulk.add_argument('--to', default='rmrec', choices=('rmrec', 'json'), help="format to convert to")
+    bulk.add_argument('--bounds', type=_bounds, metavar='MIN_X,MIN_Y,MAX_X,MAX_Y',
+                      help="allowed coordinate range")
+    bulk.add_argument('--workers', type=int, help="worker processes, defaults to the CPU count")
+    bulk.add_argument('--journal', type=Path, help="resume file, defaults to a hidden file in ROOT")
+    bulk.add_argument('--restart', action='store_true', help="ignore earlier progress in the journal")
+    bulk.set_defaults(func=cmd_bulk)
+
+    store = commands.add_parser('store', help="keep recordings in a deduplicated chunk store")
+    store.add_argument('--store', type=Path, help="store directory, defaults to one in the app data folder")
+    actions = store.add_subparsers(dest='action', required=True)
+    put = actions.add_parser('put', help="add a recording file, writing only chunks not stored yet")
+    put.add_argument('path', type=Path)
+    put.add_argument('name', nargs='?', help="defaults to the file name without its suffix")
+    get = actions.add_parser('get', help="write a stored recording out, in the format PATH's suffix names")
+    get.add_argument('name')
+    get.add_argument('path', type=Path)
+    actions.add_parser('list', help="list stored recordings")
+    remove = actions.add_parser('rm', help="remove a stored recording")
+    remove.add_argument('name')
+    gc = actions.add_parser('gc', help="delete chunks no stored recording uses")
+    gc.add_argument('--dry-run', action='store_true', help="only report what would be deleted")
+    gc.add_argument('--grace', type=float, default=3600.0,
+                    help="keep unused chunks younger than this many seconds, for saves in progress")
+    actions.add_parser('stats', help="compare the store's size with the recordings it holds")
+    store.set_defaults(func=cmd_store)
+
+    # Every other argument is passed through to bench.py
+    bench = commands.add_parser('bench', help="run the benchmark suite", add_help=False)
+    bench.set_defaults(func=cmd_bench)
+
+    startup = commands.add_parser('startup', help="check cold-start import budgets")
+    startup.add_argument('--runs', type=int, default=3)
+    startup.set_defaults(func=cmd_startup)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'bench':
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+    if args.command in ('play', 'playlist', 'record'):
+        import logging
+        from logging_setup import setup_logging
+        setup_logging(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
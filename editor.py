@@ -0,0 +1,214 @@
+"""Time-indexed editing of recordings without copying event data.
+
+``RecordingEditor`` represents the edited recording as a piece table: a
+short tuple of ``(source, start, end, time_offset)`` ranges over one or more
+unmodified source recordings. Edits locate their position with ``bisect``
+on the pieces and on the source's time column, then build a new piece tuple,
+so their cost depends on the number of pieces, not the number of events.
+
+Every edit pushes the previous piece tuple on the undo stack. Pieces are
+immutable and shared between versions, so undo is just popping it back.
+Event data is only copied once, by ``materialize``.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from recording_format import EVENT_CLICK, Recording
+
+# Events scanned per step when searching backwards for a click
+_SCAN_CHUNK = 4096
+
+
+def _raw(column, start, end):
+    """Bytes of items ``start:end`` of a column, without copying."""
+    return memoryview(column)[start:end].cast('B')
+
+
+class RecordingEditor:
+    """Edit a recording through a piece table over unmodified sources."""
+
+    def __init__(self, recording):
+        self.sources = [recording]
+        self.button_names = list(recording.button_names)
+        self._button_maps = [None]  # Per-source button code translation, None if identical
+        self.pieces = ((0, 0, len(recording), 0.0),) if len(recording) else ()
+        self.undo_stack = []
+        self._reindex()
+
+    def _reindex(self):
+        self._starts = []
+        self._first_times = []
+        total = 0
+        for source, start, end, offset in self.pieces:
+            self._starts.append(total)
+            self._first_times.append(self.sources[source].times[start] + offset)
+            total += end - start
+        self._length = total
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def duration(self):
+        return self.time_at(self._length - 1) if self._length else 0.0
+
+    def _locate(self, i):
+        """Return (piece index, source index) of global event index ``i``."""
+        p = bisect_right(self._starts, i) - 1
+        return p, self.pieces[p][1] + i - self._starts[p]
+
+    def time_at(self, i):
+        p, k = self._locate(i)
+        source, _, _, offset = self.pieces[p]
+        return self.sources[source].times[k] + offset
+
+    def count_before(self, t):
+        """Number of events with time < t."""
+        p = bisect_left(self._first_times, t) - 1
+        if p < 0:
+            return 0
+        source, start, end, offset = self.pieces[p]
+        return self._starts[p] + bisect_left(self.sources[source].times, t - offset, start, end) - start
+
+    def count_until(self, t):
+        """Number of events with time <= t."""
+        p = bisect_right(self._first_times, t) - 1
+        if p < 0:
+            return 0
+        source, start, end, offset = self.pieces[p]
+        return self._starts[p] + bisect_right(self.sources[source].times, t - offset, start, end) - start
+
+    def _split(self, i):
+        """Split the pieces at global index ``i`` into (left, right) lists."""
+        if i <= 0:
+            return [], list(self.pieces)
+        if i >= self._length:
+            return list(self.pieces), []
+        p, k = self._locate(i)
+        source, start, end, offset = self.pieces[p]
+        left = list(self.pieces[:p])
+        right = list(self.pieces[p + 1:])
+        if k > start:
+            left.append((source, start, k, offset))
+        right.insert(0, (source, k, end, offset))
+        return left, right
+
+    @staticmethod
+    def _shift(pieces, delta):
+        return [(source, start, end, offset + delta) for source, start, end, offset in pieces]
+
+    def _commit(self, pieces):
+        self.undo_stack.append(self.pieces)
+        self.pieces = tuple(pieces)
+        self._reindex()
+
+    def undo(self):
+        """Revert the last edit. Returns False if there was nothing to undo."""
+        if not self.undo_stack:
+            return False
+        self.pieces = self.undo_stack.pop()
+        self._reindex()
+        return True
+
+    def truncate(self, i):
+        """Drop every event from index ``i`` on."""
+        self._commit(self._split(i)[0])
+
+    def trim_tail(self, seconds):
+        """Drop events in the last ``seconds`` of the recording."""
+        if self._length:
+            self.truncate(self.count_until(self.duration - seconds))
+
+    def cut_indices(self, i, j):
+        """Remove events ``i`` up to (not including) ``j``, keeping later timestamps."""
+        left, _ = self._split(i)
+        _, right = self._split(j)
+        self._commit(left + right)
+
+    def cut(self, t0, t1):
+        """Remove events in [t0, t1) and close the gap."""
+        left, _ = self._split(self.count_before(t0))
+        _, right = self._split(self.count_before(t1))
+        self._commit(left + self._shift(right, t0 - t1))
+
+    def insert_pause(self, t, seconds):
+        """Delay every event at or after ``t`` by ``seconds``."""
+        left, right = self._split(self.count_before(t))
+        self._commit(left + self._shift(right, seconds))
+
+    def splice(self, t, recording, start=0, end=None):
+        """Insert events ``start:end`` of another recording at time ``t``.
+
+        The inserted events keep their relative timing, starting at ``t``,
+        and events at or after ``t`` are delayed by the inserted span.
+        """
+        end = len(recording) if end is None else end
+        if end <= start:
+            return
+        source = len(self.sources)
+        self.sources.append(recording)
+        self._button_maps.append(self._button_map(recording.button_names))
+
+        span = recording.times[end - 1] - recording.times[start]
+        left, right = self._split(self.count_before(t))
+        inserted = (source, start, end, t - recording.times[start])
+        self._commit(left + [inserted] + self._shift(right, span))
+
+    def _button_map(self, names):
+        if names == self.button_names[:len(names)]:
+            return None
+        table = bytearray(range(256))
+        for code, name in enumerate(names):
+            if name not in self.button_names:
+                self.button_names.append(name)
+            table[code] = self.button_names.index(name)
+        return bytes(table)
+
+    def last_click_index(self, pressed):
+        """Index of the last press (or release) event, or -1."""
+        wanted = 1 if pressed else 0
+        for p in range(len(self.pieces) - 1, -1, -1):
+            source, start, end, _ = self.pieces[p]
+            columns = self.sources[source]
+            hi = end
+            while hi > start:
+                lo = max(start, hi - _SCAN_CHUNK)
+                types = _raw(columns.types, lo, hi).tobytes()
+                states = _raw(columns.pressed, lo, hi).tobytes()
+                k = len(types) - 1
+                while k >= 0:
+                    k = types.rfind(EVENT_CLICK, 0, k + 1)
+                    if k < 0:
+                        break
+                    if states[k] == wanted:
+                        return self._starts[p] + lo - start + k
+                    k -= 1
+                hi = lo
+        return -1
+
+    def materialize(self):
+        """Return the edited recording, copying event data only if it changed."""
+        if self.pieces == ((0, 0, len(self.sources[0]), 0.0),):
+            return self.sources[0]
+
+        times, xs, ys = array('d'), array('d'), array('d')
+        types, buttons, pressed = array('B'), array('B'), array('B')
+        for source, start, end, offset in self.pieces:
+            columns = self.sources[source]
+            if offset:
+                times.extend(t + offset for t in memoryview(columns.times)[start:end])
+            else:
+                times.frombytes(_raw(columns.times, start, end))
+            xs.frombytes(_raw(columns.xs, start, end))
+            ys.frombytes(_raw(columns.ys, start, end))
+            types.frombytes(_raw(columns.types, start, end))
+            pressed.frombytes(_raw(columns.pressed, start, end))
+            button_map = self._button_maps[source]
+            if button_map is None:
+                buttons.frombytes(_raw(columns.buttons, start, end))
+            else:
+                buttons.frombytes(_raw(columns.buttons, start, end).tobytes().translate(button_map))
+
+        flags = self.sources[0].flags
+        for recording in self.sources[1:]:
+            flags &= recording.flags
+        return Recording(times, xs, ys, types, buttons, pressed, self.button_names, flags, self.sources[0].source)
@@ -0,0 +1,131 @@
+"""Headless stand-ins for the pynput mouse controller and listener.
+
+They let ``MousePlayer`` and ``MouseRecorder`` run without a display or
+accessibility permissions, e.g. for benchmarks. The controller timestamps
+every action it receives; the listener lets the caller push synthetic
+events into the recorder's callbacks.
+"""
+from array import array
+from time import perf_counter
+
+from plan import resolve_button_name
+
+ACTION_MOVE = 0
+ACTION_PRESS = 1
+ACTION_RELEASE = 2
+
+
+class HeadlessController:
+    """Drop-in for ``pynput.mouse.Controller`` that logs instead of injecting.
+
+    Actions are stored as parallel typed arrays so millions of them can be
+    kept without per-action objects.
+    """
+
+    def __init__(self, clock=perf_counter):
+        self.clock = clock
+        self._position = (0, 0)
+        self.times = array('d')
+        self.kinds = array('B')
+        self.xs = array('d')
+        self.ys = array('d')
+        self.buttons = array('B')  # Index into button_names, 0 for moves
+        self.button_names = ['']
+        self._button_codes = {}
+
+    # MousePlayer compiles plans with this, so buttons stay names and pynput is never imported
+    resolve_button = staticmethod(resolve_button_name)
+
+    def _log(self, kind, button=None):
+        self.times.append(self.clock())
+        self.kinds.append(kind)
+        self.xs.append(self._position[0])
+        self.ys.append(self._position[1])
+        if button is None:
+            self.buttons.append(0)
+            return
+        code = self._button_codes.get(button)
+        if code is None:
+            code = self._button_codes[button] = len(self.button_names)
+            self.button_names.append(str(button))
+        self.buttons.append(code)
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+        self._log(ACTION_MOVE)
+
+    def press(self, button):
+        self._log(ACTION_PRESS, button)
+
+    def release(self, button):
+        self._log(ACTION_RELEASE, button)
+
+    def _log_moves(self, times, plan, start, end):
+        # frombytes wants byte-formatted buffers, so slice the float columns as bytes
+        self.times.frombytes(memoryview(times).cast('B')[start * 8:end * 8])
+        self.kinds.frombytes(bytes(end - start))
+        self.xs.frombytes(plan.xs.cast('B')[start * 8:end * 8])
+        self.ys.frombytes(plan.ys.cast('B')[start * 8:end * 8])
+        self.buttons.frombytes(bytes(end - start))
+
+    def dispatch_batch(self, plan, times, clicks):
+        """Log a whole plan at once: a move per event, then each press or release.
+
+        ``times`` are the fire times of the events and ``clicks`` the indexes
+        of the presses and releases, in order.
+        """
+        codes = [0]
+        for button in plan.button_objects[1:]:
+            code = self._button_codes.get(button)
+            if code is None:
+                code = self._button_codes[button] = len(self.button_names)
+                self.button_names.append(str(button))
+            codes.append(code)
+        ops, xs, ys, buttons = plan.ops, plan.xs, plan.ys, plan.buttons
+        start = 0
+        for i in clicks:
+            self._log_moves(times, plan, start, i + 1)
+            self.times.append(times[i])
+            self.kinds.append(ops[i])
+            self.xs.append(xs[i])
+            self.ys.append(ys[i])
+            self.buttons.append(codes[buttons[i]])
+            start = i + 1
+        self._log_moves(times, plan, start, len(plan))
+        if len(plan):
+            self._position = (plan.xs[-1], plan.ys[-1])
+
+    def __len__(self):
+        return len(self.times)
+
+    def clear(self):
+        for column in (self.times, self.kinds, self.xs, self.ys, self.buttons):
+            del column[:]
+
+
+class HeadlessListener:
+    """Drop-in for ``pynput.mouse.Listener`` driven by ``feed_*`` calls."""
+
+    def __init__(self, on_move=None, on_click=None):
+        self.on_move = on_move
+        self.on_click = on_click
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def feed_move(self, x, y):
+        if self.running and self.on_move:
+            self.on_move(x, y)
+
+    def feed_click(self, x, y, button, pressed):
+        if self.running and self.on_click:
+            self.on_click(x, y, button, pressed)
@@ -0,0 +1,85 @@
+"""Global keyboard shortcut that stops playback from any application.
+
+``StopHotkey`` runs a ``pynput`` global hotkey listener on its own thread
+and calls ``callback`` whenever the combination is pressed. Hotkeys use
+the ``pynput`` syntax, e.g. ``<ctrl>+<alt>+x``. ``pynput`` is imported
+only when the listener starts, so importing this module stays cheap.
+"""
+import logging
+
+DEFAULT_STOP_HOTKEY = '<ctrl>+<alt>+x'
+
+
+def validate_hotkey(hotkey):
+    """Raise ValueError if ``hotkey`` is not a valid pynput hotkey string."""
+    from pynput import keyboard
+
+    if not hotkey or not hotkey.strip():
+        raise ValueError("The hotkey must not be empty")
+    parse = getattr(getattr(keyboard, 'HotKey', None), 'parse', None)
+    if parse is not None:
+        try:
+            parse(hotkey)
+        except ValueError as e:
+            raise ValueError(f"Invalid hotkey {hotkey!r}: {e}") from e
+
+
+class StopHotkey:
+    """Call ``callback`` on a global ``hotkey`` while started."""
+
+    def __init__(self, callback, hotkey=DEFAULT_STOP_HOTKEY):
+        self.callback = callback
+        self.hotkey = hotkey
+        self._listener = None
+
+    @property
+    def running(self):
+        return self._listener is not None
+
+    def _pressed(self):
+        logging.info(f"Stop hotkey {self.hotkey} pressed")
+        self.callback()
+
+    def start(self):
+        """Start listening; returns (success, error_msg)."""
+        from pynput import keyboard
+
+        if self._listener is not None:
+            return True, None
+        try:
+            validate_hotkey(self.hotkey)
+            self._listener = keyboard.GlobalHotKeys({self.hotkey: self._pressed})
+            self._listener.daemon = True
+            self._listener.start()
+        except Exception as e:
+            self._listener = None
+            logging.error(f"Could not register stop hotkey {self.hotkey}: {e}")
+            return False, str(e)
+        logging.info(f"Stop hotkey {self.hotkey} registered")
+        return True, None
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def set_hotkey(self, hotkey):
+        """Switch to ``hotkey``, keeping the old one if it is invalid.
+
+        Returns:
+            tuple: (success, error_msg)
+        """
+        try:
+            validate_hotkey(hotkey)
+        except ValueError as e:
+            return False, str(e)
+        was_running = self.running
+        self.stop()
+        previous, self.hotkey = self.hotkey, hotkey
+        if not was_running:
+            return True, None
+        success, error_msg = self.start()
+        if not success:
+            self.hotkey = previous
+            self.start()
+        return success, error_msg
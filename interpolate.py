@@ -0,0 +1,101 @@
+"""Interpolated playback trajectories at a fixed output rate.
+
+Recordings keep sparse move samples, and replaying them as-is teleports
+the cursor from sample to sample, which some applications see as missing
+hover or drag movement. ``interpolate_plan`` fills every short gap between
+consecutive events with extra moves at ``rate`` Hz, computed for the whole
+plan at once with NumPy, so the playback loop still only waits and
+dispatches.
+
+Recorded events are kept exactly; only new moves are added. Gaps longer
+than ``max_interval`` are left alone because the cursor was resting there,
+and drifting it across the pause would change what the recording did.
+Requires NumPy.
+"""
+from plan import OP_MOVE, PlaybackPlan
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_RATE = 120  # Hz
+DEFAULT_MAX_INTERVAL = 0.25  # Seconds
+METHODS = ('linear', 'catmull-rom')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Interpolated playback requires NumPy (pip install numpy)")
+
+
+def _catmull_rom(p0, p1, p2, p3, u):
+    u2 = u * u
+    u3 = u2 * u
+    return 0.5 * (2 * p1 + (p2 - p0) * u + (2 * p0 - 5 * p1 + 4 * p2 - p3) * u2
+                  + (3 * p1 - p0 - 3 * p2 + p3) * u3)
+
+
+def interpolate_plan(plan, rate=DEFAULT_RATE, method='linear', max_interval=DEFAULT_MAX_INTERVAL):
+    """Return a plan with extra moves so the cursor updates at ``rate`` Hz.
+
+    Args:
+        plan (PlaybackPlan): the plan to fill in, after any retiming
+        rate (float): output rate in Hz
+        method (str): 'linear', or 'catmull-rom' for a curved path through
+            the recorded positions
+        max_interval (float): longest gap in seconds that gets filled
+    """
+    _require_numpy()
+    if method not in METHODS:
+        raise ValueError(f"Unknown interpolation method {method!r}, expected one of {METHODS}")
+    n = len(plan)
+    if n < 2:
+        return plan
+
+    t = np.frombuffer(plan.deadlines, dtype=np.float64)
+    x = np.frombuffer(plan.xs, dtype=np.float64)
+    y = np.frombuffer(plan.ys, dtype=np.float64)
+
+    # Number of new samples strictly inside each gap
+    dt = np.diff(t)
+    fill = np.ceil(dt * rate).astype(np.int64) - 1
+    fill[(dt > max_interval) | (fill < 0)] = 0
+    total = int(fill.sum())
+    if not total:
+        return plan
+
+    # Gap index and 1-based step within the gap of every new sample
+    before = np.concatenate(([0], np.cumsum(fill)))
+    gap = np.repeat(np.arange(n - 1), fill)
+    step = np.arange(total) - before[gap] + 1
+    u = step / rate / dt[gap]
+
+    if method == 'linear':
+        new_x = x[gap] + u * (x[gap + 1] - x[gap])
+        new_y = y[gap] + u * (y[gap + 1] - y[gap])
+    else:
+        prev = np.maximum(gap - 1, 0)
+        after = np.minimum(gap + 2, n - 1)
+        new_x = _catmull_rom(x[prev], x[gap], x[gap + 1], x[after], u)
+        new_y = _catmull_rom(y[prev], y[gap], y[gap + 1], y[after], u)
+
+    # Recorded event i moves up by the new samples before it; new ones follow their gap's start
+    original_at = np.arange(n) + before
+    inserted_at = gap + before[gap] + step
+    size = n + total
+
+    deadlines = np.empty(size)
+    xs = np.empty(size)
+    ys = np.empty(size)
+    ops = np.full(size, OP_MOVE, dtype=np.uint8)
+    buttons = np.zeros(size, dtype=np.uint8)
+    deadlines[original_at] = t
+    deadlines[inserted_at] = t[gap] + step / rate
+    xs[original_at] = x
+    xs[inserted_at] = new_x
+    ys[original_at] = y
+    ys[inserted_at] = new_y
+    ops[original_at] = np.frombuffer(plan.ops, dtype=np.uint8)
+    buttons[original_at] = np.frombuffer(plan.buttons, dtype=np.uint8)
+    return PlaybackPlan(deadlines, ops, xs, ys, buttons, plan.button_objects)
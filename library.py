@@ -0,0 +1,136 @@
+"""Index of every recording in the application data directory.
+
+``RecordingLibrary`` keeps one SQLite row per ``.rmrec`` file, and per
+manifest in the directory's recording store, with its duration, event and
+click counts, bounding box, checksum, size and mtime. Rows come from
+``recording_format.read_summary``, which reads only the header of current
+files and the summary in manifests, so listing and filtering never touch
+event data.
+``refresh`` compares each file's size and mtime with its row and re-reads
+only files that changed.
+"""
+import logging
+import sqlite3
+from pathlib import Path
+from recording_format import MANIFEST_SUFFIX, RECORDING_SUFFIX, RecordingFormatError, read_summary
+
+INDEX_FILENAME = "library.sqlite3"
+RECORDING_PATTERNS = (
+    f"*{RECORDING_SUFFIX}",
+    f"store/manifests/*{MANIFEST_SUFFIX}",  # The store.RecordingStore kept in the directory
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    events INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    clicks INTEGER NOT NULL,
+    min_x REAL NOT NULL,
+    min_y REAL NOT NULL,
+    max_x REAL NOT NULL,
+    max_y REAL NOT NULL,
+    checksum INTEGER NOT NULL
+)
+"""
+
+_COLUMNS = ('path', 'name', 'size', 'mtime_ns', 'events', 'duration', 'clicks',
+            'min_x', 'min_y', 'max_x', 'max_y', 'checksum')
+
+# Sort keys accepted by RecordingLibrary.list
+ORDERINGS = {
+    'newest': 'mtime_ns DESC',
+    'name': 'name',
+    'duration': 'duration DESC',
+    'events': 'events DESC',
+}
+
+
+class RecordingLibrary:
+    """SQLite-backed metadata index of the recordings in ``directory``."""
+
+    def __init__(self, directory, index_path=None):
+        self.directory = Path(directory)
+        self.index_path = Path(index_path) if index_path else self.directory / INDEX_FILENAME
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def refresh(self):
+        """Bring the index up to date with the files on disk.
+
+        Returns:
+            tuple: (number of files indexed or re-indexed, number of rows removed)
+        """
+        known = {row['path']: (row['size'], row['mtime_ns'])
+                 for row in self._db.execute("SELECT path, size, mtime_ns FROM recordings")}
+        updated = 0
+        for path in self._files():
+            stat = path.stat()
+            if known.pop(str(path), None) != (stat.st_size, stat.st_mtime_ns):
+                updated += self.update(path)
+        with self._db:
+            self._db.executemany("DELETE FROM recordings WHERE path = ?", [(path,) for path in known])
+        if updated or known:
+            logging.info(f"Library refreshed: {updated} indexed, {len(known)} removed")
+        return updated, len(known)
+
+    def _files(self):
+        for pattern in RECORDING_PATTERNS:
+            yield from self.directory.glob(pattern)
+
+    def update(self, path):
+        """(Re)index one recording. Returns 1 if it was indexed, 0 if unreadable."""
+        path = Path(path)
+        try:
+            stat = path.stat()
+            summary = read_summary(path)
+        except (OSError, ValueError, RecordingFormatError) as e:
+            logging.warning(f"Skipping unreadable recording {path}: {e}")
+            with self._db:
+                self._db.execute("DELETE FROM recordings WHERE path = ?", (str(path),))
+            return 0
+        row = (str(path), path.stem, stat.st_size, stat.st_mtime_ns, summary['events'], summary['duration'],
+               summary['clicks'], *summary['bbox'], summary['checksum'])
+        with self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO recordings ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                row,
+            )
+        return 1
+
+    def list(self, name=None, min_duration=None, max_duration=None, min_clicks=None, order='newest', limit=None):
+        """Return indexed recordings matching every given filter as dicts."""
+        clauses, params = [], []
+        if name:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name}%")
+        if min_duration is not None:
+            clauses.append("duration >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            clauses.append("duration <= ?")
+            params.append(max_duration)
+        if min_clicks is not None:
+            clauses.append("clicks >= ?")
+            params.append(min_clicks)
+        query = "SELECT * FROM recordings"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {ORDERINGS[order]}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._db.execute(query, params)]
+
+    def get(self, path):
+        row = self._db.execute("SELECT * FROM recordings WHERE path = ?", (str(path),)).fetchone()
+        return dict(row) if row else None
@@ -0,0 +1,130 @@
+"""Logging that never blocks the listener or playback threads.
+
+``setup_logging`` gives the root logger a single ``QueueHandler``: callers
+only put the record on a queue, and a ``QueueListener`` thread does the
+formatting and the file and console I/O. The log file rotates instead of
+being deleted at startup. Calling ``setup_logging`` again is a no-op apart
+from updating the level.
+
+Messages logged once per event can flood the log, so ``RateLimitFilter``
+lets each call site through a few times per second at or below a
+configurable level, INFO by default, and reports how many were
+suppressed. Warnings and errors are never dropped unless asked for.
+"""
+import atexit
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+LOG_FILENAME = "recmouse.log"
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUP_COUNT = 3
+
+# Messages per call site per second let through by RateLimitFilter
+RATE_LIMIT_BURST = 10
+# Highest level rate limited by default, so warnings and errors always get through
+RATE_LIMIT_LEVEL = logging.INFO
+
+_listener = None
+_queue_handler = None
+
+
+def get_log_path():
+    """Get the log file path in the application data directory."""
+    # Use Application Support on macOS
+    app_support = Path.home() / "Library" / "Application Support" / "RecMouse"
+    app_support.mkdir(parents=True, exist_ok=True)
+    return app_support / LOG_FILENAME
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most ``burst`` records per call site per second through.
+
+    Only records at or below ``level`` are limited. The first record let
+    through after a suppressed run carries the number suppressed.
+    """
+
+    def __init__(self, level=RATE_LIMIT_LEVEL, burst=RATE_LIMIT_BURST, clock=time.monotonic):
+        super().__init__()
+        self.level = level
+        self.burst = burst
+        self.clock = clock
+        self._sites = {}  # (pathname, lineno) -> [window start, passed, suppressed]
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        now = self.clock()
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None or now - site[0] >= 1.0:
+            suppressed = site[2] if site else 0
+            self._sites[(record.pathname, record.lineno)] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+            return True
+        if site[1] < self.burst:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+
+def setup_logging(level=logging.DEBUG, rate_limit_level=RATE_LIMIT_LEVEL, log_file=None, console=True):
+    """Route all logging through a queue to a rotating file and the console.
+
+    Args:
+        level: root logger level
+        rate_limit_level: highest level that is rate limited per call site,
+            or None to let everything through
+        log_file: defaults to recmouse.log in the application data directory
+        console: also log to stderr
+    """
+    global _listener, _queue_handler
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    if _listener is not None:
+        return
+
+    log_file = Path(log_file) if log_file else get_log_path()
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = []
+    try:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        # Start each run in a fresh file; earlier runs stay in the backups
+        if log_file.exists() and log_file.stat().st_size:
+            file_handler.doRollover()
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"Error opening log file {log_file}: {e}")
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    if rate_limit_level is not None:
+        _queue_handler.addFilter(RateLimitFilter(rate_limit_level))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    root_logger.addHandler(_queue_handler)
+    atexit.register(shutdown_logging)
+
+    logging.info(f"Logging initialized. Log file: {log_file}")
+    logging.info(f"App data directory: {log_file.parent}")
+
+
+def shutdown_logging():
+    """Flush queued records and remove the queue handler."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,176 @@
+"""Compile recordings into immutable playback plans.
+
+Interpreting a recording means string compares on event types and button
+names for every event. A plan does that work once up front: it holds the
+deadline, opcode and coordinates of every event in typed arrays, and the
+buttons already resolved to ``pynput`` objects, so the playback loop only
+has to wait and dispatch. A plan can be replayed any number of times.
+"""
+from array import array
+
+OP_MOVE = 0
+OP_PRESS = 1
+OP_RELEASE = 2
+
+# Playback speed factors accepted by retime_plan
+MIN_SPEED = 0.25
+MAX_SPEED = 50.0
+
+# Shortest press/release hold that applications reliably register, seconds
+MIN_HOLD = 0.03
+
+# Maps (type << 1 | pressed) to an opcode, see compile_plan
+_OPCODES = bytes([
+    OP_MOVE,     # move
+    OP_MOVE,     # move with a stray pressed flag
+    OP_RELEASE,  # click, released
+    OP_PRESS,    # click, pressed
+]) + bytes(252)
+
+
+def resolve_button(name):
+    """Resolve a recorded button name the same way playback always has."""
+    from pynput.mouse import Button
+    return Button.left if 'left' in name.lower() else Button.right
+
+
+def resolve_button_name(name):
+    """Like resolve_button, but return the button's name, so pynput isn't needed."""
+    return 'Button.left' if 'left' in name.lower() else 'Button.right'
+
+
+class PlaybackPlan:
+    """An immutable, pre-resolved sequence of playback operations.
+
+    ``deadlines`` are offsets in seconds from the start of a run. ``buttons``
+    holds an index into ``button_objects`` for every event.
+    """
+
+    __slots__ = ('deadlines', 'ops', 'xs', 'ys', 'buttons', 'button_objects')
+
+    def __init__(self, deadlines, ops, xs, ys, buttons, button_objects):
+        self.deadlines = memoryview(deadlines).toreadonly()
+        self.ops = memoryview(ops).toreadonly()
+        self.xs = memoryview(xs).toreadonly()
+        self.ys = memoryview(ys).toreadonly()
+        self.buttons = memoryview(buttons).toreadonly()
+        self.button_objects = tuple(button_objects)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    @property
+    def duration(self):
+        return self.deadlines[-1] if len(self.deadlines) else 0.0
+
+    @property
+    def click_count(self):
+        return self.ops.tobytes().count(OP_PRESS)
+
+
+def _copy(column, typecode):
+    copied = array(typecode)
+    copied.frombytes(memoryview(column).cast('B'))
+    return copied
+
+
+def compile_plan(recording, resolve_button=resolve_button, origin=0.0):
+    """Compile a columnar recording into a ``PlaybackPlan``.
+
+    The plan owns copies of the columns, so the recording can be closed
+    once this returns. Deadlines count from ``origin``, the recording time
+    playback starts at, e.g. the start of a section.
+    """
+    # One byte per event, type << 1 | pressed (types and pressed flags are
+    # 0 or 1), which _OPCODES then maps to the opcode in a single pass
+    ops = array('B', bytes(t * 2 + p for t, p in zip(recording.types, recording.pressed)).translate(_OPCODES))
+
+    button_objects = [None] + [resolve_button(name) for name in recording.button_names[1:]]
+    return PlaybackPlan(
+        deadlines=_copy(recording.times, 'd') if not origin else array('d', (t - origin for t in recording.times)),
+        ops=ops,
+        xs=_copy(recording.xs, 'd'),
+        ys=_copy(recording.ys, 'd'),
+        buttons=_copy(recording.buttons, 'B'),
+        button_objects=button_objects,
+    )
+
+
+
+class Retimer:
+    """Retime consecutive pieces of one plan, see ``retime_plan``.
+
+    Keeps the running timeline and held buttons between calls, so a
+    recording streamed in chunks is retimed exactly as if it were whole.
+    """
+
+    def __init__(self, speed=1.0, max_gap=None, min_hold=MIN_HOLD):
+        if not MIN_SPEED <= speed <= MAX_SPEED:
+            raise ValueError(f"Speed must be between {MIN_SPEED}x and {MAX_SPEED}x, got {speed}x")
+        self.speed = speed
+        self.max_gap = max_gap
+        self.min_hold = min_hold
+        self._previous = 0.0
+        self._retimed = 0.0
+        self._held = {}  # Button -> (recorded, retimed) press time
+
+    @property
+    def identity(self):
+        return self.speed == 1.0 and self.max_gap is None
+
+    def retime(self, plan):
+        """Return ``plan``, the next piece of the timeline, with new deadlines."""
+        if self.identity:
+            return plan
+        speed, max_gap, min_hold, held = self.speed, self.max_gap, self.min_hold, self._held
+        button_objects = plan.button_objects
+        previous, retimed = self._previous, self._retimed
+        deadlines = array('d', bytes(8 * len(plan)))
+        for i, (deadline, op, button) in enumerate(zip(plan.deadlines, plan.ops, plan.buttons)):
+            gap = (deadline - previous) / speed
+            if max_gap is not None and gap > max_gap:
+                gap = max_gap
+            retimed += gap
+            previous = deadline
+            if op == OP_PRESS:
+                held[button_objects[button]] = (deadline, retimed)
+            elif op == OP_RELEASE and button_objects[button] in held:
+                pressed_at, retimed_press = held.pop(button_objects[button])
+                hold = min(deadline - pressed_at, min_hold)
+                if retimed - retimed_press < hold:
+                    retimed = retimed_press + hold
+            deadlines[i] = retimed
+        self._previous, self._retimed = previous, retimed
+        return PlaybackPlan(deadlines, plan.ops, plan.xs, plan.ys, plan.buttons, button_objects)
+
+
+def retime_plan(plan, speed=1.0, max_gap=None, min_hold=MIN_HOLD):
+    """Return a plan that plays ``speed`` times faster with idle gaps capped.
+
+    Every gap between consecutive events is divided by ``speed`` and then
+    limited to ``max_gap`` seconds, if given. A release is never moved
+    closer than ``min_hold`` to its press (or than the recorded hold, if
+    that was shorter), so sped-up clicks still register; later events are
+    shifted to keep the order. The columns other than the deadlines are
+    shared with ``plan``.
+    """
+    return Retimer(speed, max_gap, min_hold).retime(plan)
+
+
+def clicks_only_plan(plan):
+    """Return a plan with only the presses and releases of ``plan``.
+
+    Dispatching a press or release moves the cursor to its position first,
+    so playback jumps straight from click to click.
+    """
+    ops = plan.ops.tobytes()
+    keep = [i for i, op in enumerate(ops) if op != OP_MOVE]
+    deadlines, xs, ys, buttons = plan.deadlines, plan.xs, plan.ys, plan.buttons
+    return PlaybackPlan(
+        deadlines=array('d', [deadlines[i] for i in keep]),
+        ops=array('B', [ops[i] for i in keep]),
+        xs=array('d', [xs[i] for i in keep]),
+        ys=array('d', [ys[i] for i in keep]),
+        buttons=array('B', [buttons[i] for i in keep]),
+        button_objects=plan.button_objects,
+    )
@@ -1,22 +1,38 @@
 import os
-from pynput.mouse import Button, Controller
-import rumps
+import re
 import json
 import time
 from pathlib import Path
 import sys
 import logging
-from ApplicationServices import (
-    AXIsProcessTrustedWithOptions,
-)
-from CoreFoundation import (
-    CFStringCreateWithCString,
-    CFDictionaryCreate,
-    kCFStringEncodingUTF8,
-    kCFBooleanTrue,
-    kCFTypeDictionaryKeyCallBacks,
-    kCFTypeDictionaryValueCallBacks,
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from scheduler import PlaybackCancelled, PlaybackScheduler
+from stats import SessionStats, write_snapshot
+from logging_setup import setup_logging
+from plan import OP_MOVE, OP_PRESS, OP_RELEASE, Retimer, clicks_only_plan, compile_plan, resolve_button, retime_plan
+from recording_format import (
+    RECORDING_FILENAME,
+    RecordingFormatError,
+    is_archive,
+    migrate_legacy_recording,
+    time_range,
 )
+from streaming import ReadAhead, iter_chunks, iter_recording_chunks
+from recording_cache import shared_cache
+
+# Pause between repetitions of a plan, seconds
+DEFAULT_REPEAT_GAP = 0.5
+
+# Lateness after which the app's catch-up option skips stale moves, seconds
+DEFAULT_CATCH_UP = 0.05
+
+# Finds the presses and releases in a plan's ops column
+_CLICK_OPS = re.compile(b'[\x01\x02]')
+
+# Prepared plans kept by MousePlayer, keyed by recording file and playback modes
+PLAN_CACHE_SIZE = 4
 
 def check_accessibility_permissions(prompt=True):
     """Check if the app has accessibility permissions.
@@ -25,6 +41,17 @@ def check_accessibility_permissions(prompt=True):
         prompt (bool): If True, show the system permission dialog if needed
     """
     try:
+        # Imported on first use so headless tools don't pay for the PyObjC bridges
+        from ApplicationServices import AXIsProcessTrustedWithOptions
+        from CoreFoundation import (
+            CFStringCreateWithCString,
+            CFDictionaryCreate,
+            kCFStringEncodingUTF8,
+            kCFBooleanTrue,
+            kCFTypeDictionaryKeyCallBacks,
+            kCFTypeDictionaryValueCallBacks,
+        )
+
         if prompt:
             # Create options dictionary to show prompt
             options_key = CFStringCreateWithCString(None, b"AXTrustedCheckOptionPrompt", kCFStringEncodingUTF8)
@@ -51,73 +78,354 @@ def get_app_data_path():
     return app_support
 
 class MousePlayer:
-    def __init__(self):
-        self.mouse = Controller()
+    def __init__(self, controller=None, clock=time.perf_counter, sleep=time.sleep, recording_cache=None):
+        # Any object with position/press/release, e.g. headless.HeadlessController
+        # clock and sleep drive the scheduler, e.g. simulate.VirtualClock for offline runs
+        if controller is None:
+            from pynput.mouse import Controller
+            controller = Controller()
+        self.mouse = controller
+        # Turns recorded button names into what controller.press/release take; pynput buttons
+        # unless the controller brings its own, e.g. HeadlessController keeps the names
+        self.resolve_button = getattr(controller, 'resolve_button', resolve_button)
+        # Loaded recordings shared with the recorder and the app
+        self.recording_cache = recording_cache if recording_cache is not None else shared_cache
         # Use Application Support directory for storing recordings
-        self.recording_file = get_app_data_path() / "recording.json"
+        app_data = get_app_data_path()
+        migrate_legacy_recording(app_data)
+        self.recording_file = app_data / RECORDING_FILENAME
+        # Set by stop(); every wait during playback wakes up on it
+        self.stop_requested = threading.Event()
+        self._stop_requested_at = None
+        self.last_stop_latency = None  # Seconds from stop() until buttons were released
+        self.last_first_event_latency = None  # Seconds from play_stream() until its first event
+        # Hand whole plans to the controller's dispatch_batch instead of waiting per event;
+        # needs a clock that can jump, see simulate.simulated_player
+        self.batch = False
+        # A custom sleep is taken to be exact, so there is nothing to spin for
+        self.scheduler = PlaybackScheduler(
+            spin_threshold=0.002 if sleep is time.sleep else 0.0,
+            clock=clock,
+            sleep=sleep,
+            cancelled=self.stop_requested,
+        )
+        # Playback modes applied by load_plan, see plan.retime_plan
+        self.speed = 1.0
+        self.max_gap = None  # Seconds; cap idle gaps between events when set
+        self.clicks_only = False  # Skip moves and jump from click to click
+        self.output_rate = None  # Hz; interpolate moves up to this rate when set
+        self.interpolation = 'linear'  # Or 'catmull-rom', see interpolate.METHODS
+        # Seconds; once a move is this late, jump to the latest move already due, see _dispatch_catching_up
+        self.catch_up_after = None
+        # Run playback in precision.PrecisionMode: no GC, raised priority, minimal timer slack
+        self.precision = False
+        self.last_precision = None  # What PrecisionMode managed to apply on the last run
+        self._plan_cache = OrderedDict()
+        self._plan_cache_lock = threading.Lock()
+        # Accumulates across play_plan calls until reset_stats, so repeats add up
+        self.session_stats = SessionStats()
         logging.info(f"MousePlayer initialized with recording file: {self.recording_file}")
 
-    def play_recording(self, repeat_count=1):
-        logging.info("Starting play_recording...")
-        
-        if not self.recording_file.exists():
-            logging.warning(f"Recording file not found at: {self.recording_file}")
-            return False, "No recording found. Please record something first."
+    def _load_section(self, recording_file, start, end):
+        """The recording, or only its events with ``start <= time < end``."""
+        if start is None and end is None:
+            return self.recording_cache.get(recording_file)
+        if is_archive(recording_file) and not self.recording_cache.known(recording_file):
+            # Decompress just the blocks of the section instead of the whole archive
+            from archive import Archive
+            with Archive(recording_file) as archive:
+                return archive.load(start, end)
+        recording = self.recording_cache.get(recording_file)
+        return recording.slice(*time_range(recording, start, end))
+
+    def load_plan(self, path=None, start=None, end=None):
+        """Load and compile a recording, by default the recording file.
+
+        ``start`` and ``end`` (seconds of the recording) play only the events
+        in between, with the first deadline counted from ``start``.
+
+        Safe to call from another thread while a plan is playing, e.g. to
+        prepare the next playlist item.
+
+        Returns:
+            tuple: (plan, error_msg) where plan is None if loading failed
+        """
+        recording_file = Path(path) if path is not None else self.recording_file
+        if not recording_file.exists():
+            logging.warning(f"Recording file not found at: {recording_file}")
+            return None, "No recording found. Please record something first."
+
+        # A rewritten recording gets a new mtime and size, so stale plans are never hit
+        stat = recording_file.stat()
+        key = (str(recording_file), stat.st_mtime_ns, stat.st_size, start, end, self.speed, self.max_gap,
+               self.clicks_only, self.output_rate, self.interpolation)
+        with self._plan_cache_lock:
+            plan = self._plan_cache.get(key)
+            if plan is not None:
+                self._plan_cache.move_to_end(key)
+        if plan is not None:
+            logging.info(f"Using cached plan of {len(plan)} events")
+            return plan, None
 
         try:
-            logging.info(f"Reading recording file: {self.recording_file}")
-            with open(self.recording_file, 'r') as f:
-                events = json.load(f)
-                logging.info(f"Successfully loaded {len(events)} events")
-        except json.JSONDecodeError as e:
+            logging.info(f"Reading recording file: {recording_file}")
+            recording = self._load_section(recording_file, start, end)
+        except (json.JSONDecodeError, RecordingFormatError) as e:
             logging.error(f"Failed to parse recording file: {e}")
-            return False, "The recording file is corrupted or invalid."
+            return None, "The recording file is corrupted or invalid."
         except Exception as e:
             logging.error(f"Error reading recording file: {e}")
-            return False, f"Failed to read recording: {str(e)}"
+            return None, f"Failed to read recording: {str(e)}"
 
-        if not events:
+        try:
+            # The recording belongs to the cache, so it stays open
+            plan = compile_plan(recording, self.resolve_button, origin=start or 0.0)
+        except Exception as e:
+            logging.error(f"Error compiling recording: {e}")
+            return None, f"Failed to read recording: {str(e)}"
+
+        if not len(plan):
+            if start is not None or end is not None:
+                logging.warning(f"No events between {start} and {end} s")
+                return None, "The recording has no events in that time range."
             logging.warning("No events found in recording")
-            return False, "The recording is empty. Please record something first."
+            return None, "The recording is empty. Please record something first."
 
+        if self.clicks_only:
+            plan = clicks_only_plan(plan)
+            if not len(plan):
+                logging.warning("No clicks found in recording")
+                return None, "The recording has no clicks to play."
         try:
-            logging.info(f"Starting playback of {len(events)} events")
+            plan = retime_plan(plan, self.speed, self.max_gap)
+        except ValueError as e:
+            logging.error(f"Invalid playback speed: {e}")
+            return None, str(e)
+        if self.output_rate:
+            try:
+                # After retiming, so the rate is what the controller actually sees
+                from interpolate import interpolate_plan
+                plan = interpolate_plan(plan, self.output_rate, self.interpolation)
+            except ImportError as e:
+                logging.warning(f"Skipping interpolation: {e}")
+
+        logging.info(
+            f"Successfully loaded {len(plan)} events ({self.speed}x, max gap {self.max_gap}, "
+            f"clicks only {self.clicks_only}, output rate {self.output_rate}), "
+            f"duration {plan.duration:.2f} s"
+        )
+        with self._plan_cache_lock:
+            self._plan_cache[key] = plan
+            if len(self._plan_cache) > PLAN_CACHE_SIZE:
+                self._plan_cache.popitem(last=False)
+        return plan, None
+
+    def reset_stats(self):
+        """Start a new playback session's stats."""
+        self.session_stats.reset()
+
+    def stats(self):
+        """Snapshot of playback counters, lateness and controller call latency."""
+        return self.session_stats.snapshot()
+
+    def save_stats(self):
+        """Write the playback stats next to the recording file."""
+        write_snapshot(self.recording_file, 'playback', self.stats())
+
+    def stop(self):
+        """Cancel playback from any thread; takes effect within milliseconds."""
+        if not self.stop_requested.is_set():
+            self._stop_requested_at = time.perf_counter()
+            self.stop_requested.set()
+            logging.info("Playback stop requested")
+
+    def reset_stop(self):
+        """Clear a previous stop() so playback can start again."""
+        self.stop_requested.clear()
+        self._stop_requested_at = None
+
+    def _release_held(self, held):
+        for button in held:
+            try:
+                self.mouse.release(button)
+            except Exception as e:
+                logging.error(f"Error releasing {button}: {e}")
+        held.clear()
+
+    def _cancelled(self, held):
+        """Release buttons still held down and record how long stopping took."""
+        self._release_held(held)
+        if self._stop_requested_at is not None:
+            self.last_stop_latency = time.perf_counter() - self._stop_requested_at
+            self.session_stats.histogram('stop_latency').record(self.last_stop_latency)
+            logging.info(f"Playback stopped {self.last_stop_latency * 1000:.2f} ms after the request")
+        self.session_stats.count('stops')
+        return False, None
+
+    def _dispatch(self, plan, held):
+        """Fire every event of ``plan`` at its deadline after the scheduler's start.
+
+        Returns (events fired, events the controller failed on); fewer fire
+        than the plan holds only when late moves are coalesced. Buttons
+        pressed and not yet released are tracked in ``held``.
+
+        Raises:
+            PlaybackCancelled: if stop() is called
+        """
+        if self.batch:
+            return self._dispatch_batch(plan, held)
+        if self.catch_up_after is not None:
+            return self._dispatch_catching_up(plan, held)
+        mouse = self.mouse
+        wait_until = self.scheduler.wait_until
+        clock = self.scheduler.clock
+        button_objects = plan.button_objects
+        record_call = self.session_stats.histogram('controller_call').record
+        errors = 0
+        for deadline, op, x, y, button in zip(plan.deadlines, plan.ops, plan.xs, plan.ys, plan.buttons):
+            wait_until(deadline)
+            try:
+                called = clock()
+                mouse.position = (x, y)
+                if op == OP_PRESS:
+                    mouse.press(button_objects[button])
+                    held.add(button_objects[button])
+                elif op == OP_RELEASE:
+                    mouse.release(button_objects[button])
+                    held.discard(button_objects[button])
+                record_call(clock() - called)
+            except Exception as e:
+                errors += 1
+                logging.error(f"Error during event playback: {str(e)}, op: {op}, position: {(x, y)}")
+                continue  # Try to continue with next event
+        return len(plan), errors
+
+    def _dispatch_catching_up(self, plan, held):
+        """``_dispatch`` that re-syncs with the timeline after a stall.
+
+        When a move is more than ``catch_up_after`` late, the moves after it
+        that are already due are coalesced into the last of them, so the
+        cursor jumps to where it should be now instead of crawling through
+        stale positions. Presses and releases are never skipped, and each
+        one still moves to its own recorded position first.
+        """
+        mouse = self.mouse
+        scheduler = self.scheduler
+        wait_until = scheduler.wait_until
+        clock = scheduler.clock
+        threshold = self.catch_up_after
+        deadlines, ops, xs, ys, buttons = plan.deadlines, plan.ops, plan.xs, plan.ys, plan.buttons
+        button_objects = plan.button_objects
+        record_call = self.session_stats.histogram('controller_call').record
+        record_recovered = self.session_stats.histogram('catch_up').record
+        count = len(plan)
+        errors = coalesced = 0
+        i = 0
+        try:
+            while i < count:
+                op = ops[i]
+                if op == OP_MOVE:
+                    now = clock() - scheduler.start_time
+                    if now - deadlines[i] > threshold:
+                        # Last move due by now, stopping short of the next click
+                        due = bisect_right(deadlines, now, i + 1)
+                        click = _CLICK_OPS.search(ops, i + 1, due)
+                        latest = (click.start() if click else due) - 1
+                        if latest > i:
+                            coalesced += latest - i
+                            record_recovered(deadlines[latest] - deadlines[i])
+                            i = latest
+                x, y, button = xs[i], ys[i], buttons[i]
+                wait_until(deadlines[i])
+                try:
+                    called = clock()
+                    mouse.position = (x, y)
+                    if op == OP_PRESS:
+                        mouse.press(button_objects[button])
+                        held.add(button_objects[button])
+                    elif op == OP_RELEASE:
+                        mouse.release(button_objects[button])
+                        held.discard(button_objects[button])
+                    record_call(clock() - called)
+                except Exception as e:
+                    errors += 1
+                    logging.error(f"Error during event playback: {str(e)}, op: {op}, position: {(x, y)}")
+                i += 1
+        finally:
+            # Counted on cancel too
+            if coalesced:
+                self.session_stats.count('coalesced', coalesced)
+                logging.info(f"Caught up by coalescing {coalesced} late moves")
+        return count - coalesced, errors
+
+    def _dispatch_batch(self, plan, held):
+        times = self.scheduler.fire_all(plan.deadlines)
+        clicks = [match.start() for match in _CLICK_OPS.finditer(plan.ops)]
+        button_objects = plan.button_objects
+        for i in clicks:
+            if plan.ops[i] == OP_PRESS:
+                held.add(button_objects[plan.buttons[i]])
+            else:
+                held.discard(button_objects[plan.buttons[i]])
+        self.mouse.dispatch_batch(plan, times, clicks)
+        return len(plan), 0
+
+    def _precise(self, play, *args):
+        """Call ``play(*args)`` in PrecisionMode if ``precision`` is set."""
+        if not self.precision:
+            return play(*args)
+        from precision import PrecisionMode
+        with PrecisionMode() as mode:
+            self.last_precision = mode.applied
+            self.session_stats.count('precision_runs')
+            return play(*args)
+
+    def play_plan(self, plan, repeat_count=1, gap=DEFAULT_REPEAT_GAP):
+        """Play a compiled plan ``repeat_count`` times, ``gap`` seconds apart.
+
+        Returns:
+            tuple: (success, error_msg); (False, None) if stopped by stop()
+        """
+        return self._precise(self._play_plan, plan, repeat_count, gap)
+
+    def _play_plan(self, plan, repeat_count, gap):
+        scheduler = self.scheduler
+        session_stats = self.session_stats
+        lateness = session_stats.histogram('lateness')
+        held = set()  # Buttons pressed and not yet released, released again on stop
+
+        try:
+            logging.info(f"Starting playback of {len(plan)} events")
             for i in range(repeat_count):
+                if self.stop_requested.is_set():
+                    return self._cancelled(held)
                 logging.info(f"Starting playback iteration {i+1}/{repeat_count}")
-                # Get the initial time
-                start_time = time.time()
-                last_event_time = 0
-
-                for event in events:
-                    try:
-                        # Wait for the appropriate time
-                        current_time = time.time() - start_time
-                        wait_time = event['time'] - last_event_time
-                        if wait_time > 0:
-                            time.sleep(wait_time)
-
-                        # Execute the event
-                        if event['type'] == 'move':
-                            logging.debug(f"Moving mouse to {event['x']}, {event['y']}")
-                            self.mouse.position = (event['x'], event['y'])
-                        elif event['type'] == 'click':
-                            logging.info(f"Click event at {event['x']}, {event['y']}, button: {event['button']}, pressed: {event['pressed']}")
-                            self.mouse.position = (event['x'], event['y'])
-                            button = Button.left if 'left' in event['button'].lower() else Button.right
-                            if event['pressed']:
-                                self.mouse.press(button)
-                            else:
-                                self.mouse.release(button)
-
-                        last_event_time = event['time']
-                    except Exception as e:
-                        logging.error(f"Error during event playback: {str(e)}, event: {event}")
-                        continue  # Try to continue with next event
-                
+                # Every event fires at start + its deadline so lateness never accumulates
+                scheduler.start()
+
+                try:
+                    fired, errors = self._dispatch(plan, held)
+                except PlaybackCancelled:
+                    lateness.record_all(scheduler.lateness)
+                    return self._cancelled(held)
+
+                # A section can end between a press and its release
+                self._release_held(held)
+                # The scheduler already keeps per-event lateness; fold it in off the hot path
+                lateness.record_all(scheduler.lateness)
+                # Coalesced moves are counted as 'coalesced' only
+                session_stats.count('events', fired)
+                session_stats.count('iterations')
+                session_stats.count('errors', errors)
+                summary = scheduler.summary()
+                logging.info(
+                    f"Lateness over {summary['count']} events: mean {summary['mean_ms']:.3f} ms, "
+                    f"p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms, max {summary['max_ms']:.3f} ms"
+                )
                 logging.info(f"Completed iteration {i+1}/{repeat_count}")
-                # Add a small delay between repetitions
-                if repeat_count > 1 and i < repeat_count - 1:
-                    time.sleep(0.5)
+                # Pause between repetitions, waking early on stop()
+                if gap > 0 and i < repeat_count - 1:
+                    self.scheduler.pause(gap)
 
             logging.info("Playback completed successfully")
             return True, None
@@ -127,9 +435,126 @@ class MousePlayer:
             logging.error(error_msg)
             return False, error_msg
 
+    def _stream_plans(self, path, retimer, start=None, end=None):
+        """Yield ``path`` as small plans with the playback modes applied; runs on the read-ahead thread."""
+        # A recording the cache already holds is chunked from memory instead of re-read
+        cached = self.recording_cache.peek(path)
+        if cached is not None:
+            if start is not None or end is not None:
+                cached = cached.slice(*time_range(cached, start, end))
+            chunks = iter_recording_chunks(cached)
+        else:
+            chunks = iter_chunks(path, start=start, end=end)
+        for chunk in chunks:
+            plan = compile_plan(chunk, self.resolve_button, origin=start or 0.0)
+            if self.clicks_only:
+                plan = clicks_only_plan(plan)
+            if len(plan):
+                yield retimer.retime(plan)
+
+    def play_stream(self, path=None, repeat_count=1, gap=DEFAULT_REPEAT_GAP, start=None, end=None):
+        """Play a recording while it is still being read.
+
+        Events are read, compiled and retimed a chunk at a time on a
+        background thread, so the first event plays after reading one chunk
+        however long the recording is, and memory stays bounded.
+        Interpolation needs the whole plan, so with ``output_rate`` set this
+        falls back to ``load_plan`` and ``play_plan``.
+
+        ``start`` and ``end`` (seconds) play a section, see ``load_plan``;
+        an archive is read from the block holding ``start`` on.
+
+        Returns:
+            tuple: (success, error_msg); (False, None) if stopped by stop()
+        """
+        return self._precise(self._play_stream, path, repeat_count, gap, start, end)
+
+    def _play_stream(self, path, repeat_count, gap, start, end):
+        recording_file = Path(path) if path is not None else self.recording_file
+        if self.output_rate:
+            plan, error_msg = self.load_plan(recording_file, start, end)
+            if plan is None:
+                return False, error_msg
+            return self._play_plan(plan, repeat_count, gap)
+        if not recording_file.exists():
+            logging.warning(f"Recording file not found at: {recording_file}")
+            return False, "No recording found. Please record something first."
+
+        scheduler = self.scheduler
+        session_stats = self.session_stats
+        lateness = session_stats.histogram('lateness')
+        first_event = session_stats.histogram('first_event')
+        held = set()
+        logging.info(f"Streaming playback of {recording_file}")
+        for i in range(repeat_count):
+            if self.stop_requested.is_set():
+                return self._cancelled(held)
+            requested = time.perf_counter()
+            try:
+                retimer = Retimer(self.speed, self.max_gap)
+            except ValueError as e:
+                logging.error(f"Invalid playback speed: {e}")
+                return False, str(e)
+
+            events = errors = 0
+            with ReadAhead(self._stream_plans(recording_file, retimer, start, end)) as plans:
+                try:
+                    for plan in plans:
+                        if not events:
+                            # Deadlines count from the first chunk's arrival
+                            scheduler.start()
+                            self.last_first_event_latency = time.perf_counter() - requested
+                            first_event.record(self.last_first_event_latency)
+                        fired, failed = self._dispatch(plan, held)
+                        events += fired
+                        errors += failed
+                        # Fold lateness in per chunk so it doesn't grow with the recording
+                        lateness.record_all(scheduler.lateness)
+                        del scheduler.lateness[:]
+                except PlaybackCancelled:
+                    lateness.record_all(scheduler.lateness)
+                    return self._cancelled(held)
+                except (json.JSONDecodeError, RecordingFormatError) as e:
+                    self._release_held(held)
+                    logging.error(f"Failed to parse recording file: {e}")
+                    return False, "The recording file is corrupted or invalid."
+                except Exception as e:
+                    self._release_held(held)
+                    logging.error(f"Error reading recording file: {e}")
+                    return False, f"Failed to read recording: {str(e)}"
+
+            if not events:
+                if self.clicks_only:
+                    return False, "The recording has no clicks to play."
+                if start is not None or end is not None:
+                    return False, "The recording has no events in that time range."
+                return False, "The recording is empty. Please record something first."
+            self._release_held(held)
+            session_stats.count('events', events)
+            session_stats.count('iterations')
+            session_stats.count('errors', errors)
+            logging.info(
+                f"Streamed {events} events, first after {self.last_first_event_latency * 1000:.2f} ms "
+                f"(iteration {i+1}/{repeat_count})"
+            )
+            # Pause between repetitions, waking early on stop()
+            if gap > 0 and i < repeat_count - 1:
+                self.scheduler.pause(gap)
+        return True, None
+
+    def play_recording(self, repeat_count=1, start=None, end=None):
+        logging.info("Starting play_recording...")
+        self.reset_stop()
+        self.reset_stats()
+        result = self.play_stream(repeat_count=repeat_count, start=start, end=end)
+        self.save_stats()
+        return result
+
 if __name__ == "__main__":
+    setup_logging()
     player = MousePlayer()
     try:
         player.play_recording()
     except KeyboardInterrupt:
+        import rumps
         rumps.notification("Info", "Playback terminated by user.", "") 
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""Back-to-back replay of several recordings.
+
+A ``Playlist`` plays an ordered list of ``PlaylistEntry`` items, each with
+its own repeat count and the pause after each run. Every recording is
+compiled once per visit and reused for all of its repeats. While one entry
+plays, the next one is loaded and compiled on a background thread, so
+switching recordings costs no more than repeating one.
+
+Memory stays constant however long the playlist runs: it holds at most
+the current and the next plan, and per-entry stats are running totals.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+DEFAULT_GAP = 0.5  # Seconds after each run
+
+
+class PlaylistEntry:
+    """One recording in a playlist.
+
+    ``repeats`` of None repeats the entry until the playlist is stopped.
+    """
+
+    __slots__ = ('path', 'repeats', 'gap')
+
+    def __init__(self, path, repeats=1, gap=DEFAULT_GAP):
+        if repeats is not None and repeats < 1:
+            raise ValueError(f"Repeats must be at least 1, got {repeats}")
+        if gap < 0:
+            raise ValueError(f"Gap must not be negative, got {gap}")
+        self.path = Path(path)
+        self.repeats = repeats
+        self.gap = gap
+
+    @classmethod
+    def parse(cls, spec):
+        """Build an entry from ``PATH[:REPEATS[:GAP]]``; a REPEATS of 0 means forever."""
+        path, _, rest = spec.partition(':')
+        repeats, _, gap = rest.partition(':')
+        repeats = int(repeats) if repeats else 1
+        return cls(path, repeats or None, float(gap) if gap else DEFAULT_GAP)
+
+
+class Playlist:
+    """Play ``entries`` in order, ``loops`` times over (None loops forever).
+
+    ``on_progress(entry_index, run, repeats)`` is called before every run,
+    with ``run`` counting from 1.
+    """
+
+    def __init__(self, player, entries, loops=1, on_progress=None):
+        if not entries:
+            raise ValueError("A playlist needs at least one entry")
+        self.player = player
+        self.entries = list(entries)
+        self.loops = loops
+        self.on_progress = on_progress
+        self._stop = threading.Event()
+        self.item_stats = [self._empty_stats(entry) for entry in self.entries]
+
+    @staticmethod
+    def _empty_stats(entry):
+        return {
+            'path': str(entry.path),
+            'runs': 0,
+            'events': 0,
+            'play_s': 0.0,
+            'last_run_s': 0.0,
+            'load_s': 0.0,
+            'max_lateness_ms': 0.0,
+        }
+
+    def stop(self):
+        """Stop playing, cancelling the current run within milliseconds."""
+        self._stop.set()
+        self.player.stop()
+
+    def _positions(self):
+        """Yield entry indexes in play order without materializing the sequence."""
+        loop = 0
+        while self.loops is None or loop < self.loops:
+            yield from range(len(self.entries))
+            loop += 1
+
+    def _load(self, index):
+        started = perf_counter()
+        plan, error_msg = self.player.load_plan(self.entries[index].path)
+        self.item_stats[index]['load_s'] += perf_counter() - started
+        return plan, error_msg
+
+    def run(self):
+        """Play the playlist.
+
+        Returns:
+            tuple: (success, error_msg)
+        """
+        self.player.reset_stop()
+        positions = self._positions()
+        current = next(positions)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='playlist-preload') as preloader:
+            pending = preloader.submit(self._load, current)
+            while True:
+                plan, error_msg = pending.result()
+                if plan is None:
+                    return False, f"{self.entries[current].path.name}: {error_msg}"
+
+                following = next(positions, None)
+                if following is not None:
+                    # Compile the next entry while this one plays
+                    pending = preloader.submit(self._load, following)
+
+                success, error_msg = self._play_entry(current, plan, last=following is None)
+                if not success or self._stop.is_set() or following is None:
+                    return success, error_msg
+                current = following
+
+    def _play_entry(self, index, plan, last=False):
+        entry = self.entries[index]
+        stats = self.item_stats[index]
+        run = 0
+        while entry.repeats is None or run < entry.repeats:
+            run += 1
+            if self.on_progress:
+                self.on_progress(index, run, entry.repeats)
+            # On the player's clock, so simulated playlists report simulated time
+            clock = self.player.scheduler.clock
+            started = clock()
+            success, error_msg = self.player.play_plan(plan, gap=0)
+            elapsed = clock() - started
+            if not success:
+                return False, error_msg
+
+            lateness = self.player.scheduler.summary()
+            stats['runs'] += 1
+            stats['events'] += len(plan)
+            stats['play_s'] += elapsed
+            stats['last_run_s'] = elapsed
+            stats['max_lateness_ms'] = max(stats['max_lateness_ms'], lateness['max_ms'])
+            if self._stop.is_set() or (last and run == entry.repeats):
+                break
+            if entry.gap > 0:
+                self.player.scheduler.pause(entry.gap)
+        logging.info(
+            f"Playlist entry {entry.path.name}: {stats['runs']} runs, {stats['play_s']:.2f} s playing, "
+            f"max lateness {stats['max_lateness_ms']:.3f} ms"
+        )
+        return True, None
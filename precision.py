@@ -0,0 +1,140 @@
+"""Reduce timing jitter of the playback thread.
+
+``PrecisionMode`` is entered on the playback thread for the length of a
+run. It:
+
+- collects once, then freezes and disables the cyclic garbage collector,
+  so no collection can pause playback; ``gc.freeze`` moves everything
+  allocated before the run out of the collector's reach
+- raises the thread's scheduling priority as far as the OS allows:
+  SCHED_FIFO on Linux when permitted, else a lower nice value; the
+  user-interactive QoS class on macOS
+- sets the thread's timer slack to 1 ns on Linux, so sleeps end on time
+
+Each step is best effort: one the OS refuses is skipped and logged.
+Everything is undone on exit, and ``applied`` lists what took effect.
+Reference cycles created by any thread during the run are only freed once
+the collector is enabled again at the end.
+
+Usage:
+    with PrecisionMode() as mode:
+        player.play_plan(plan)
+    print(mode.applied)
+"""
+import gc
+import logging
+import os
+import sys
+
+REALTIME_PRIORITY = 10  # SCHED_FIFO priority; low, so kernel threads still come first
+NICE_BOOST = 10  # Nice decrement tried when real-time scheduling is not permitted
+TIMER_SLACK_NS = 1
+
+# Linux prctl options
+_PR_SET_TIMERSLACK = 29
+_PR_GET_TIMERSLACK = 30
+# macOS qos_class_t
+_QOS_CLASS_USER_INTERACTIVE = 0x21
+
+
+def _libc():
+    import ctypes
+    import ctypes.util
+    return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def _prctl(libc, option, value=0):
+    from ctypes import c_int, c_ulong
+    return libc.prctl(c_int(option), c_ulong(value), c_ulong(0), c_ulong(0), c_ulong(0))
+
+
+class PrecisionMode:
+    """Context manager that hardens the calling thread against jitter, see module docs."""
+
+    def __init__(self, gc_freeze=True, priority=True, timer_slack=True):
+        self.gc_freeze = gc_freeze
+        self.priority = priority
+        self.timer_slack = timer_slack
+        self.applied = {}
+        self._undo = []
+
+    def __enter__(self):
+        if self.priority:
+            self._raise_priority()
+        if self.timer_slack:
+            self._reduce_timer_slack()
+        # Last, so nothing else allocates after the collection
+        if self.gc_freeze:
+            self._freeze_gc()
+        logging.info(f"Precision playback: {self.applied or 'nothing could be applied'}")
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._undo:
+            undo = self._undo.pop()
+            try:
+                undo()
+            except (OSError, AttributeError) as e:
+                logging.warning(f"Failed to undo a precision setting: {e}")
+
+    def _freeze_gc(self):
+        enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+
+        def undo():
+            gc.unfreeze()
+            if enabled:
+                gc.enable()
+        self._undo.append(undo)
+        self.applied['gc'] = 'frozen and disabled'
+
+    def _raise_priority(self):
+        if sys.platform == 'darwin':
+            self._set_qos()
+            return
+        if hasattr(os, 'sched_setscheduler'):
+            try:
+                policy, param = os.sched_getscheduler(0), os.sched_getparam(0)
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(REALTIME_PRIORITY))
+                self._undo.append(lambda: os.sched_setscheduler(0, policy, param))
+                self.applied['priority'] = f"SCHED_FIFO {REALTIME_PRIORITY}"
+                return
+            except OSError as e:
+                logging.info(f"Real-time scheduling not permitted: {e}")
+        if hasattr(os, 'setpriority'):
+            try:
+                niceness = os.getpriority(os.PRIO_PROCESS, 0)
+                os.setpriority(os.PRIO_PROCESS, 0, niceness - NICE_BOOST)
+                # Raising the nice value again is always permitted
+                self._undo.append(lambda: os.setpriority(os.PRIO_PROCESS, 0, niceness))
+                self.applied['priority'] = f"nice {niceness - NICE_BOOST}"
+            except OSError as e:
+                logging.info(f"Raising priority not permitted: {e}")
+
+    def _set_qos(self):
+        try:
+            libc = _libc()
+            previous = libc.qos_class_self()
+            if libc.pthread_set_qos_class_self_np(_QOS_CLASS_USER_INTERACTIVE, 0) != 0:
+                logging.info("Setting the user-interactive QoS class failed")
+                return
+            self._undo.append(lambda: libc.pthread_set_qos_class_self_np(previous, 0))
+            self.applied['priority'] = 'QoS user-interactive'
+        except (OSError, AttributeError) as e:
+            logging.info(f"QoS classes unavailable: {e}")
+
+    def _reduce_timer_slack(self):
+        if not sys.platform.startswith('linux'):
+            return
+        try:
+            libc = _libc()
+            previous = _prctl(libc, _PR_GET_TIMERSLACK)
+            if previous < 0 or _prctl(libc, _PR_SET_TIMERSLACK, TIMER_SLACK_NS) != 0:
+                logging.info("Setting timer slack failed")
+                return
+            self._undo.append(lambda: _prctl(libc, _PR_SET_TIMERSLACK, previous))
+            self.applied['timer_slack_ns'] = TIMER_SLACK_NS
+        except (OSError, AttributeError) as e:
+            logging.info(f"Timer slack unavailable: {e}")
@@ -1,16 +1,16 @@
-from pynput import mouse, keyboard
-from time import time, sleep
+from time import perf_counter, time
 import logging
-from colorama import Fore, Style, init
 import threading
-import sys
-import rumps
-import json
 from pathlib import Path
 import os
-
-# Initialize colorama
-init()
+from recording_format import RECORDING_FILENAME, RECORDING_SUFFIX, convert, save_as
+from capture import CALLBACK_BUDGET_US, CaptureBuffer, measure_callback_cost
+from segments import SEGMENT_SUFFIX, SegmentWriter, finalize_segment
+from sampling import DROP, KEEP_PENDING, SamplingPolicy
+from editor import RecordingEditor
+from logging_setup import setup_logging
+from stats import SessionStats, write_snapshot
+from recording_cache import shared_cache
 
 def get_app_data_path():
     """Get the application data directory path."""
@@ -19,41 +19,14 @@ def get_app_data_path():
     app_support.mkdir(parents=True, exist_ok=True)
     return app_support
 
-def setup_logging():
-    """Configure logging to write to both file and console."""
-    app_data = get_app_data_path()
-    log_file = app_data / "recmouse.log"
-    
-    # Delete old log file if it exists
+def notify(title, subtitle, message):
+    """Show a notification when running under the status bar app."""
+    # Imported on first use so headless recording doesn't need the GUI stack
     try:
-        if log_file.exists():
-            log_file.unlink()
-            logging.info(f"Deleted old log file")
-    except Exception as e:
-        print(f"Error deleting old log file: {e}")
-    
-    # Create a formatter that includes timestamps
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    # Set up file handler
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(formatter)
-    
-    # Set up console handler with color
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
-    logging.info(f"Logging initialized. Log file: {log_file}")
-    logging.info(f"App data directory: {app_data}")
-
-# Configure logging
-setup_logging()
+        import rumps
+    except ImportError:
+        return
+    rumps.notification(title, subtitle, message)
 
 class StatusBarApp:
     def __init__(self):
@@ -66,15 +39,32 @@ class StatusBarApp:
         logging.info(f"Recording state changed to: {is_recording}")
 
 class MouseRecorder:
-    def __init__(self, status_app):
+    def __init__(self, status_app, streaming=False, sampling='balanced', listener_factory=None):
         try:
-            self.recording = []
+            # Builds the mouse listener, e.g. headless.HeadlessListener; defaults to pynput
+            if listener_factory is None:
+                from pynput.mouse import Listener as listener_factory
+            self.listener_factory = listener_factory
+            self.recording = CaptureBuffer()
+            # Held by listener callbacks while appending, and by the segment writer while draining
+            self._capture_lock = threading.Lock()
+            # Stream events to an append-only segment instead of keeping the whole session in memory
+            self.streaming = streaming
+            self.segment_writer = None
+            # Editor over the last stopped recording, see stop_recording
+            self.editor = None
             self.start_time = None
             self.mouse_listener = None
-            self.last_move_time = 0  # For throttling move events
-            self.move_throttle = 0.016  # ~60fps, adjust if needed
+            # Decides which move events are worth keeping, see sampling.PRESETS
+            self.sampling = SamplingPolicy.preset(sampling)
+            self.simplify_epsilon = None  # Pixels; simplify move paths on save when set
+            # Per-session counters and callback latency, see stats()
+            self.session_stats = SessionStats()
+            self._callback_latency = self.session_stats.histogram('callback')
+            self._clicks = 0
+            self._session_seconds = 0.0
             # Use Application Support directory for storing recordings
-            self.recording_file = get_app_data_path() / "recording.json"
+            self.recording_file = get_app_data_path() / RECORDING_FILENAME
             self.status_app = status_app
             self.status_app.recorder = self
             logging.info(f"MouseRecorder initialized")
@@ -82,49 +72,74 @@ class MouseRecorder:
             logging.info(f"Recording file exists: {self.recording_file.exists()}")
             if self.recording_file.exists():
                 logging.info(f"Recording file permissions: {oct(self.recording_file.stat().st_mode)}")
+            self.check_callback_budget()
         except Exception as e:
             logging.error(f"Error in MouseRecorder initialization: {e}", exc_info=True)
             raise
 
+    # Listener callbacks run on the pynput thread: keep them to index stores, no logging
     def on_move(self, x, y):
         if self.start_time is None:
             return
-        
-        current_time = time() - self.start_time
-        # Throttle movement events
-        if current_time - self.last_move_time < self.move_throttle:
-            return
-            
-        event = {
-            'type': 'move',
-            'x': x,
-            'y': y,
-            'time': current_time
-        }
-        self.recording.append(event)
-        self.last_move_time = current_time
-        logging.debug(f"Recorded move: {event}")  # Use debug level for move events
+
+        now = perf_counter()
+        current_time = now - self.start_time
+        decision = self.sampling.offer(current_time, x, y)
+        if decision != DROP:
+            with self._capture_lock:
+                if decision == KEEP_PENDING:
+                    sampling = self.sampling
+                    self.recording.append_move(sampling.pending_t, sampling.pending_x, sampling.pending_y)
+                self.recording.append_move(current_time, x, y)
+        self._callback_latency.record(perf_counter() - now)
 
     def on_click(self, x, y, button, pressed):
         if self.start_time is None:
             return
-            
-        event = {
-            'type': 'click',
-            'x': x,
-            'y': y,
-            'button': str(button),
-            'pressed': pressed,
-            'time': time() - self.start_time
-        }
-        self.recording.append(event)
-        logging.info(f"Recorded click: {event}")
+
+        now = perf_counter()
+        current_time = now - self.start_time
+        with self._capture_lock:
+            # Keep the exact position the cursor reached before the click
+            sampling = self.sampling
+            if sampling.flush():
+                self.recording.append_move(sampling.pending_t, sampling.pending_x, sampling.pending_y)
+            self.recording.append_click(current_time, x, y, button, pressed)
+        if pressed:
+            self._clicks += 1  # A click is a press and its release
+        self._callback_latency.record(perf_counter() - now)
+
+    def check_callback_budget(self):
+        """Measure listener callback cost on a scratch buffer and warn if over budget."""
+        recording, start_time, sampling = self.recording, self.start_time, self.sampling
+        try:
+            self.recording = CaptureBuffer()
+            self.start_time = perf_counter()
+            # Keep every move so the full capture path is measured, not the drop early-out
+            self.sampling = SamplingPolicy(min_distance=0, min_angle=0, max_gap=0)
+            # Buttons are only hashed and named, so a stand-in avoids importing pynput here
+            cost = measure_callback_cost(self.on_move, self.on_click, 'Button.left')
+        finally:
+            self.recording, self.start_time, self.sampling = recording, start_time, sampling
+
+        logging.info(f"Listener callback cost: move {cost['move_us']:.2f} us, click {cost['click_us']:.2f} us")
+        if max(cost.values()) > CALLBACK_BUDGET_US:
+            logging.warning(f"Listener callbacks exceed the {CALLBACK_BUDGET_US} us budget")
+        return cost
 
     def start_recording(self):
         try:
-            self.recording = []
-            self.start_time = time()
-            self.mouse_listener = mouse.Listener(
+            self.recording = CaptureBuffer()
+            self.editor = None
+            self.sampling.reset()
+            self.session_stats.reset()
+            self._clicks = 0
+            self.start_time = perf_counter()
+            if self.streaming:
+                segment_file = self.recording_file.parent / f"session-{int(time())}{SEGMENT_SUFFIX}"
+                self.segment_writer = SegmentWriter(self.recording, self._capture_lock, segment_file)
+                self.segment_writer.start()
+            self.mouse_listener = self.listener_factory(
                 on_move=self.on_move,
                 on_click=self.on_click
             )
@@ -134,26 +149,70 @@ class MouseRecorder:
         except Exception as e:
             error_msg = f"Failed to start recording: {str(e)}"
             logging.error(error_msg, exc_info=True)
-            rumps.notification("Error", "Recording Error", error_msg)
+            notify("Error", "Recording Error", error_msg)
+
+    def stop_recording(self, trim_last_click=False):
+        """Stop capturing and save the recording.
 
-    def stop_recording(self):
+        Args:
+            trim_last_click (bool): drop the click that stopped the recording
+                and the last two seconds before saving
+        """
         if self.mouse_listener:
             try:
                 self.mouse_listener.stop()
                 self.mouse_listener = None
+                self._session_seconds = perf_counter() - self.start_time
                 self.start_time = None
-                
+                with self._capture_lock:
+                    # The last move may still be held back as a pending sample
+                    sampling = self.sampling
+                    if sampling.flush():
+                        self.recording.append_move(sampling.pending_t, sampling.pending_x, sampling.pending_y)
+                writer, self.segment_writer = self.segment_writer, None
+                if writer is not None:
+                    # Everything but the held-back tail is already on disk
+                    writer.stop()
+
+                # Edit whatever is still in memory; capture has stopped so the buffer can't grow
+                self.editor = RecordingEditor(self.recording.view())
+                if trim_last_click:
+                    self.remove_last_click()
+
                 # Save recording to file
                 logging.info(f"Saving recording to: {self.recording_file}")
-                logging.info(f"Number of events: {len(self.recording)}")
                 logging.info(f"Current working directory: {os.getcwd()}")
                 
                 # Ensure directory exists
                 self.recording_file.parent.mkdir(parents=True, exist_ok=True)
                 
                 try:
-                    with open(self.recording_file, 'w') as f:
-                        json.dump(self.recording, f)
+                    edited = self.editor.materialize()
+                    if writer is not None:
+                        writer.close(tail=edited)
+                        if self.recording_file.suffix == RECORDING_SUFFIX:
+                            count = finalize_segment(writer.path, self.recording_file)
+                        else:
+                            # Other formats, e.g. a store manifest, are written from the finished binary file
+                            binary_file = writer.path.with_suffix(RECORDING_SUFFIX)
+                            count = finalize_segment(writer.path, binary_file)
+                            convert(binary_file, self.recording_file)
+                            binary_file.unlink()
+                        writer.path.unlink()
+                    else:
+                        count = len(edited)
+                        # The suffix picks the format; .rmman saves into a store.RecordingStore
+                        save_as(edited, self.recording_file)
+                    logging.info(f"Number of events: {count}")
+                    logging.info(f"Move sampling kept {self.sampling.kept}, dropped {self.sampling.dropped}")
+                    if self.simplify_epsilon is not None:
+                        self.simplify_saved_recording()
+                    # Hand the saved recording to the player without it re-reading the file
+                    if writer is None and self.simplify_epsilon is None:
+                        shared_cache.publish(self.recording_file, edited)
+                    else:
+                        shared_cache.publish(self.recording_file)
+                    write_snapshot(self.recording_file, 'recording', self.stats(), replace=True)
                     logging.info("Successfully saved recording")
                     logging.info(f"File size after save: {self.recording_file.stat().st_size} bytes")
                 except Exception as e:
@@ -165,57 +224,73 @@ class MouseRecorder:
             except Exception as e:
                 error_msg = f"Failed to save recording: {str(e)}"
                 logging.error(error_msg, exc_info=True)
-                rumps.notification("Error", "Save Error", error_msg)
+                notify("Error", "Save Error", error_msg)
+
+    def stats(self):
+        """Snapshot of the current or last recording session's counters and latencies."""
+        if self.start_time is not None:
+            seconds = perf_counter() - self.start_time
+        else:
+            seconds = self._session_seconds
+        sampling = self.sampling
+        moves = sampling.kept + sampling.dropped
+        self.session_stats.counters.update({
+            'duration_s': seconds,
+            'moves_received': moves,
+            'moves_kept': sampling.kept,
+            'moves_dropped': sampling.dropped,
+            'clicks': self._clicks,
+            'capture_rate_hz': moves / seconds if seconds else 0.0,
+        })
+        return self.session_stats.snapshot()
+
+    def simplify_saved_recording(self):
+        """Drop redundant move events from the saved recording."""
+        try:
+            from simplify import simplify_file
+            report = simplify_file(self.recording_file, epsilon=self.simplify_epsilon)
+        except ImportError as e:
+            logging.warning(f"Skipping simplification: {e}")
+            return
+        logging.info(
+            f"Simplified recording: {report['original_events']} -> {report['kept_events']} events "
+            f"(ratio {report['compression_ratio']:.2f}, max error {report['max_spatial_error']:.2f} px, "
+            f"{report['max_temporal_error'] * 1000:.1f} ms)"
+        )
 
     def remove_last_seconds(self, seconds):
-        if not self.recording:
+        """Drop the last ``seconds`` of the recording being stopped."""
+        editor = self.editor
+        if editor is None or not len(editor):
             return
-            
-        # Get the time of the last event
-        last_time = self.recording[-1]['time']
-        cutoff_time = last_time - seconds
-        
-        # Find the index where we should cut
-        cut_index = len(self.recording)
-        for i in range(len(self.recording) - 1, -1, -1):
-            if self.recording[i]['time'] <= cutoff_time:
-                cut_index = i + 1
-                break
-        
-        # Remove events only after the cutoff time
-        self.recording = self.recording[:cut_index]
-        logging.info(f"Removed events from last {seconds} seconds, remaining events: {len(self.recording)}")
+
+        # Remove events only after the cutoff time, if any event precedes it
+        cut_index = editor.count_until(editor.duration - seconds)
+        if cut_index:
+            editor.truncate(cut_index)
+        logging.info(f"Removed events from last {seconds} seconds, remaining events: {len(editor)}")
 
     def remove_last_click(self):
         """Remove the last click events (both press and release) from recording."""
-        if not self.recording:
+        editor = self.editor
+        if editor is None or not len(editor):
             return
-            
-        # Find the last click events
-        last_press_index = -1
-        last_release_index = -1
-        
-        for i in range(len(self.recording) - 1, -1, -1):
-            event = self.recording[i]
-            if event['type'] == 'click':
-                if event['pressed'] and last_press_index == -1:
-                    last_press_index = i
-                elif not event['pressed'] and last_release_index == -1:
-                    last_release_index = i
-                if last_press_index != -1 and last_release_index != -1:
-                    break
-        
+
+        last_press_index = editor.last_click_index(pressed=True)
+        last_release_index = editor.last_click_index(pressed=False)
+
         # If we found both press and release, remove them and any moves in between
         if last_press_index != -1 and last_release_index != -1:
             start_index = min(last_press_index, last_release_index)
             end_index = max(last_press_index, last_release_index)
-            del self.recording[start_index:end_index + 1]
-            logging.info(f"Removed last click events, remaining events: {len(self.recording)}")
-        
+            editor.cut_indices(start_index, end_index + 1)
+            logging.info(f"Removed last click events, remaining events: {len(editor)}")
+
         # Also remove the last 2 seconds of events
         self.remove_last_seconds(2)
 
 def main():
+    setup_logging()
     status_app = StatusBarApp()
     recorder = MouseRecorder(status_app)
     recorder.start_recording()
@@ -0,0 +1,202 @@
+"""Process-wide cache of loaded recordings.
+
+The recorder, the player and the app all work on the same few recording
+files. ``RecordingCache`` keeps them loaded, keyed by path: binary files
+stay memory-mapped for as long as their entry lives, so caching one costs
+no copy, and other formats keep the columns they were parsed into. An entry
+is only used while the file still has the size, mtime and content hash it
+had when the entry was made, so a file rewritten behind the app's back is
+reloaded. For binary recordings the hash is the CRC-32 the writer stores in
+the header, so checking it reads a few bytes; other files are hashed in
+full, which is still much cheaper than parsing them.
+
+The recorder publishes what it just saved, so playing a fresh recording
+never reads or parses the file. Entries are evicted least recently used
+first once they hold more than ``max_bytes`` of event data.
+"""
+import logging
+import os
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from recording_format import (
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    HEADER,
+    MAGIC,
+    ROW_SIZE,
+    SUMMARY,
+    Recording,
+    _unpack_header,
+    load_recording,
+)
+
+DEFAULT_MAX_BYTES = 256 << 20  # Event data kept across all entries
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def content_hash(path):
+    """CRC-32 of a recording's content, from the header of binary v2 files."""
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size + SUMMARY.size)
+        if head[:len(MAGIC)] == MAGIC and len(head) == HEADER.size + SUMMARY.size:
+            version = _unpack_header(head)[1]
+            if version >= 2:
+                return SUMMARY.unpack_from(head, HEADER.size)[-1]
+        crc = zlib.crc32(head)
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            crc = zlib.crc32(block, crc)
+        return crc
+
+
+def _detach(recording):
+    """Return ``recording`` with columns it can keep, copying only views of someone else's buffer.
+
+    A memory-mapped recording owns its map, and arrays are already owned;
+    views into e.g. the recorder's live capture buffer are copied, since
+    that buffer is reused for the next recording.
+    """
+    if recording._mmap is not None:
+        return recording
+    if all(type(getattr(recording, name)) is array for name in FLOAT_COLUMNS + BYTE_COLUMNS):
+        return recording
+    columns = {}
+    for name, typecode in [(name, 'd') for name in FLOAT_COLUMNS] + [(name, 'B') for name in BYTE_COLUMNS]:
+        column = array(typecode)
+        column.frombytes(memoryview(getattr(recording, name)).cast('B'))
+        columns[name] = column
+    detached = Recording(button_names=recording.button_names, flags=recording.flags, source=recording.source,
+                         **columns)
+    return detached
+
+
+class _Entry:
+    __slots__ = ('size', 'mtime_ns', 'checksum', 'recording', 'nbytes')
+
+    def __init__(self, size, mtime_ns, checksum, recording):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.checksum = checksum
+        self.recording = recording
+        self.nbytes = len(recording) * ROW_SIZE
+
+
+class RecordingCache:
+    """LRU cache of recordings, validated against the files they came from.
+
+    Cached recordings are shared: callers must not modify or close them.
+    Thread-safe.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # Absolute path -> _Entry
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def _store(self, key, entry):
+        # Dropped entries aren't closed, since callers may still hold them;
+        # a memory map is released with the last reference to its recording
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def _valid(self, path, entry):
+        """Whether ``path`` still holds what ``entry`` was made from."""
+        try:
+            stat = os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) != (entry.size, entry.mtime_ns):
+                return False
+            return content_hash(path) == entry.checksum
+        except OSError:
+            return False
+
+    def publish(self, path, recording=None):
+        """Record that ``path`` was just saved with ``recording`` as its content.
+
+        Without ``recording`` the file is loaded now, e.g. after it was
+        written in segments that were never all in memory.
+        """
+        key = self._key(path)
+        try:
+            stat = os.stat(path)
+            checksum = content_hash(path)
+            if recording is None:
+                recording = load_recording(path)
+            entry = _Entry(stat.st_size, stat.st_mtime_ns, checksum, _detach(recording))
+        except (OSError, ValueError) as e:  # RecordingFormatError is a ValueError
+            logging.warning(f"Not caching {path}: {e}")
+            self.invalidate(path)
+            return
+        self._store(key, entry)
+        logging.info(f"Cached recording {path}: {len(entry.recording)} events")
+
+    def peek(self, path):
+        """Return the cached recording for ``path`` if it is still current, else None."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not self._valid(path, entry):
+            self.invalidate(path)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry.recording
+
+    def get(self, path):
+        """Return the recording at ``path``, loading it only if it isn't cached and current.
+
+        Raises whatever ``load_recording`` raises.
+        """
+        recording = self.peek(path)
+        if recording is not None:
+            self.hits += 1
+            return recording
+        self.misses += 1
+        stat = os.stat(path)
+        checksum = content_hash(path)
+        recording = _detach(load_recording(path))
+        self._store(self._key(path), _Entry(stat.st_size, stat.st_mtime_ns, checksum, recording))
+        return recording
+
+    def known(self, path):
+        """Whether ``path`` has an entry, without touching the disk."""
+        with self._lock:
+            return self._key(path) in self._entries
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(self._key(path), None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared by the recorder, the player and the app
+shared_cache = RecordingCache()
@@ -0,0 +1,482 @@
+"""Compact columnar binary format for recordings.
+
+A ``.rmrec`` file is a fixed header, a summary block, a JSON button-name
+table, and six packed columns (time, x, y as float64; type, button and
+pressed as uint8). Loading memory-maps the file and exposes the columns as
+typed memoryviews, so opening a recording costs the same regardless of how
+many events it holds.
+
+The summary (duration, click count, bounding box and a CRC-32 of the column
+data) is computed while writing, so ``read_summary`` can describe a
+recording from its first few bytes. Version 1 files have no summary block;
+they still load, and their summary is computed from the columns.
+
+Legacy ``recording.json`` files (a list of per-event dicts) can be imported
+and exported losslessly. Block-compressed ``.rmz`` archives, see
+``archive.py``, and ``.rmman`` manifests of a deduplicating store, see
+``store.py``, load through ``load_recording`` as well, and ``save_as``
+writes any of these formats, picked by suffix.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+MAGIC = b"RMREC"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+ARCHIVE_MAGIC = b"RMZIP"  # See archive.py
+ARCHIVE_SUFFIX = ".rmz"
+MANIFEST_SUFFIX = ".rmman"  # See store.py
+RECORDING_SUFFIX = ".rmrec"
+
+RECORDING_FILENAME = "recording.rmrec"
+LEGACY_RECORDING_FILENAME = "recording.json"
+
+EVENT_MOVE = 0
+EVENT_CLICK = 1
+EVENT_TYPES = ('move', 'click')
+
+# Header flags
+FLAG_INT_COORDS = 1  # Every x/y was an int in the source, export them as ints
+
+# magic, version, flags, event count, button table length
+HEADER = struct.Struct('<5sBHQI')
+# duration, presses, min x, min y, max x, max y, CRC-32 of the columns (version 2 on)
+SUMMARY = struct.Struct('<dQddddI')
+ALIGNMENT = 8
+
+FLOAT_COLUMNS = ('times', 'xs', 'ys')
+BYTE_COLUMNS = ('types', 'buttons', 'pressed')
+ROW_SIZE = 8 * len(FLOAT_COLUMNS) + len(BYTE_COLUMNS)
+
+
+class RecordingFormatError(ValueError):
+    """Raised when a recording file cannot be decoded."""
+
+
+def _padding(offset):
+    return -offset % ALIGNMENT
+
+
+def _table_offset(version):
+    return HEADER.size + (SUMMARY.size if version >= 2 else 0)
+
+
+def _data_offset(table_len, version=VERSION):
+    offset = _table_offset(version) + table_len
+    return offset + _padding(offset)
+
+
+def _bounds(values):
+    """Return (min, max) of a float64 memoryview, with NumPy when installed."""
+    try:
+        import numpy as np
+    except ImportError:
+        return min(values), max(values)
+    values = np.frombuffer(values, dtype=np.float64)
+    return float(values.min()), float(values.max())
+
+
+class _Summarizer:
+    """Accumulates a recording summary from column chunks in file order."""
+
+    def __init__(self):
+        self.duration = 0.0
+        self.clicks = 0
+        self.bounds = {}  # Column name -> (min, max)
+        self.crc = 0
+
+    def feed(self, name, chunk):
+        self.crc = zlib.crc32(chunk, self.crc)
+        if name in ('times', 'xs', 'ys'):
+            values = memoryview(chunk).cast('B').cast('d')
+            if not len(values):
+                return
+            if name == 'times':
+                self.duration = values[-1]
+            else:
+                low, high = self.bounds.get(name, (values[0], values[0]))
+                chunk_low, chunk_high = _bounds(values)
+                self.bounds[name] = (min(low, chunk_low), max(high, chunk_high))
+        elif name == 'pressed':
+            self.clicks += bytes(chunk).count(1)
+
+    def summary(self, count):
+        min_x, max_x = self.bounds.get('xs', (0.0, 0.0))
+        min_y, max_y = self.bounds.get('ys', (0.0, 0.0))
+        return {
+            'events': count,
+            'duration': self.duration,
+            'clicks': self.clicks,
+            'bbox': (min_x, min_y, max_x, max_y),
+            'checksum': self.crc,
+        }
+
+
+class Recording:
+    """A recording stored as parallel columns.
+
+    Columns are ``array`` objects for recordings built in memory and
+    read-only memoryviews for recordings mapped from disk; both support
+    ``len`` and indexing. Button codes index into ``button_names`` where
+    code 0 is reserved for events without a button.
+    """
+
+    def __init__(self, times, xs, ys, types, buttons, pressed, button_names, flags=0, source=None):
+        self.times = times
+        self.xs = xs
+        self.ys = ys
+        self.types = types
+        self.buttons = buttons
+        self.pressed = pressed
+        self.button_names = list(button_names)
+        self.flags = flags
+        self.source = source
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return self.times[-1] if len(self.times) else 0.0
+
+    def event(self, i):
+        """Return event ``i`` as a legacy JSON-style dict."""
+        if self.flags & FLAG_INT_COORDS:
+            x, y = int(self.xs[i]), int(self.ys[i])
+        else:
+            x, y = self.xs[i], self.ys[i]
+        if self.types[i] == EVENT_MOVE:
+            return {'type': 'move', 'x': x, 'y': y, 'time': self.times[i]}
+        return {
+            'type': 'click',
+            'x': x,
+            'y': y,
+            'button': self.button_names[self.buttons[i]],
+            'pressed': bool(self.pressed[i]),
+            'time': self.times[i],
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.event(i)
+
+    def slice(self, start, stop):
+        """Return events ``start:stop`` as a recording with its own column copies."""
+        columns = {}
+        for name in FLOAT_COLUMNS + BYTE_COLUMNS:
+            columns[name] = array('d' if name in FLOAT_COLUMNS else 'B')
+            columns[name].frombytes(memoryview(getattr(self, name))[start:stop].cast('B'))
+        return Recording(button_names=self.button_names, flags=self.flags, source=self.source, **columns)
+
+    def to_events(self):
+        """Return the recording as a list of legacy JSON-style dicts."""
+        return list(self)
+
+    def close(self):
+        """Release the memory map backing this recording, if any."""
+        if self._mmap is None:
+            return
+        for name in FLOAT_COLUMNS + BYTE_COLUMNS:
+            getattr(self, name).release()
+        self._mmap.close()
+        self._mmap = None
+
+
+def from_events(events, source=None):
+    """Build a columnar recording from a list of legacy event dicts."""
+    times, xs, ys = array('d'), array('d'), array('d')
+    types, buttons, pressed = array('B'), array('B'), array('B')
+    button_names = ['']
+    button_codes = {}
+    int_coords = True
+
+    for event in events:
+        x, y = event['x'], event['y']
+        if int_coords and not (type(x) is int and type(y) is int):
+            int_coords = False
+        times.append(event['time'])
+        xs.append(x)
+        ys.append(y)
+        if event['type'] == 'move':
+            types.append(EVENT_MOVE)
+            buttons.append(0)
+            pressed.append(0)
+        elif event['type'] == 'click':
+            name = event['button']
+            code = button_codes.get(name)
+            if code is None:
+                if len(button_names) > 255:
+                    raise RecordingFormatError("Too many distinct buttons in recording")
+                code = button_codes[name] = len(button_names)
+                button_names.append(name)
+            types.append(EVENT_CLICK)
+            buttons.append(code)
+            pressed.append(1 if event['pressed'] else 0)
+        else:
+            raise RecordingFormatError(f"Unknown event type: {event['type']!r}")
+
+    flags = FLAG_INT_COORDS if int_coords and len(times) else 0
+    return Recording(times, xs, ys, types, buttons, pressed, button_names, flags, source)
+
+
+def save_recording(recording, path):
+    """Write ``recording`` to ``path`` in the binary format."""
+    columns = {name: (_as_buffer(getattr(recording, name), 'd'),) for name in FLOAT_COLUMNS}
+    columns.update({name: (_as_buffer(getattr(recording, name), 'B'),) for name in BYTE_COLUMNS})
+    write_recording_file(path, len(recording), recording.button_names, recording.flags, columns)
+
+
+def write_recording_file(path, count, button_names, flags, columns):
+    """Write a binary recording from column data.
+
+    ``columns`` maps each column name to an iterable of byte chunks, so
+    callers can stream columns that do not fit in memory. The file is
+    written next to its destination and renamed into place, so readers that
+    still have the previous version mapped are unaffected.
+    """
+    path = Path(path)
+    table = json.dumps(list(button_names)).encode('utf-8')
+    header = HEADER.pack(MAGIC, VERSION, flags, count, len(table))
+    summarizer = _Summarizer()
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(b'\0' * SUMMARY.size)  # Filled in once the columns are written
+            f.write(table)
+            f.write(b'\0' * _padding(_table_offset(VERSION) + len(table)))
+            for name in FLOAT_COLUMNS + BYTE_COLUMNS:
+                for chunk in columns[name]:
+                    summarizer.feed(name, chunk)
+                    f.write(chunk)
+            if f.tell() != _data_offset(len(table)) + count * ROW_SIZE:
+                raise RecordingFormatError("Column data does not match the event count")
+            summary = summarizer.summary(count)
+            f.seek(HEADER.size)
+            f.write(SUMMARY.pack(summary['duration'], summary['clicks'], *summary['bbox'], summary['checksum']))
+        os.replace(tmp_path, path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _as_buffer(column, typecode):
+    """Return ``column`` as a buffer of ``typecode`` items, copying only if needed."""
+    if isinstance(column, memoryview) or (isinstance(column, array) and column.typecode == typecode):
+        return column
+    return array(typecode, column)
+
+
+def _unpack_header(data):
+    magic, version, flags, count, table_len = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise RecordingFormatError("Not a RecMouse binary recording")
+    if version not in SUPPORTED_VERSIONS:
+        raise RecordingFormatError(f"Unsupported recording format version: {version}")
+    return magic, version, flags, count, table_len
+
+
+def load_binary(path):
+    """Memory-map a binary recording without decoding its events."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise RecordingFormatError("Recording file is truncated")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, flags, count, table_len = _unpack_header(mm)
+        table_offset = _table_offset(version)
+        button_names = json.loads(mm[table_offset:table_offset + table_len].decode('utf-8'))
+        offset = _data_offset(table_len, version)
+        if len(mm) < offset + count * ROW_SIZE:
+            raise RecordingFormatError("Recording file is truncated")
+
+        view = memoryview(mm)
+        columns = {}
+        for name in FLOAT_COLUMNS:
+            columns[name] = view[offset:offset + count * 8].cast('d')
+            offset += count * 8
+        for name in BYTE_COLUMNS:
+            columns[name] = view[offset:offset + count]
+            offset += count
+        view.release()
+    except Exception:
+        mm.close()
+        raise
+
+    recording = Recording(button_names=button_names, flags=flags, source=Path(path), **columns)
+    recording._mmap = mm
+    return recording
+
+
+def time_range(recording, start=None, end=None):
+    """Return the (first, stop) indices of the events with ``start <= time < end``.
+
+    Binary search, so mapped recordings are not read beyond a few pages.
+    """
+    first = bisect_left(recording.times, start) if start is not None else 0
+    stop = bisect_left(recording.times, end, first) if end is not None else len(recording)
+    return first, max(first, stop)
+
+
+def summarize(recording):
+    """Compute the summary of an in-memory or mapped recording."""
+    summarizer = _Summarizer()
+    for name in FLOAT_COLUMNS:
+        summarizer.feed(name, _as_buffer(getattr(recording, name), 'd'))
+    for name in BYTE_COLUMNS:
+        summarizer.feed(name, _as_buffer(getattr(recording, name), 'B'))
+    return summarizer.summary(len(recording))
+
+
+def read_summary(path):
+    """Describe a recording without loading its events, if it is version 2.
+
+    Returns:
+        dict: events, duration, clicks (presses), bbox as
+        (min x, min y, max x, max y), checksum (CRC-32 of the column data)
+        and version (0 for legacy JSON)
+    """
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size + SUMMARY.size)
+    if _is_manifest(head):
+        from store import read_manifest_summary
+        return read_manifest_summary(path)
+    if head[:len(MAGIC)] == MAGIC and len(head) >= HEADER.size:
+        _, version, _, count, _ = _unpack_header(head)
+        if version >= 2:
+            if len(head) < HEADER.size + SUMMARY.size:
+                raise RecordingFormatError("Recording file is truncated")
+            duration, clicks, min_x, min_y, max_x, max_y, crc = SUMMARY.unpack_from(head, HEADER.size)
+            return {
+                'events': count,
+                'duration': duration,
+                'clicks': clicks,
+                'bbox': (min_x, min_y, max_x, max_y),
+                'checksum': crc,
+                'version': version,
+            }
+    else:
+        version = 0
+
+    # Older files: summarize the columns instead
+    recording = load_recording(path)
+    try:
+        summary = summarize(recording)
+    finally:
+        recording.close()
+    summary['version'] = version
+    return summary
+
+
+def import_json(path):
+    """Load a legacy JSON recording into columnar form."""
+    with open(path, 'r') as f:
+        events = json.load(f)
+    return from_events(events, source=Path(path))
+
+
+def export_json(recording, path):
+    """Write ``recording`` as a legacy JSON event list."""
+    with open(path, 'w') as f:
+        json.dump(recording.to_events(), f)
+
+
+def is_binary_recording(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def is_archive(path):
+    with open(path, 'rb') as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+def _is_manifest(head):
+    # Manifests are JSON objects, legacy recordings JSON lists
+    return head[:1] == b'{'
+
+
+def is_manifest(path):
+    with open(path, 'rb') as f:
+        return _is_manifest(f.read(1))
+
+
+def load_recording(path):
+    """Load a recording in the binary, archive, store manifest or legacy JSON format."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return load_binary(path)
+    if magic == ARCHIVE_MAGIC:
+        from archive import load_archive
+        return load_archive(path)
+    if _is_manifest(magic):
+        from store import load_manifest
+        return load_manifest(path)
+    return import_json(path)
+
+
+def save_as(recording, path):
+    """Save ``recording`` in the format ``path``'s suffix names, binary by default.
+
+    A ``.rmman`` path stores the recording in the store its manifest
+    directory belongs to.
+    """
+    suffix = Path(path).suffix
+    if suffix == '.json':
+        export_json(recording, path)
+    elif suffix == ARCHIVE_SUFFIX:
+        from archive import save_archive
+        save_archive(recording, path)
+    elif suffix == MANIFEST_SUFFIX:
+        from store import save_manifest
+        save_manifest(recording, path)
+    else:
+        save_recording(recording, path)
+
+
+def convert(src, dst, start=None, end=None):
+    """Convert between formats; the destination suffix picks the output format.
+
+    ``start`` and ``end`` (seconds) export only the events in between, seeking
+    straight to them in an archive.
+    """
+    if start is not None or end is not None:
+        from archive import load_section
+        recording = load_section(src, start, end)
+    else:
+        recording = load_recording(src)
+    try:
+        save_as(recording, dst)
+    finally:
+        recording.close()
+
+
+def migrate_legacy_recording(app_data):
+    """Convert a legacy recording.json in ``app_data`` once, keeping the original."""
+    legacy_file = Path(app_data) / LEGACY_RECORDING_FILENAME
+    binary_file = Path(app_data) / RECORDING_FILENAME
+    if binary_file.exists() or not legacy_file.exists():
+        return
+    try:
+        save_recording(import_json(legacy_file), binary_file)
+        logging.info(f"Converted legacy recording {legacy_file} to {binary_file}")
+    except Exception as e:
+        logging.error(f"Failed to convert legacy recording {legacy_file}: {e}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Usage: python recording_format.py <source> <destination>")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,138 @@
+"""Velocity-aware sampling of captured move events.
+
+A fixed time gate keeps every slow drift and idle jitter sample but drops
+most of a fast flick. ``SamplingPolicy`` decides per move event instead:
+
+* moves closer than ``min_distance`` pixels to the last kept sample are
+  jitter and are dropped;
+* a move is kept once ``max_gap`` seconds have passed since the last kept
+  sample, so timing along slow paths is preserved; a pending sample is
+  kept first, so a flick followed by an idle pause keeps its end point;
+* otherwise a move is kept only when the direction changes by more than
+  ``min_angle`` degrees, either gradually over the run or sharply at the
+  last dropped sample. That sample (the corner) is kept along with it, so
+  straight runs of any speed collapse to their end points.
+
+``offer`` runs on the listener thread, so it only does arithmetic on
+attributes: no containers are built per event.
+"""
+import math
+
+DROP = 0
+KEEP = 1
+KEEP_PENDING = 2  # Keep the pending sample, then this one
+
+
+class SamplingPolicy:
+    """Decide which move events to keep, and count the decisions."""
+
+    __slots__ = ('min_distance', 'min_angle', 'max_gap', '_min_distance_sq', '_cos_sq',
+                 'kept', 'dropped', '_has_last', '_last_t', '_last_x', '_last_y', '_dir_x', '_dir_y',
+                 'has_pending', 'pending_t', 'pending_x', 'pending_y')
+
+    def __init__(self, min_distance=2.0, min_angle=8.0, max_gap=0.1):
+        self.min_distance = min_distance
+        self.min_angle = min_angle
+        self.max_gap = max_gap
+        self._min_distance_sq = min_distance * min_distance
+        # Comparing squared cosines avoids a sqrt and an acos per event
+        self._cos_sq = math.cos(math.radians(min_angle)) ** 2
+        self.reset()
+
+    @classmethod
+    def preset(cls, name):
+        return cls(**PRESETS[name])
+
+    def reset(self):
+        self.kept = 0
+        self.dropped = 0
+        self._has_last = False
+        self._last_t = self._last_x = self._last_y = 0.0
+        self._dir_x = self._dir_y = 0.0
+        self.has_pending = False
+        self.pending_t = self.pending_x = self.pending_y = 0.0
+
+    def _accept(self, t, x, y):
+        if self._has_last:
+            self._dir_x = x - self._last_x
+            self._dir_y = y - self._last_y
+        self._last_t, self._last_x, self._last_y = t, x, y
+        self._has_last = True
+        self.kept += 1
+
+    def _keep(self, t, x, y):
+        """Keep (x, y), after the pending sample if there is one."""
+        if self.has_pending:
+            self.has_pending = False
+            self._accept(self.pending_t, self.pending_x, self.pending_y)
+            self.dropped -= 1  # The pending sample was counted as dropped when it was offered
+            self._accept(t, x, y)
+            return KEEP_PENDING
+        self._accept(t, x, y)
+        return KEEP
+
+    def _deviates(self, dx, dy, length_sq):
+        """True if (dx, dy) points more than min_angle away from the run direction.
+
+        Never true before the first run has a direction.
+        """
+        direction_sq = self._dir_x * self._dir_x + self._dir_y * self._dir_y
+        if not direction_sq:
+            return False
+        dot = dx * self._dir_x + dy * self._dir_y
+        return dot <= 0 or dot * dot < self._cos_sq * length_sq * direction_sq
+
+    def offer(self, t, x, y):
+        """Return DROP, KEEP or KEEP_PENDING for a move to (x, y) at time t."""
+        if not self._has_last:
+            self._accept(t, x, y)
+            return KEEP
+
+        dx = x - self._last_x
+        dy = y - self._last_y
+        distance_sq = dx * dx + dy * dy
+        if distance_sq < self._min_distance_sq:
+            self.dropped += 1
+            return DROP
+
+        if t - self._last_t >= self.max_gap:
+            return self._keep(t, x, y)
+
+        # A turn is either a gradual drift away from the run's direction, seen
+        # from the last kept sample, or a sharp corner at the pending sample
+        turned = self._deviates(dx, dy, distance_sq)
+        if not turned and self.has_pending:
+            sx = x - self.pending_x
+            sy = y - self.pending_y
+            step_sq = sx * sx + sy * sy
+            turned = step_sq >= self._min_distance_sq and self._deviates(sx, sy, step_sq)
+        if turned:
+            return self._keep(t, x, y)
+
+        if not (self._dir_x or self._dir_y):
+            # First move away from the first sample: it sets the direction of the run
+            self._dir_x, self._dir_y = dx, dy
+        self.has_pending = True
+        self.pending_t, self.pending_x, self.pending_y = t, x, y
+        self.dropped += 1
+        return DROP
+
+    def flush(self):
+        """Keep the pending sample, if any, e.g. right before a click.
+
+        Returns:
+            bool: True if the caller should store pending_t/x/y
+        """
+        if not self.has_pending:
+            return False
+        self.has_pending = False
+        self.dropped -= 1
+        self._accept(self.pending_t, self.pending_x, self.pending_y)
+        return True
+
+
+PRESETS = {
+    'precise': {'min_distance': 1.0, 'min_angle': 3.0, 'max_gap': 0.05},
+    'balanced': {'min_distance': 2.0, 'min_angle': 8.0, 'max_gap': 0.1},
+    'compact': {'min_distance': 4.0, 'min_angle': 15.0, 'max_gap': 0.25},
+}
@@ -0,0 +1,112 @@
+import threading
+import time
+from array import array
+from itertools import accumulate, chain, islice
+from operator import le, sub
+
+
+class PlaybackCancelled(Exception):
+    """Raised by ``PlaybackScheduler.wait_until`` once playback is cancelled."""
+
+
+class PlaybackScheduler:
+    """Fire events at absolute offsets from a fixed start time.
+
+    Every deadline is computed as ``start + offset`` on a monotonic
+    high-resolution clock, so time spent executing one event never shifts
+    the deadlines of the ones after it. Waiting is done in two phases: a
+    coarse ``sleep`` until shortly before the deadline, then a fine spin
+    for the remaining ``spin_threshold`` seconds to avoid OS timer overshoot.
+
+    The coarse wait is on ``cancelled``, so setting it from another thread
+    wakes a waiting ``wait_until`` at once, even in the middle of a long gap.
+    """
+
+    def __init__(self, spin_threshold=0.002, clock=time.perf_counter, sleep=time.sleep, cancelled=None):
+        self.spin_threshold = spin_threshold
+        self.clock = clock
+        self.sleep = sleep
+        # Set to cancel playback; the owner clears it before starting again
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+        self.start_time = None
+        self.lateness = array('d')  # Lateness in seconds of every fired event
+
+    def start(self):
+        """Anchor the schedule at the current clock reading."""
+        self.start_time = self.clock()
+        self.lateness = array('d')
+
+    def pause(self, seconds):
+        """Wait ``seconds`` on this scheduler's clock or until cancelled.
+
+        Returns True if cancelled.
+        """
+        if self.sleep is time.sleep:
+            return self.cancelled.wait(seconds)
+        self.sleep(seconds)
+        return self.cancelled.is_set()
+
+    def wait_until(self, offset):
+        """Block until ``offset`` seconds after start and return the lateness.
+
+        Raises:
+            PlaybackCancelled: if ``cancelled`` is set before the deadline
+        """
+        clock = self.clock
+        deadline = self.start_time + offset
+        remaining = deadline - clock()
+        if remaining > self.spin_threshold:
+            if self.pause(remaining - self.spin_threshold):
+                raise PlaybackCancelled()
+        while clock() < deadline:
+            self.sleep(0)  # Yield the GIL while spinning
+        if self.cancelled.is_set():
+            raise PlaybackCancelled()
+        lateness = clock() - deadline
+        self.lateness.append(lateness)
+        return lateness
+
+    def fire_all(self, offsets):
+        """Fire a whole run of ``offsets`` at once on a clock that can jump.
+
+        Only for clocks with ``advance_to``, such as ``simulate.VirtualClock``:
+        every event fires at its deadline, or at once if the clock is already
+        past it, exactly as ``wait_until`` would have. Returns the fire times.
+        """
+        if self.cancelled.is_set():
+            raise PlaybackCancelled()
+        if not len(offsets):
+            return array('d')
+        start = self.start_time
+        now = self.clock() - start
+        if offsets[0] >= now and all(map(le, offsets, islice(offsets, 1, None))):
+            # Ordered deadlines all fire on time
+            fired = offsets
+            self.lateness.frombytes(bytes(8 * len(offsets)))
+        else:
+            # Running maximum of the offsets, never earlier than the current time
+            fired = array('d', accumulate(chain((now,), offsets), max))
+            del fired[0]
+            self.lateness.extend(map(sub, fired, offsets))
+        times = array('d', map(start.__add__, fired))
+        self.clock.advance_to(times[-1])
+        return times
+
+    def summary(self):
+        """Return count, mean, p50, p99 and max lateness in milliseconds."""
+        return lateness_summary(self.lateness)
+
+
+def lateness_summary(lateness):
+    """Summarize a sequence of lateness values (seconds) in milliseconds."""
+    count = len(lateness)
+    if not count:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(lateness)
+    return {
+        'count': count,
+        'mean_ms': sum(ordered) / count * 1000,
+        'p50_ms': ordered[(count - 1) // 2] * 1000,
+        'p99_ms': ordered[min(count - 1, int(count * 0.99))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
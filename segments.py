@@ -0,0 +1,256 @@
+"""Crash-safe streaming of captured events to append-only segment files.
+
+While a streaming recording runs, ``SegmentWriter`` periodically moves
+events out of the recorder's ``CaptureBuffer`` and appends them to a
+``.rmseg`` file as a checksummed block, so memory stays bounded by the
+flush interval and a crash loses at most the last unflushed batch.
+
+Events newer than ``holdback`` seconds stay in memory until the recording
+stops, so the recorder can still trim the tail (the click that stopped the
+recording, the last few seconds) before it is written.
+
+A segment is a small header followed by blocks of::
+
+    event count, button table length, button table (JSON),
+    time/x/y/type/button/pressed columns, crc32
+
+``finalize_segment`` turns a segment into a regular ``.rmrec`` recording,
+column by column, without loading it into memory. A torn block at the end
+of a segment (from a crash mid-write) is ignored.
+
+The writer holds an exclusive ``flock`` on its segment until it is closed,
+so ``recover_segments`` only touches segments whose recorder is gone, never
+one another process is still writing.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+from recording_format import BYTE_COLUMNS, FLOAT_COLUMNS, write_recording_file
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: no locking, recovery assumes a single recorder
+    fcntl = None
+
+SEGMENT_MAGIC = b"RMSEG"
+SEGMENT_VERSION = 1
+SEGMENT_SUFFIX = ".rmseg"
+
+# magic, version, reserved
+SEGMENT_HEADER = struct.Struct('<5sBH')
+# event count, button table length
+BLOCK_HEADER = struct.Struct('<II')
+# crc32 over block header, table and columns
+BLOCK_TRAILER = struct.Struct('<I')
+
+
+def _try_lock(f):
+    """Take an exclusive lock on open file ``f`` without waiting; False if someone holds it."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _column_sizes(count):
+    return [8 * count] * len(FLOAT_COLUMNS) + [count] * len(BYTE_COLUMNS)
+
+
+class SegmentWriter:
+    """Background thread that appends batches of captured events to a segment.
+
+    ``lock`` must be the lock the recorder holds while appending to
+    ``buffer``; it is only held here while a batch is copied out.
+    """
+
+    def __init__(self, buffer, lock, path, flush_interval=1.0, holdback=5.0):
+        self.buffer = buffer
+        self.lock = lock
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.holdback = holdback
+        self.event_count = 0
+        self._file = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        # Locked under a name recovery doesn't look at, then renamed, so it is never seen unlocked
+        partial = self.path.with_name(self.path.name + '.part')
+        self._file = open(partial, 'wb')
+        _try_lock(self._file)
+        self._file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, 0))
+        self._sync()
+        os.replace(partial, self.path)
+        self._thread = threading.Thread(target=self._run, name="SegmentWriter", daemon=True)
+        self._thread.start()
+        logging.info(f"Streaming recording to segment: {self.path}")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush(self.holdback)
+            except Exception as e:
+                logging.error(f"Error flushing recording segment: {e}", exc_info=True)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self, holdback=0.0):
+        """Append every buffered event older than ``holdback`` seconds.
+
+        Returns:
+            int: number of events written
+        """
+        buffer = self.buffer
+        with self.lock:
+            n = buffer.length
+            if not n:
+                return 0
+            if holdback > 0:
+                count = bisect_right(buffer.times, buffer.times[n - 1] - holdback, 0, n)
+            else:
+                count = n
+            if not count:
+                return 0
+            columns = [column[:count] for column in (
+                buffer.times, buffer.xs, buffer.ys, buffer.types, buffer.buttons, buffer.pressed)]
+            table = json.dumps(buffer.button_names).encode('utf-8')
+            buffer.delete(0, count)
+
+        self._write_block(count, table, columns)
+        return count
+
+    def _write_block(self, count, table, columns):
+        header = BLOCK_HEADER.pack(count, len(table))
+        crc = zlib.crc32(table, zlib.crc32(header))
+        for column in columns:
+            crc = zlib.crc32(column, crc)
+        self._file.write(header)
+        self._file.write(table)
+        for column in columns:
+            self._file.write(column)
+        self._file.write(BLOCK_TRAILER.pack(crc))
+        self._sync()
+        self.event_count += count
+
+    def stop(self):
+        """Stop the background thread, leaving unflushed events in the buffer."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self, tail=None):
+        """Write the remaining events and close the segment.
+
+        Args:
+            tail: a Recording to write in place of the events still in the
+                buffer, e.g. an edited copy of them
+        """
+        self.stop()
+        try:
+            if tail is None:
+                self.flush()
+            elif len(tail):
+                columns = [memoryview(column).cast('B') for column in (
+                    tail.times, tail.xs, tail.ys, tail.types, tail.buttons, tail.pressed)]
+                self._write_block(len(tail), json.dumps(tail.button_names).encode('utf-8'), columns)
+        finally:
+            self._file.close()
+        logging.info(f"Segment closed with {self.event_count} events: {self.path}")
+
+
+def scan_segment(path):
+    """Validate a segment and locate its blocks.
+
+    Returns:
+        tuple: (blocks, button_names) where blocks is a list of
+        (column data offset, event count) for every intact block
+    """
+    blocks = []
+    button_names = ['']
+    with open(path, 'rb') as f:
+        header = f.read(SEGMENT_HEADER.size)
+        if len(header) < SEGMENT_HEADER.size or header[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            return blocks, button_names
+
+        while True:
+            block_header = f.read(BLOCK_HEADER.size)
+            if len(block_header) < BLOCK_HEADER.size:
+                break
+            count, table_len = BLOCK_HEADER.unpack(block_header)
+            table = f.read(table_len)
+            offset = f.tell()
+            data = f.read(sum(_column_sizes(count)))
+            trailer = f.read(BLOCK_TRAILER.size)
+            if len(trailer) < BLOCK_TRAILER.size:
+                break
+            if BLOCK_TRAILER.unpack(trailer)[0] != zlib.crc32(data, zlib.crc32(table, zlib.crc32(block_header))):
+                logging.warning(f"Ignoring corrupt block at offset {offset} in {path}")
+                break
+            button_names = json.loads(table.decode('utf-8'))
+            blocks.append((offset, count))
+    return blocks, button_names
+
+
+def finalize_segment(path, out_path):
+    """Rebuild a binary recording from the intact blocks of a segment.
+
+    Returns:
+        int: number of events in the recording
+    """
+    blocks, button_names = scan_segment(path)
+    count = sum(block_count for _, block_count in blocks)
+
+    with open(path, 'rb') as f:
+        def column_chunks(index):
+            for offset, block_count in blocks:
+                sizes = _column_sizes(block_count)
+                f.seek(offset + sum(sizes[:index]))
+                yield f.read(sizes[index])
+
+        columns = {name: column_chunks(i) for i, name in enumerate(FLOAT_COLUMNS + BYTE_COLUMNS)}
+        write_recording_file(out_path, count, button_names, 0, columns)
+    return count
+
+
+def recover_segments(directory):
+    """Turn segments left behind by a crash into recordings next to them.
+
+    Segments still locked by a running recorder, in this or another
+    process, are left alone.
+
+    Returns:
+        list: paths of the recovered recordings
+    """
+    recovered = []
+    for segment in sorted(Path(directory).glob(f"*{SEGMENT_SUFFIX}")):
+        try:
+            with open(segment, 'rb') as lock:
+                if not _try_lock(lock):
+                    logging.info(f"Skipping segment still being written: {segment}")
+                    continue
+                out_path = segment.with_suffix('.rmrec')
+                count = finalize_segment(segment, out_path)
+                if count:
+                    logging.info(f"Recovered {count} events from {segment} to {out_path}")
+                    recovered.append(out_path)
+                else:
+                    out_path.unlink()
+                    logging.info(f"Discarded empty segment {segment}")
+                segment.unlink()
+        except FileNotFoundError:
+            continue  # Finished by its recorder or recovered elsewhere since listing
+        except Exception as e:
+            logging.error(f"Failed to recover segment {segment}: {e}", exc_info=True)
+    return recovered
@@ -0,0 +1,204 @@
+"""Time-aware Ramer-Douglas-Peucker simplification of recorded mouse paths.
+
+Consecutive move samples are often nearly collinear, and replaying each of
+them costs a controller call. This pass drops move events that playback can
+reproduce closely enough from their neighbours:
+
+* spatial error is the synchronized Euclidean distance, i.e. how far the
+  dropped sample is from where the simplified path puts the cursor at the
+  same moment;
+* temporal error is how far the dropped sample's timestamp is from the time
+  the simplified path passes closest to it.
+
+Click events, the move right before each click, and the first and last
+events are always kept exactly. Requires NumPy.
+
+Usage:
+    python simplify.py [--epsilon PX] [--time-tolerance S] [--suffix S] PATH...
+"""
+import argparse
+import logging
+import sys
+from array import array
+from pathlib import Path
+from recording_format import EVENT_CLICK, Recording, load_recording, save_as
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_EPSILON = 1.0  # Pixels
+DEFAULT_TIME_TOLERANCE = 0.05  # Seconds
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Trajectory simplification requires NumPy (pip install numpy)")
+
+
+def _segment_errors(t, x, y, a, b):
+    """Spatial and temporal error of points a+1..b-1 against the segment a-b."""
+    ti, xi, yi = t[a + 1:b], x[a + 1:b], y[a + 1:b]
+    dt = t[b] - t[a]
+    dx, dy = x[b] - x[a], y[b] - y[a]
+
+    u = (ti - t[a]) / dt if dt > 0 else np.zeros_like(ti)
+    spatial = np.hypot(xi - (x[a] + u * dx), yi - (y[a] + u * dy))
+
+    length_sq = dx * dx + dy * dy
+    if length_sq > 0:
+        w = np.clip(((xi - x[a]) * dx + (yi - y[a]) * dy) / length_sq, 0.0, 1.0)
+        temporal = np.abs(ti - (t[a] + w * dt))
+    else:
+        temporal = np.zeros_like(ti)
+    return spatial, temporal
+
+
+def _simplify_run(t, x, y, a, b, keep, epsilon, time_tolerance):
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        spatial, temporal = _segment_errors(t, x, y, a, b)
+        score = np.maximum(spatial / epsilon, temporal / time_tolerance)
+        i = int(np.argmax(score))
+        if score[i] > 1.0:
+            split = a + 1 + i
+            keep[split] = True
+            stack.append((a, split))
+            stack.append((split, b))
+
+
+def _anchor_mask(types):
+    """Events that must survive: clicks, the event before each click, the ends."""
+    is_click = types == EVENT_CLICK
+    anchors = is_click.copy()
+    anchors[:-1] |= is_click[1:]
+    anchors[0] = anchors[-1] = True
+    return anchors
+
+
+def _max_errors(t, x, y, keep):
+    """Maximum spatial and temporal error of every dropped point."""
+    kept = np.flatnonzero(keep)
+    dropped = np.flatnonzero(~keep)
+    if not len(dropped):
+        return 0.0, 0.0
+    # Each dropped point lies between two consecutive kept points
+    right = kept[np.searchsorted(kept, dropped)]
+    left = kept[np.searchsorted(kept, dropped) - 1]
+
+    dt = t[right] - t[left]
+    dx, dy = x[right] - x[left], y[right] - y[left]
+    u = np.divide(t[dropped] - t[left], dt, out=np.zeros_like(dt), where=dt > 0)
+    spatial = np.hypot(x[dropped] - (x[left] + u * dx), y[dropped] - (y[left] + u * dy))
+
+    length_sq = dx * dx + dy * dy
+    w = np.divide((x[dropped] - x[left]) * dx + (y[dropped] - y[left]) * dy, length_sq,
+                  out=np.zeros_like(dt), where=length_sq > 0)
+    temporal = np.where(length_sq > 0, np.abs(t[dropped] - (t[left] + np.clip(w, 0.0, 1.0) * dt)), 0.0)
+    return float(spatial.max()), float(temporal.max())
+
+
+def _column(values, typecode):
+    column = array(typecode)
+    column.frombytes(values.tobytes())
+    return column
+
+
+def simplify_recording(recording, epsilon=DEFAULT_EPSILON, time_tolerance=DEFAULT_TIME_TOLERANCE):
+    """Drop redundant move events from a recording.
+
+    Args:
+        epsilon (float): maximum spatial error in pixels
+        time_tolerance (float): maximum temporal error in seconds
+
+    Returns:
+        tuple: (simplified Recording, report dict)
+    """
+    _require_numpy()
+    n = len(recording)
+    t = np.frombuffer(recording.times, dtype=np.float64)
+    x = np.frombuffer(recording.xs, dtype=np.float64)
+    y = np.frombuffer(recording.ys, dtype=np.float64)
+    types = np.frombuffer(recording.types, dtype=np.uint8)
+
+    if n:
+        keep = _anchor_mask(types)
+        anchors = np.flatnonzero(keep)
+        for a, b in zip(anchors[:-1], anchors[1:]):
+            if b - a > 1:
+                _simplify_run(t, x, y, int(a), int(b), keep, epsilon, time_tolerance)
+        max_spatial, max_temporal = _max_errors(t, x, y, keep)
+    else:
+        keep = np.zeros(0, dtype=bool)
+        max_spatial = max_temporal = 0.0
+
+    kept = int(keep.sum())
+    simplified = Recording(
+        _column(t[keep], 'd'),
+        _column(x[keep], 'd'),
+        _column(y[keep], 'd'),
+        _column(types[keep], 'B'),
+        _column(np.frombuffer(recording.buttons, dtype=np.uint8)[keep], 'B'),
+        _column(np.frombuffer(recording.pressed, dtype=np.uint8)[keep], 'B'),
+        recording.button_names,
+        recording.flags,
+        recording.source,
+    )
+    report = {
+        'original_events': n,
+        'kept_events': kept,
+        'compression_ratio': n / kept if kept else 1.0,
+        'max_spatial_error': max_spatial,
+        'max_temporal_error': max_temporal,
+    }
+    return simplified, report
+
+
+def simplify_file(src, dst=None, epsilon=DEFAULT_EPSILON, time_tolerance=DEFAULT_TIME_TOLERANCE):
+    """Simplify the recording at ``src`` and save it to ``dst`` (default: in place)."""
+    recording = load_recording(src)
+    try:
+        simplified, report = simplify_recording(recording, epsilon, time_tolerance)
+        # Columns were copied, so the source can be replaced even when mapped
+        save_as(simplified, dst or src)
+    finally:
+        recording.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simplify recorded mouse paths.")
+    parser.add_argument('paths', nargs='+', type=Path, help="recordings or directories of recordings")
+    parser.add_argument('--epsilon', type=float, default=DEFAULT_EPSILON, help="max spatial error (px)")
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE, help="max temporal error (s)")
+    parser.add_argument('--suffix', default='', help="write NAME<suffix>.rmrec instead of overwriting")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix in ('.rmrec', '.json')))
+        else:
+            files.append(path)
+
+    for src in files:
+        dst = src.with_name(src.stem + args.suffix + '.rmrec')
+        try:
+            report = simplify_file(src, dst, args.epsilon, args.time_tolerance)
+        except Exception as e:
+            print(f"{src}: failed: {e}")
+            continue
+        print(
+            f"{src}: {report['original_events']} -> {report['kept_events']} events "
+            f"(ratio {report['compression_ratio']:.2f}, max error "
+            f"{report['max_spatial_error']:.2f} px / {report['max_temporal_error'] * 1000:.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
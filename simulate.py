@@ -0,0 +1,141 @@
+"""Offline playback on a simulated clock.
+
+``simulated_player`` builds a ``MousePlayer`` whose scheduler runs on a
+``VirtualClock`` and whose controller is a ``HeadlessController`` on the
+same clock. Waiting for a deadline advances the clock instead of sleeping,
+so the unchanged playback engine runs as fast as the CPU allows, and the
+controller ends up holding the exact timeline of moves, presses and
+releases that real playback would have injected, at the times it would
+have injected them.
+
+Usage:
+    player = simulated_player()
+    player.speed = 2.0
+    result = simulate(player, 'recording.rmrec', repeat_count=3)
+    result.write_csv('timeline.csv')
+"""
+import csv
+import math
+import time
+from headless import HeadlessController
+from play import DEFAULT_REPEAT_GAP, MousePlayer
+from playlist import Playlist
+
+ACTION_NAMES = ('move', 'press', 'release')  # Indexed by headless.ACTION_*
+
+
+class VirtualClock:
+    """A clock that only moves when slept on.
+
+    Calling it returns the current simulated time in seconds; ``sleep``
+    advances it at once.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, when):
+        if when > self.now:
+            self.now = when
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+        else:
+            # A yield takes the smallest step, so spinning on the clock always ends
+            self.now = math.nextafter(self.now, math.inf)
+
+
+def simulated_player(clock=None, per_event=False):
+    """Return a MousePlayer that plays on ``clock`` into a HeadlessController.
+
+    By default each plan is fired in one batch, which gives the same
+    timeline millions of events per second. ``per_event`` runs every event
+    through ``PlaybackScheduler.wait_until`` instead, to test the scheduler
+    itself.
+    """
+    clock = clock or VirtualClock()
+    player = MousePlayer(controller=HeadlessController(clock=clock), clock=clock, sleep=clock.sleep)
+    player.batch = not per_event
+    return player
+
+
+class Simulation:
+    """The outcome of a simulated run and the timeline it produced."""
+
+    def __init__(self, player, success, error_msg, simulated_s, wall_s):
+        self.player = player
+        self.timeline = player.mouse
+        self.success = success
+        self.error_msg = error_msg
+        self.simulated_s = simulated_s
+        self.wall_s = wall_s
+
+    def __len__(self):
+        return len(self.timeline)
+
+    @property
+    def actions_per_s(self):
+        return len(self.timeline) / self.wall_s if self.wall_s else 0.0
+
+    def rows(self):
+        """Yield (time, action, x, y, button) for every injected action."""
+        timeline = self.timeline
+        names = timeline.button_names
+        for t, kind, x, y, button in zip(timeline.times, timeline.kinds, timeline.xs, timeline.ys, timeline.buttons):
+            yield t, ACTION_NAMES[kind], x, y, names[button]
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('time', 'action', 'x', 'y', 'button'))
+            writer.writerows(self.rows())
+
+    def summary(self):
+        kinds = self.timeline.kinds.tobytes()
+        return {
+            'success': self.success,
+            'error': self.error_msg,
+            'actions': len(self.timeline),
+            'presses': kinds.count(1),
+            'releases': kinds.count(2),
+            'simulated_s': self.simulated_s,
+            'wall_s': self.wall_s,
+            'actions_per_s': self.actions_per_s,
+        }
+
+
+def _run(player, play):
+    clock = player.scheduler.clock
+    player.reset_stop()
+    player.reset_stats()
+    started, wall_started = clock(), time.perf_counter()
+    success, error_msg = play()
+    return Simulation(player, success, error_msg, clock() - started, time.perf_counter() - wall_started)
+
+
+def simulate(player, path=None, repeat_count=1, gap=DEFAULT_REPEAT_GAP):
+    """Play a recording on a simulated player, see ``simulated_player``.
+
+    Returns:
+        Simulation
+    """
+    def play():
+        plan, error_msg = player.load_plan(path)
+        if plan is None:
+            return False, error_msg
+        return player.play_plan(plan, repeat_count, gap)
+    return _run(player, play)
+
+
+def simulate_playlist(player, entries, loops=1):
+    """Play ``entries`` (PlaylistEntry) as a playlist on a simulated player.
+
+    Returns:
+        tuple: (Simulation, Playlist), the playlist holding per-entry stats
+    """
+    playlist = Playlist(player, entries, loops=loops)
+    return _run(player, playlist.run), playlist
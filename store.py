@@ -0,0 +1,405 @@
+"""Content-addressed, deduplicated storage for recordings.
+
+A ``RecordingStore`` splits each recording into chunks of events, stores
+every distinct chunk once under the SHA-256 of its content, and keeps the
+recording itself as a small JSON manifest listing its chunks. Variants of
+one recording, such as the same workflow with a different ending, share
+most chunks, so saving a variant only writes the chunks that are new.
+
+Chunk boundaries are content-defined: a rolling hash over the last
+``WINDOW`` events decides where chunks end, so an edit only changes the
+chunks around it, and the chunks after it line up again. The window is as
+many events as the hash has tested bits, since each older event is shifted
+one bit further out of them. Rows are
+delta-encoded (time, x and y relative to the previous event), so a run of
+events shifted in time by an inserted pause still deduplicates. Decoding
+adds the deltas back up, and a chunk is only delta-encoded if that gives
+back every value bit for bit; otherwise it stores absolute values.
+
+Chunks that no manifest references are removed by ``gc``.
+
+Manifests also carry the recording's summary, so ``read_summary`` and the
+library describe them without touching chunks. ``recording_format`` loads
+and saves ``.rmman`` paths through the store the manifest belongs to, so a
+manifest path works wherever a recording file does.
+
+Layout::
+
+    <root>/manifests/<name>.rmman
+    <root>/chunks/<first two hex digits>/<sha256>
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from array import array
+from itertools import accumulate
+from operator import add, sub
+from pathlib import Path
+from recording_format import BYTE_COLUMNS, FLOAT_COLUMNS, MANIFEST_SUFFIX, ROW_SIZE, Recording, summarize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STORE_DIRNAME = "store"
+MANIFEST_DIRNAME = "manifests"
+MANIFEST_VERSION = 1
+
+# Content-defined chunking, in events
+AVERAGE_CHUNK_BITS = 10  # Boundaries where the low bits of the hash are zero: ~1024 events per chunk
+WINDOW = AVERAGE_CHUNK_BITS  # Events that decide a boundary; older ones are shifted out of the tested bits
+MIN_CHUNK = 256
+MAX_CHUNK = 8192
+
+# Unreferenced chunks younger than this survive gc, so a save running at the same time is safe
+GC_GRACE_SECONDS = 3600
+
+CHUNK_HEADER = struct.Struct('<BI')  # Encoding, event count
+ENCODING_ABSOLUTE = 0
+ENCODING_DELTA = 1
+
+_MASK = (1 << AVERAGE_CHUNK_BITS) - 1
+_MIX = 0x9E3779B97F4A7C15  # Odd 64-bit constant spreading row bits across the hash
+_WORD = (1 << 64) - 1
+
+
+def _row_hashes(recording):
+    """A 32-bit hash of every event's content, times and positions taken as deltas."""
+    n = len(recording)
+    if np is not None:
+        t = np.frombuffer(recording.times, dtype=np.float64)
+        x = np.frombuffer(recording.xs, dtype=np.float64)
+        y = np.frombuffer(recording.ys, dtype=np.float64)
+        words = [
+            np.diff(t, prepend=0.0).view(np.uint64),
+            np.diff(x, prepend=0.0).view(np.uint64),
+            np.diff(y, prepend=0.0).view(np.uint64),
+            (np.frombuffer(recording.types, dtype=np.uint8).astype(np.uint64) << np.uint64(16))
+            | (np.frombuffer(recording.buttons, dtype=np.uint8).astype(np.uint64) << np.uint64(8))
+            | np.frombuffer(recording.pressed, dtype=np.uint8).astype(np.uint64),
+        ]
+        h = np.zeros(n, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for word in words:
+                h = (h ^ word) * np.uint64(_MIX)
+        return (h >> np.uint64(32)).astype(np.uint32)
+
+    # The same mix in pure Python, so both paths cut chunks at the same events
+    hashes = array('I')
+    bits = struct.Struct('<d')
+    as_int = struct.Struct('<Q')
+    previous_t = previous_x = previous_y = 0.0
+    for t, x, y, kind, button, pressed in zip(recording.times, recording.xs, recording.ys,
+                                             recording.types, recording.buttons, recording.pressed):
+        h = 0
+        for word in (t - previous_t, x - previous_x, y - previous_y):
+            h = ((h ^ as_int.unpack(bits.pack(word))[0]) * _MIX) & _WORD
+        h = ((h ^ (kind << 16 | button << 8 | pressed)) * _MIX) & _WORD
+        hashes.append(h >> 32)
+        previous_t, previous_x, previous_y = t, x, y
+    return hashes
+
+
+def chunk_boundaries(recording):
+    """Return the end index of every chunk, the last being ``len(recording)``."""
+    n = len(recording)
+    hashes = _row_hashes(recording)
+    # Gear hash: each event's hash is shifted once per later event, so after WINDOW
+    # events it no longer reaches the low AVERAGE_CHUNK_BITS bits that are tested
+    if np is not None:
+        rolling = np.zeros(n, dtype=np.uint64)
+        h = hashes.astype(np.uint64)
+        for k in range(WINDOW):
+            rolling[k:] += h[:n - k] << np.uint64(k)
+        candidates = np.flatnonzero((rolling & np.uint64(_MASK)) == 0) + 1
+    else:
+        candidates = []
+        rolling = 0
+        for i, h in enumerate(hashes):
+            rolling = ((rolling << 1) + h) & _MASK  # Older events are shifted out of the low bits
+            if not rolling:
+                candidates.append(i + 1)
+
+    boundaries = []
+    start = 0
+    for end in candidates:
+        end = int(end)
+        while end - start > MAX_CHUNK:
+            start += MAX_CHUNK
+            boundaries.append(start)
+        if end - start >= MIN_CHUNK:
+            boundaries.append(end)
+            start = end
+    while n - start > MAX_CHUNK:
+        start += MAX_CHUNK
+        boundaries.append(start)
+    if start < n:
+        boundaries.append(n)
+    return boundaries
+
+
+def _column(recording, name, start, end):
+    return memoryview(getattr(recording, name))[start:end]
+
+
+def _predecessors(first, values):
+    """``first`` followed by all but the last of ``values``."""
+    yield first
+    yield from values[:-1]
+
+
+def encode_chunk(recording, start, end):
+    """Encode events ``start:end``, delta-encoded if that round-trips exactly."""
+    encoding = ENCODING_DELTA
+    absolute, deltas = [], []
+    for name in FLOAT_COLUMNS:
+        values = array('d', _column(recording, name, start, end))
+        before = getattr(recording, name)[start - 1] if start else 0.0
+        column = array('d', map(sub, values, _predecessors(before, values)))
+        if array('d', accumulate(column, add, initial=before))[1:] != values:
+            encoding = ENCODING_ABSOLUTE
+        absolute.append(values)
+        deltas.append(column)
+    payload = [CHUNK_HEADER.pack(encoding, end - start)]
+    payload.extend(column.tobytes() for column in (deltas if encoding == ENCODING_DELTA else absolute))
+    payload.extend(_column(recording, name, start, end).tobytes() for name in BYTE_COLUMNS)
+    return b''.join(payload)
+
+
+def decode_chunk(payload, previous):
+    """Decode a chunk into its columns.
+
+    Args:
+        previous (tuple): (time, x, y) of the event before the chunk,
+            needed to undo delta encoding
+
+    Returns:
+        dict: column name -> array
+    """
+    encoding, count = CHUNK_HEADER.unpack_from(payload)
+    offset = CHUNK_HEADER.size
+    columns = {}
+    for name, before in zip(FLOAT_COLUMNS, previous):
+        values = array('d')
+        values.frombytes(payload[offset:offset + count * 8])
+        offset += count * 8
+        if encoding == ENCODING_DELTA:
+            values = array('d', accumulate(values, add, initial=before))
+            del values[0]
+        columns[name] = values
+    for name in BYTE_COLUMNS:
+        columns[name] = array('B', payload[offset:offset + count])
+        offset += count
+    return columns
+
+
+class RecordingStore:
+    """Recordings stored as manifests over shared, content-addressed chunks."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.manifest_dir = self.root / MANIFEST_DIRNAME
+        self.chunk_dir = self.root / "chunks"
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_dir.mkdir(parents=True, exist_ok=True)
+
+    def _chunk_path(self, digest):
+        return self.chunk_dir / digest[:2] / digest
+
+    def _manifest_path(self, name):
+        if not name or '/' in name or name.startswith('.'):
+            raise ValueError(f"Invalid recording name: {name!r}")
+        return self.manifest_dir / f"{name}{MANIFEST_SUFFIX}"
+
+    @staticmethod
+    def _write_atomic(path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def save(self, name, recording):
+        """Store ``recording`` as ``name``, writing only chunks not stored yet.
+
+        Returns:
+            dict: chunks, new_chunks and bytes_written
+        """
+        chunks = []
+        new_chunks = bytes_written = 0
+        start = 0
+        for end in chunk_boundaries(recording):
+            payload = encode_chunk(recording, start, end)
+            digest = hashlib.sha256(payload).hexdigest()
+            path = self._chunk_path(digest)
+            if path.exists():
+                os.utime(path)  # Fresh again, so a concurrent gc leaves it alone
+            else:
+                data = zlib.compress(payload)
+                self._write_atomic(path, data)
+                new_chunks += 1
+                bytes_written += len(data)
+            chunks.append([digest, end - start])
+            start = end
+
+        summary = summarize(recording)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'events': len(recording),
+            'button_names': recording.button_names,
+            'flags': recording.flags,
+            'duration': summary['duration'],
+            'clicks': summary['clicks'],
+            'bbox': summary['bbox'],
+            'checksum': summary['checksum'],
+            'chunks': chunks,
+        }
+        data = json.dumps(manifest).encode('utf-8')
+        self._write_atomic(self._manifest_path(name), data)
+        bytes_written += len(data)
+        logging.info(f"Stored {name}: {len(chunks)} chunks, {new_chunks} new, {bytes_written} bytes written")
+        return {'chunks': len(chunks), 'new_chunks': new_chunks, 'bytes_written': bytes_written}
+
+    def _manifest(self, name):
+        with open(self._manifest_path(name), 'rb') as f:
+            manifest = json.loads(f.read())
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+        return manifest
+
+    def iter_chunks(self, name):
+        """Yield the recording stored as ``name`` a chunk at a time."""
+        manifest = self._manifest(name)
+        source = self._manifest_path(name)
+        previous = (0.0, 0.0, 0.0)
+        for digest, count in manifest['chunks']:
+            with open(self._chunk_path(digest), 'rb') as f:
+                payload = zlib.decompress(f.read())
+            if hashlib.sha256(payload).hexdigest() != digest:
+                raise ValueError(f"Chunk {digest} of {name} is corrupted")
+            decoded = decode_chunk(payload, previous)
+            previous = tuple(decoded[column][-1] for column in FLOAT_COLUMNS)
+            yield Recording(button_names=manifest['button_names'], flags=manifest['flags'], source=source,
+                            **decoded)
+
+    def load(self, name):
+        """Reassemble the recording stored as ``name``."""
+        manifest = self._manifest(name)
+        columns = {name: array('d') for name in FLOAT_COLUMNS}
+        columns.update({name: array('B') for name in BYTE_COLUMNS})
+        for chunk in self.iter_chunks(name):
+            for column, values in columns.items():
+                values.extend(getattr(chunk, column))
+        return Recording(button_names=manifest['button_names'], flags=manifest['flags'],
+                         source=self._manifest_path(name), **columns)
+
+    def summary(self, name):
+        """Describe ``name`` like ``recording_format.read_summary``, from its manifest alone."""
+        manifest = self._manifest(name)
+        if 'checksum' not in manifest:
+            # Stored before manifests carried a summary
+            summary = summarize(self.load(name))
+        else:
+            summary = {key: manifest[key] for key in ('events', 'duration', 'clicks', 'checksum')}
+            summary['bbox'] = tuple(manifest['bbox'])
+        summary['version'] = manifest['version']
+        return summary
+
+    def names(self):
+        return sorted(path.stem for path in self.manifest_dir.glob(f'*{MANIFEST_SUFFIX}'))
+
+    def delete(self, name):
+        """Remove a manifest; its chunks go on the next gc."""
+        self._manifest_path(name).unlink()
+
+    def _referenced(self):
+        referenced = set()
+        for name in self.names():
+            referenced.update(digest for digest, _ in self._manifest(name)['chunks'])
+        return referenced
+
+    def _chunk_files(self):
+        return (path for path in self.chunk_dir.glob('*/*') if not path.name.startswith('.'))
+
+    def gc(self, dry_run=False, grace=GC_GRACE_SECONDS):
+        """Delete chunks no manifest references.
+
+        Returns:
+            tuple: (chunks removed, bytes freed)
+        """
+        referenced = self._referenced()
+        cutoff = time.time() - grace
+        removed = freed = 0
+        for path in self._chunk_files():
+            if path.name in referenced:
+                continue
+            stat = path.stat()
+            if stat.st_mtime > cutoff:
+                continue
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                path.unlink()
+        logging.info(f"Store gc {'(dry run) ' if dry_run else ''}removed {removed} chunks, {freed} bytes")
+        return removed, freed
+
+    def stats(self):
+        """Sizes of the store against the recordings it holds.
+
+        Returns:
+            dict: recordings, events, chunks, stored_bytes (chunks and
+            manifests on disk) and logical_bytes (the same recordings as
+            standalone binary files)
+        """
+        events = manifest_bytes = 0
+        names = self.names()
+        for name in names:
+            events += self._manifest(name)['events']
+            manifest_bytes += self._manifest_path(name).stat().st_size
+        chunks = chunk_bytes = 0
+        for path in self._chunk_files():
+            chunks += 1
+            chunk_bytes += path.stat().st_size
+        return {
+            'recordings': len(names),
+            'events': events,
+            'chunks': chunks,
+            'stored_bytes': chunk_bytes + manifest_bytes,
+            'logical_bytes': events * ROW_SIZE,
+        }
+
+
+def open_manifest(path):
+    """The store a manifest path belongs to, and the recording's name in it.
+
+    The store need not exist yet, so recordings can be saved to a path.
+    """
+    path = Path(path)
+    if path.suffix != MANIFEST_SUFFIX or path.parent.name != MANIFEST_DIRNAME:
+        raise ValueError(f"Not a store manifest path: {path}")
+    return RecordingStore(path.parent.parent), path.stem
+
+
+def load_manifest(path):
+    store, name = open_manifest(path)
+    return store.load(name)
+
+
+def save_manifest(recording, path):
+    store, name = open_manifest(path)
+    return store.save(name, recording)
+
+
+def read_manifest_summary(path):
+    store, name = open_manifest(path)
+    return store.summary(name)
+
+
+def iter_manifest_chunks(path):
+    store, name = open_manifest(path)
+    yield from store.iter_chunks(name)
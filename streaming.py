@@ -0,0 +1,268 @@
+"""Read recordings incrementally, a chunk of events at a time.
+
+Loading a whole recording before playing it makes the wait for the first
+event, and the memory used, grow with the recording. ``iter_chunks``
+instead yields small columnar ``Recording`` objects in order:
+
+- legacy JSON files are parsed one event object at a time with
+  ``JSONDecoder.raw_decode`` over fixed-size reads, never holding the
+  whole document or event list
+- binary files are read column slice by column slice
+- archives are decompressed block by block, see ``archive.py``
+
+``ReadAhead`` runs such a generator on a background thread and buffers at
+most ``max_chunks`` chunks, so reading overlaps playback with bounded
+memory.
+"""
+import json
+import os
+import queue
+import threading
+from array import array
+from pathlib import Path
+from recording_format import (
+    ARCHIVE_MAGIC,
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    HEADER,
+    MAGIC,
+    Recording,
+    RecordingFormatError,
+    _data_offset,
+    _table_offset,
+    _is_manifest,
+    _unpack_header,
+    from_events,
+    time_range,
+)
+
+CHUNK_EVENTS = 4096  # Events per chunk
+FIRST_CHUNK_EVENTS = 128  # Chunks start this small and double, so the first event arrives early
+READ_SIZE = 1 << 16  # Bytes per read of a JSON file
+# An event cut off by the end of the buffer fails to decode no further back than this
+# many characters, the start of its longest string; errors before that are real
+CUT_EVENT_CHARS = 256
+READ_AHEAD_CHUNKS = 8  # Chunks buffered ahead of playback
+
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_events(path, read_size=READ_SIZE):
+    """Yield the event dicts of a legacy JSON recording one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False  # Seen the opening '['
+        expect_value = True  # After '[' or ',' rather than after an event
+
+        def fill():
+            nonlocal buffer, pos, eof
+            data = f.read(read_size)
+            if not data:
+                eof = True
+            buffer = buffer[pos:] + data
+            pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise RecordingFormatError("Recording file ends before the event list is closed")
+                fill()
+                continue
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise RecordingFormatError("Legacy recording is not a JSON list")
+                started = True
+                pos += 1
+            elif char == ']':
+                return
+            elif char == ',' and not expect_value:
+                expect_value = True
+                pos += 1
+            else:
+                try:
+                    event, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if eof or e.pos < len(buffer) - CUT_EVENT_CHARS:
+                        raise RecordingFormatError(f"Invalid event in legacy recording: {e}") from e
+                    fill()  # The event is cut off at the end of the buffer
+                    continue
+                yield event
+                pos = end
+                expect_value = False
+
+
+def _chunk_sizes(chunk_events):
+    size = min(FIRST_CHUNK_EVENTS, chunk_events)
+    while True:
+        yield size
+        size = min(size * 2, chunk_events)
+
+
+def iter_json_chunks(path, chunk_events=CHUNK_EVENTS):
+    sizes = _chunk_sizes(chunk_events)
+    size = next(sizes)
+    batch = []
+    for event in iter_json_events(path):
+        batch.append(event)
+        if len(batch) == size:
+            yield from_events(batch, source=Path(path))
+            batch = []
+            size = next(sizes)
+    if batch:
+        yield from_events(batch, source=Path(path))
+
+
+def iter_binary_chunks(path, chunk_events=CHUNK_EVENTS):
+    """Yield a binary recording in chunks read straight from its columns."""
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size)
+        magic, version, flags, count, table_len = _unpack_header(head)
+        table_offset = _table_offset(version)
+        f.seek(table_offset)
+        button_names = json.loads(f.read(table_len).decode('utf-8'))
+        offset = _data_offset(table_len, version)
+        if os.fstat(f.fileno()).st_size < offset + count * (8 * len(FLOAT_COLUMNS) + len(BYTE_COLUMNS)):
+            raise RecordingFormatError("Recording file is truncated")
+
+        # Where each column starts and its item size
+        columns = []
+        for name in FLOAT_COLUMNS:
+            columns.append((name, offset, 'd', 8))
+            offset += count * 8
+        for name in BYTE_COLUMNS:
+            columns.append((name, offset, 'B', 1))
+            offset += count
+
+        start = 0
+        for size in _chunk_sizes(chunk_events):
+            if start >= count:
+                break
+            size = min(size, count - start)
+            chunk = {}
+            for name, column_offset, typecode, itemsize in columns:
+                f.seek(column_offset + start * itemsize)
+                values = array(typecode, bytes(size * itemsize))
+                f.readinto(values)
+                chunk[name] = values
+            start += size
+            yield Recording(button_names=button_names, flags=flags, source=Path(path), **chunk)
+
+
+def iter_recording_chunks(recording, chunk_events=CHUNK_EVENTS):
+    """Yield an already loaded recording in the same chunks as ``iter_chunks``."""
+    start = 0
+    for size in _chunk_sizes(chunk_events):
+        if start >= len(recording):
+            return
+        end = start + size
+        yield Recording(
+            recording.times[start:end], recording.xs[start:end], recording.ys[start:end],
+            recording.types[start:end], recording.buttons[start:end], recording.pressed[start:end],
+            recording.button_names, recording.flags, recording.source,
+        )
+        start = end
+
+
+def _cut(chunks, start, end):
+    """Keep the events of ``chunks`` with ``start <= time < end``."""
+    for chunk in chunks:
+        lo, hi = time_range(chunk, start, end)
+        if lo < hi:
+            yield chunk if hi - lo == len(chunk) else chunk.slice(lo, hi)
+        if end is not None and hi < len(chunk):
+            return
+
+
+def iter_chunks(path, chunk_events=CHUNK_EVENTS, start=None, end=None):
+    """Yield a recording in any format as chunks of at most ``chunk_events``.
+
+    With ``start`` or ``end`` (seconds) only the events in between are
+    yielded; archives seek straight to them and yield whole blocks. Store
+    manifests are yielded a store chunk at a time.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == ARCHIVE_MAGIC:
+        from archive import iter_archive_chunks
+        return iter_archive_chunks(path, start, end)
+    if magic == MAGIC:
+        chunks = iter_binary_chunks(path, chunk_events)
+    elif _is_manifest(magic):
+        # Store chunks are already decoded one at a time
+        from store import iter_manifest_chunks
+        chunks = iter_manifest_chunks(path)
+    else:
+        chunks = iter_json_chunks(path, chunk_events)
+    if start is None and end is None:
+        return chunks
+    return _cut(chunks, start, end)
+
+
+class ReadAhead:
+    """Iterate ``items`` on a background thread, buffering at most ``max_chunks``.
+
+    An exception raised by ``items`` is re-raised by the consuming iterator.
+    ``close`` stops the producer early, e.g. when playback is cancelled.
+    """
+
+    _DONE = object()
+
+    def __init__(self, items, max_chunks=READ_AHEAD_CHUNKS):
+        self._items = items
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='read-ahead', daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # Wake up now and then to notice close() while the queue is full
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self):
+        try:
+            for item in self._items:
+                if not self._put(item):
+                    return
+            self._put(self._DONE)
+        except Exception as e:
+            self._put(e)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._closed.set()
+        # Make room so a producer blocked on a full queue notices at once
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+        close = getattr(self._items, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+from recording_format import from_events
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    """A fresh home directory, so nothing reads or writes the real app data folder."""
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    return home
+
+
+@pytest.fixture
+def random_recording():
+    """Build a recording of ``count`` moves with a press/release pair every ``click_every`` events."""
+    def build(count, seed=0, click_every=100):
+        rng = random.Random(seed)
+        events = []
+        t = 0.0
+        for i in range(count):
+            t += rng.random() * 0.02
+            x, y = rng.randint(0, 1920), rng.randint(0, 1080)
+            events.append({'type': 'move', 'time': t, 'x': x, 'y': y})
+            if i % click_every == click_every - 1:
+                for pressed in (True, False):
+                    t += 0.05
+                    events.append({'type': 'click', 'time': t, 'x': x, 'y': y,
+                                   'button': 'Button.left', 'pressed': pressed})
+        return from_events(events)
+    return build
@@ -0,0 +1,163 @@
+import math
+import struct
+from array import array
+
+import archive
+import pytest
+from archive import (
+    TRAILER,
+    Archive,
+    _decode_floats,
+    _encode_floats,
+    _shuffle,
+    _unshuffle,
+    load_archive,
+    load_section,
+    save_archive,
+)
+from recording_format import (
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    Recording,
+    RecordingFormatError,
+    load_recording,
+    save_recording,
+    time_range,
+)
+
+AWKWARD_FLOATS = [0.0, -0.0, 1e-310, -1.5, 1e300, -1e300, math.inf, -math.inf, math.nan, 0.1, 2.0 ** 53]
+
+
+def column_bytes(recording):
+    return {name: memoryview(getattr(recording, name)).tobytes() for name in FLOAT_COLUMNS + BYTE_COLUMNS}
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def codec_path(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(archive, 'np', None)
+    elif archive.np is None:
+        pytest.skip("numpy is not installed")
+    return request.param
+
+
+def test_shuffle_round_trip():
+    data = bytes(range(256)) * 3
+    shuffled = _shuffle(data)
+
+    assert shuffled[:3] == bytes([0, 8, 16])
+    assert bytes(_unshuffle(shuffled)) == data
+
+
+def test_float_codec_is_exact(codec_path):
+    values = array('d', AWKWARD_FLOATS + AWKWARD_FLOATS[::-1])
+    decoded = _decode_floats(_encode_floats(memoryview(values).cast('B')))
+
+    assert decoded.tobytes() == values.tobytes()
+
+
+def test_float_codec_paths_are_compatible(monkeypatch):
+    if archive.np is None:
+        pytest.skip("numpy is not installed")
+    values = array('d', AWKWARD_FLOATS)
+    encoded = _encode_floats(memoryview(values).cast('B'))
+    monkeypatch.setattr(archive, 'np', None)
+
+    assert encoded == _encode_floats(memoryview(values).cast('B'))
+    assert _decode_floats(encoded).tobytes() == values.tobytes()
+
+
+@pytest.mark.parametrize('codec', sorted(archive.CODECS))
+def test_archive_round_trip(tmp_path, random_recording, codec):
+    recording = random_recording(10000)
+    path = tmp_path / "r.rmz"
+    save_archive(recording, path, codec=codec, block_events=1000)
+
+    loaded = load_archive(path)
+    assert column_bytes(loaded) == column_bytes(recording)
+    assert loaded.button_names == recording.button_names
+    assert column_bytes(load_recording(path)) == column_bytes(recording)
+    with Archive(path) as opened:
+        assert opened.codec == codec
+        assert len(opened) == len(recording)
+        assert opened.block_count == 11
+        assert opened.duration == recording.duration
+
+
+def test_section_reads_only_its_blocks(tmp_path, random_recording):
+    recording = random_recording(20000)
+    path = tmp_path / "r.rmz"
+    save_archive(recording, path, block_events=1000)
+    start, end = recording.times[5500], recording.times[7200]
+
+    with Archive(path) as opened:
+        section = opened.load(start, end)
+        assert opened.blocks_read <= 4
+    assert column_bytes(section) == column_bytes(recording.slice(*time_range(recording, start, end)))
+
+
+def test_section_keeps_equal_times_across_blocks(tmp_path):
+    times = [0.0, 1.0, 1.0, 1.0, 1.0, 2.0, 3.0]
+    n = len(times)
+    recording = Recording(array('d', times), array('d', range(n)), array('d', range(n)),
+                          array('B', bytes(n)), array('B', bytes(n)), array('B', bytes(n)), [''])
+    path = tmp_path / "r.rmz"
+    save_archive(recording, path, block_events=2)
+
+    assert list(load_section(path, 1.0, 2.0).xs) == [1.0, 2.0, 3.0, 4.0]
+    assert list(load_section(path, 1.0, None).times) == times[1:]
+    assert len(load_section(path, 5.0, 6.0)) == 0
+
+
+def test_load_section_of_binary_files(tmp_path, random_recording):
+    recording = random_recording(3000)
+    path = tmp_path / "r.rmrec"
+    save_recording(recording, path)
+    start, end = recording.times[100], recording.times[900]
+
+    assert column_bytes(load_section(path, start, end)) == column_bytes(recording.slice(100, 900))
+
+
+def test_empty_archive(tmp_path):
+    empty = Recording(array('d'), array('d'), array('d'), array('B'), array('B'), array('B'), [''])
+    path = tmp_path / "empty.rmz"
+    save_archive(empty, path)
+
+    assert len(load_archive(path)) == 0
+    assert len(load_section(path, 0.0, 1.0)) == 0
+
+
+def test_corrupted_index_is_rejected(tmp_path, random_recording):
+    path = tmp_path / "r.rmz"
+    save_archive(random_recording(3000), path, block_events=1000)
+    data = bytearray(path.read_bytes())
+    index_offset = struct.unpack_from('<Q', data, len(data) - TRAILER.size)[0]
+    data[index_offset] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(RecordingFormatError):
+        Archive(path)
+
+
+def test_truncated_archive_is_rejected(tmp_path, random_recording):
+    path = tmp_path / "r.rmz"
+    save_archive(random_recording(3000), path)
+    path.write_bytes(path.read_bytes()[:-10])
+
+    with pytest.raises(RecordingFormatError):
+        Archive(path)
+
+
+def test_corrupted_block_is_rejected(tmp_path, random_recording):
+    path = tmp_path / "r.rmz"
+    save_archive(random_recording(3000), path, block_events=1000)
+    with Archive(path) as opened:
+        _, _, offset, size, _ = opened._index[1]
+    data = bytearray(path.read_bytes())
+    data[offset:offset + size] = archive.zlib.compress(b'\0' * 10).ljust(size, b'\0')
+    path.write_bytes(bytes(data))
+
+    with Archive(path) as opened:
+        opened.read_block(0)
+        with pytest.raises(RecordingFormatError):
+            opened.read_block(1)
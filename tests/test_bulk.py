@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+from bulk import JOURNAL_NAME, check_recording, read_journal, run_bulk
+from recording_format import from_events, load_recording, save_recording
+
+MOVES = [{'type': 'move', 'time': i * 0.1, 'x': i, 'y': i} for i in range(5)]
+
+
+def click(t, pressed, button='Button.left'):
+    return {'type': 'click', 'time': t, 'x': 0, 'y': 0, 'button': button, 'pressed': pressed}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "recordings"
+    (root / "day2").mkdir(parents=True)
+    for name in ("a.rmrec", "b.rmrec", "day2/c.rmrec"):
+        save_recording(from_events(MOVES), root / name)
+    (root / "day2" / "broken.json").write_text('[{"type": ')
+    return root
+
+
+def journal_lines(root):
+    return (root / JOURNAL_NAME.format(mode='validate')).read_text().splitlines()
+
+
+def test_check_finds_each_problem_once_with_its_first_event():
+    events = MOVES + [
+        {'type': 'move', 'time': 0.2, 'x': 1e9, 'y': 0},
+        click(0.5, True), click(0.6, True), click(0.7, False), click(0.8, False, 'Button.right'),
+    ]
+    problems = check_recording(from_events(events))
+
+    assert problems == {
+        'time goes backwards': [1, 5],
+        'coordinates out of bounds': [1, 5],
+        'press without release': [1, 6],
+        'release without press': [1, 9],
+    }
+    assert check_recording(from_events(MOVES)) == {}
+
+
+def test_first_run_reports_every_file(tree):
+    report = run_bulk(tree, workers=2)
+
+    assert report.files == 4
+    assert report.resumed == 0
+    assert report.statuses == {'ok': 3, 'invalid': 0, 'error': 1}
+    assert report.events == 15
+    assert len(journal_lines(tree)) == 4
+
+
+def test_resume_skips_done_files_and_retries_failures(tree):
+    run_bulk(tree, workers=2)
+    report = run_bulk(tree, workers=2)
+
+    assert (report.files, report.resumed) == (1, 3)
+    assert report.statuses == {'ok': 3, 'invalid': 0, 'error': 1}
+
+    (tree / "day2" / "broken.json").unlink()
+    save_recording(from_events(MOVES), tree / "day2" / "fixed.rmrec")
+    report = run_bulk(tree, workers=2)
+    assert (report.files, report.resumed) == (1, 3)
+    assert report.statuses == {'ok': 4, 'invalid': 0, 'error': 0}
+
+
+def test_changed_file_is_processed_again_and_counted_once(tree):
+    run_bulk(tree, workers=2)
+    stat = (tree / "a.rmrec").stat()
+    os.utime(tree / "a.rmrec", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    report = run_bulk(tree, workers=2)
+    assert (report.files, report.resumed) == (2, 2)
+    assert report.statuses['ok'] == 3
+
+    # The journal now holds two entries for a.rmrec; only the last one counts
+    report = run_bulk(tree, workers=2)
+    assert (report.files, report.resumed) == (1, 3)
+    assert report.statuses['ok'] == 3
+
+
+def test_journal_keeps_the_last_ok_entry_of_each_path(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    entries = [
+        {'path': 'a', 'size': 1, 'mtime_ns': 1, 'status': 'ok'},
+        {'path': 'a', 'size': 2, 'mtime_ns': 2, 'status': 'ok'},
+        {'path': 'b', 'size': 1, 'mtime_ns': 1, 'status': 'ok'},
+        {'path': 'b', 'size': 1, 'mtime_ns': 1, 'status': 'error'},
+        {'path': 'c', 'size': 1, 'mtime_ns': 1, 'status': 'invalid'},
+    ]
+    journal.write_text(''.join(json.dumps(entry) + '\n' for entry in entries) + '{"path": "d", "si')
+
+    done = read_journal(journal)
+    assert list(done) == ['a']
+    assert done['a']['size'] == 2
+    assert read_journal(tmp_path / "missing.jsonl") == {}
+
+
+def test_restart_ignores_the_journal(tree):
+    run_bulk(tree, workers=2)
+    report = run_bulk(tree, workers=2, restart=True)
+
+    assert (report.files, report.resumed) == (4, 0)
+    assert len(journal_lines(tree)) == 4
+
+
+def test_convert_mirrors_the_tree(tree, tmp_path):
+    output = tmp_path / "json"
+    report = run_bulk(tree, mode='convert', output=output, to='json', workers=2)
+
+    assert report.statuses['ok'] == 3
+    converted = sorted(path.relative_to(output).as_posix() for path in output.rglob('*.json'))
+    assert converted == ['a.json', 'b.json', 'day2/c.json']
+    assert list(load_recording(output / "a.json").xs) == [0, 1, 2, 3, 4]
@@ -0,0 +1,93 @@
+import pytest
+from headless import ACTION_MOVE, HeadlessController
+from play import MousePlayer
+from recording_format import from_events, save_recording
+from simulate import VirtualClock, simulate
+
+STALL_AT = 0.5  # Simulated seconds into the run
+STALL = 0.6
+
+
+class StallingController(HeadlessController):
+    """A controller whose first move after STALL_AT blocks for STALL seconds."""
+
+    def __init__(self, clock):
+        super().__init__(clock=clock)
+        self.stalled = False
+
+    @HeadlessController.position.setter
+    def position(self, value):
+        if not self.stalled and self.clock() >= STALL_AT:
+            self.stalled = True
+            self.clock.now += STALL
+        HeadlessController.position.fset(self, value)
+
+
+@pytest.fixture
+def recording_file(tmp_path):
+    events = [{'type': 'move', 'time': i * 0.01, 'x': i, 'y': 2 * i} for i in range(200)]
+    # Two clicks due while the controller is stalled
+    for t, x, pressed in ((0.7, 1000, True), (0.7, 1000, False), (0.9, 2000, True), (0.9, 2000, False)):
+        events.append({'type': 'click', 'time': t, 'x': x, 'y': x, 'button': 'Button.left', 'pressed': pressed})
+    events.sort(key=lambda event: event['time'])
+    path = tmp_path / "clicks.rmrec"
+    save_recording(from_events(events), path)
+    return path
+
+
+def stalled_player(catch_up_after):
+    clock = VirtualClock()
+    player = MousePlayer(controller=StallingController(clock), clock=clock, sleep=clock.sleep)
+    player.catch_up_after = catch_up_after
+    return player
+
+
+def clicks(simulation):
+    return [row[1:] for row in simulation.rows() if row[1] != 'move']
+
+
+def test_coalescing_keeps_every_click_exact(recording_file):
+    simulation = simulate(stalled_player(0.05), recording_file)
+    baseline = simulate(stalled_player(None), recording_file)
+
+    assert simulation.success
+    assert clicks(simulation) == clicks(baseline)
+    assert clicks(simulation) == [
+        ('press', 1000.0, 1000.0, 'Button.left'),
+        ('release', 1000.0, 1000.0, 'Button.left'),
+        ('press', 2000.0, 2000.0, 'Button.left'),
+        ('release', 2000.0, 2000.0, 'Button.left'),
+    ]
+    # Each click is still preceded by a move to its own position
+    rows = list(simulation.rows())
+    for i, row in enumerate(rows):
+        if row[1] != 'move':
+            assert rows[i - 1][1:4] == ('move', row[2], row[3])
+
+
+def test_coalescing_skips_stale_positions(recording_file):
+    simulation = simulate(stalled_player(0.05), recording_file)
+    baseline = simulate(stalled_player(None), recording_file)
+
+    def stale(result):
+        # Moves recorded during the stall, from 0.51 s to 1.09 s; x is the move's index
+        timeline = result.timeline
+        return [x for kind, x in zip(timeline.kinds, timeline.xs) if kind == ACTION_MOVE and 50 < x < 110]
+
+    # Absolute deadlines end both runs on time; without catching up the cursor crawls
+    # through every stale position at once after the stall
+    assert simulation.simulated_s == baseline.simulated_s == pytest.approx(1.99)
+    assert len(stale(baseline)) == 59
+    assert len(stale(simulation)) < 5
+
+
+def test_coalesced_moves_are_not_counted_as_events(recording_file):
+    player = stalled_player(0.05)
+    simulation = simulate(player, recording_file)
+    counters = player.stats()['counters']
+
+    assert counters['coalesced'] > 0
+    assert counters['events'] + counters['coalesced'] == 204
+    moves = list(simulation.timeline.kinds).count(ACTION_MOVE)
+    # Every fired event moves the cursor once
+    assert moves == counters['events']
@@ -0,0 +1,139 @@
+import pytest
+from editor import RecordingEditor
+from recording_format import from_events
+
+
+def moves(times, x=0):
+    return [{'type': 'move', 'time': t, 'x': x + i, 'y': 0} for i, t in enumerate(times)]
+
+
+def click(t, pressed, button='Button.left'):
+    return {'type': 'click', 'time': t, 'x': 0, 'y': 0, 'button': button, 'pressed': pressed}
+
+
+def times(editor):
+    return list(editor.materialize().times)
+
+
+@pytest.fixture
+def editor():
+    # Events at 0, 1, ..., 9 with x equal to the time
+    return RecordingEditor(from_events(moves(range(10))))
+
+
+def test_unedited_recording_is_returned_without_copying(editor):
+    assert editor.materialize() is editor.sources[0]
+
+
+def test_cut_closes_the_gap(editor):
+    editor.cut(2, 5)
+
+    edited = editor.materialize()
+    assert list(edited.times) == [0, 1, 2, 3, 4, 5, 6]
+    assert list(edited.xs) == [0, 1, 5, 6, 7, 8, 9]
+    assert len(editor) == 7
+    assert editor.duration == 6
+
+
+def test_cut_indices_keeps_timestamps(editor):
+    editor.cut_indices(3, 6)
+
+    assert times(editor) == [0, 1, 2, 6, 7, 8, 9]
+
+
+def test_insert_pause_delays_later_events(editor):
+    editor.insert_pause(4, 2.5)
+
+    assert times(editor) == [0, 1, 2, 3, 6.5, 7.5, 8.5, 9.5, 10.5, 11.5]
+
+
+def test_truncate_and_trim_tail(editor):
+    editor.trim_tail(2)
+    assert times(editor) == [0, 1, 2, 3, 4, 5, 6, 7]
+    editor.truncate(3)
+    assert times(editor) == [0, 1, 2]
+    editor.truncate(10)
+    assert times(editor) == [0, 1, 2]
+
+
+def test_counts_are_by_time(editor):
+    editor.insert_pause(5, 10)
+
+    assert editor.count_before(5) == 5
+    assert editor.count_until(5) == 5
+    assert editor.count_before(15) == 5
+    assert editor.count_until(15) == 6
+    assert editor.count_before(-1) == 0
+    assert editor.count_until(100) == 10
+    assert editor.time_at(5) == 15
+
+
+def test_splice_translates_buttons(editor):
+    other = from_events([click(0.0, True, 'Button.right'), click(0.5, False, 'Button.right')])
+    editor.splice(3, other)
+
+    edited = editor.materialize()
+    assert list(edited.times) == [0, 1, 2, 3, 3.5, 3.5, 4.5, 5.5, 6.5, 7.5, 8.5, 9.5]
+    assert edited.event(3)['button'] == 'Button.right'
+    assert edited.event(4) == {'type': 'click', 'x': 0, 'y': 0, 'button': 'Button.right', 'pressed': False,
+                               'time': 3.5}
+    assert edited.event(5)['type'] == 'move'
+
+
+def test_splice_of_nothing_is_not_an_edit(editor):
+    editor.splice(3, from_events([]))
+
+    assert not editor.undo_stack
+    assert editor.materialize() is editor.sources[0]
+
+
+def test_undo_restores_every_version(editor):
+    other = from_events(moves([0, 0.25], x=100))
+    edits = [
+        lambda: editor.cut(2, 4),
+        lambda: editor.insert_pause(1, 3),
+        lambda: editor.splice(5, other),
+        lambda: editor.truncate(6),
+        lambda: editor.cut_indices(0, 2),
+    ]
+    versions = [editor.materialize().to_events()]
+    for edit in edits:
+        edit()
+        versions.append(editor.materialize().to_events())
+
+    for version in reversed(versions[:-1]):
+        assert editor.undo()
+        assert editor.materialize().to_events() == version
+    assert not editor.undo()
+    assert editor.materialize() is editor.sources[0]
+
+
+def test_edits_never_modify_the_source(editor):
+    source = editor.sources[0]
+    before = source.to_events()
+    editor.cut(1, 3)
+    editor.insert_pause(2, 1)
+    editor.materialize()
+
+    assert source.to_events() == before
+
+
+def test_last_click_index():
+    events = moves(range(5)) + [click(5, True), click(6, False)] + moves([7, 8])
+    editor = RecordingEditor(from_events(events))
+
+    assert editor.last_click_index(pressed=True) == 5
+    assert editor.last_click_index(pressed=False) == 6
+    editor.truncate(6)
+    assert editor.last_click_index(pressed=False) == -1
+
+
+def test_empty_recording():
+    editor = RecordingEditor(from_events([]))
+
+    assert len(editor) == 0
+    assert editor.duration == 0.0
+    editor.trim_tail(1)
+    editor.cut(0, 1)
+    assert len(editor.materialize()) == 0
+    assert editor.last_click_index(pressed=True) == -1
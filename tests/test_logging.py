@@ -0,0 +1,95 @@
+import logging
+
+import logging_setup
+import pytest
+from logging_setup import RATE_LIMIT_BURST, RateLimitFilter, setup_logging, shutdown_logging
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(level=logging.INFO, lineno=10, msg="moved"):
+    return logging.LogRecord('recmouse', level, 'play.py', lineno, msg, None, None)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def passed(log_filter, records):
+    return [r for r in records if log_filter.filter(r)]
+
+
+def test_burst_per_call_site(clock):
+    log_filter = RateLimitFilter(clock=clock)
+
+    assert len(passed(log_filter, [record() for _ in range(100)])) == RATE_LIMIT_BURST
+    # Another line has its own budget
+    assert len(passed(log_filter, [record(lineno=11) for _ in range(100)])) == RATE_LIMIT_BURST
+
+
+def test_next_window_reports_the_suppressed_count(clock):
+    log_filter = RateLimitFilter(burst=3, clock=clock)
+    passed(log_filter, [record() for _ in range(10)])
+    clock.now = 0.999
+    assert not log_filter.filter(record())
+
+    clock.now = 1.0
+    first = record()
+    assert log_filter.filter(first)
+    assert first.getMessage() == "moved (8 similar messages suppressed)"
+    second = record()
+    assert log_filter.filter(second)
+    assert second.getMessage() == "moved"
+
+
+def test_quiet_site_is_not_annotated(clock):
+    log_filter = RateLimitFilter(burst=3, clock=clock)
+    passed(log_filter, [record() for _ in range(3)])
+    clock.now = 5.0
+    later = record()
+
+    assert log_filter.filter(later)
+    assert later.getMessage() == "moved"
+
+
+def test_warnings_and_errors_are_never_dropped(clock):
+    log_filter = RateLimitFilter(burst=1, clock=clock)
+
+    assert len(passed(log_filter, [record(logging.WARNING) for _ in range(50)])) == 50
+    assert len(passed(log_filter, [record(logging.ERROR) for _ in range(50)])) == 50
+    assert len(passed(log_filter, [record(logging.DEBUG) for _ in range(50)])) == 1
+
+
+def test_level_sets_what_is_limited(clock):
+    log_filter = RateLimitFilter(level=logging.WARNING, burst=1, clock=clock)
+
+    assert len(passed(log_filter, [record(logging.WARNING) for _ in range(50)])) == 1
+    assert len(passed(log_filter, [record(logging.ERROR) for _ in range(50)])) == 50
+
+
+def test_setup_routes_through_the_queue(tmp_path):
+    log_file = tmp_path / "test.log"
+    root = logging.getLogger()
+    level = root.level
+    try:
+        setup_logging(level=logging.INFO, log_file=log_file, console=False)
+        setup_logging(level=logging.INFO, log_file=tmp_path / "ignored.log", console=False)
+        for i in range(3 * RATE_LIMIT_BURST):
+            logging.info(f"event {i}")
+        logging.warning("still there")
+    finally:
+        shutdown_logging()
+        root.setLevel(level)
+
+    lines = log_file.read_text().splitlines()
+    assert sum('event' in line for line in lines) == RATE_LIMIT_BURST
+    assert 'still there' in lines[-1]
+    assert not (tmp_path / "ignored.log").exists()
+    assert logging_setup._listener is None
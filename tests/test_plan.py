@@ -0,0 +1,158 @@
+from array import array
+
+import pytest
+from plan import (
+    MAX_SPEED,
+    MIN_HOLD,
+    MIN_SPEED,
+    OP_MOVE,
+    OP_PRESS,
+    OP_RELEASE,
+    PlaybackPlan,
+    Retimer,
+    clicks_only_plan,
+    compile_plan,
+    retime_plan,
+)
+from recording_format import EVENT_CLICK, EVENT_MOVE, Recording, load_binary, save_recording
+
+
+def recording(rows, button_names=('', 'Button.left', 'Button.right')):
+    """A recording from (time, type, button, pressed) rows, at x = y = the row index."""
+    columns = list(zip(*rows)) if rows else [(), (), (), ()]
+    n = len(rows)
+    return Recording(
+        times=array('d', columns[0]),
+        xs=array('d', range(n)),
+        ys=array('d', range(n)),
+        types=array('B', columns[1]),
+        buttons=array('B', columns[2]),
+        pressed=array('B', columns[3]),
+        button_names=button_names,
+    )
+
+
+def plan(deadlines, ops, buttons=None):
+    n = len(deadlines)
+    return PlaybackPlan(array('d', deadlines), array('B', ops), array('d', range(n)), array('d', range(n)),
+                        array('B', buttons or [1 if op != OP_MOVE else 0 for op in ops]), ['', 'left'])
+
+
+def compile(rec, **kwargs):
+    return compile_plan(rec, resolve_button=str, **kwargs)
+
+
+def test_compile_maps_types_and_flags_to_opcodes():
+    rec = recording([
+        (0.0, EVENT_MOVE, 0, 0),
+        (0.1, EVENT_MOVE, 0, 1),  # A stray pressed flag on a move is still a move
+        (0.2, EVENT_CLICK, 1, 1),
+        (0.3, EVENT_CLICK, 1, 0),
+        (0.4, EVENT_CLICK, 2, 1),
+    ])
+    compiled = compile(rec)
+
+    assert list(compiled.ops) == [OP_MOVE, OP_MOVE, OP_PRESS, OP_RELEASE, OP_PRESS]
+    assert list(compiled.deadlines) == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert compiled.button_objects == (None, 'Button.left', 'Button.right')
+    assert compiled.click_count == 2
+    assert compiled.duration == 0.4
+
+
+def test_compile_counts_deadlines_from_origin():
+    compiled = compile(recording([(10.0, EVENT_MOVE, 0, 0), (10.5, EVENT_MOVE, 0, 0)]), origin=10.0)
+
+    assert list(compiled.deadlines) == [0.0, 0.5]
+
+
+def test_compile_empty_recording():
+    compiled = compile(recording([]))
+
+    assert len(compiled) == 0
+    assert compiled.duration == 0.0
+    assert compiled.click_count == 0
+
+
+def test_plan_outlives_a_closed_mapped_recording(tmp_path):
+    path = tmp_path / "r.rmrec"
+    save_recording(recording([(0.0, EVENT_MOVE, 0, 0), (0.5, EVENT_CLICK, 1, 1)]), path)
+    mapped = load_binary(path)
+    compiled = compile(mapped)
+    mapped.close()
+
+    assert list(compiled.deadlines) == [0.0, 0.5]
+    assert list(compiled.xs) == [0.0, 1.0]
+
+
+def test_plans_are_read_only():
+    compiled = plan([0.0, 1.0], [OP_MOVE, OP_MOVE])
+
+    with pytest.raises(TypeError):
+        compiled.deadlines[0] = 5.0
+
+
+def test_retime_identity_returns_the_plan():
+    original = plan([0.0, 1.0], [OP_MOVE, OP_MOVE])
+
+    assert retime_plan(original) is original
+
+
+def test_retime_divides_gaps_by_speed():
+    retimed = retime_plan(plan([0.0, 1.0, 3.0], [OP_MOVE] * 3), speed=2.0)
+
+    assert list(retimed.deadlines) == [0.0, 0.5, 1.5]
+
+
+def test_max_gap_caps_each_gap():
+    retimed = retime_plan(plan([1.0, 1.25, 6.0, 6.5], [OP_MOVE] * 4), max_gap=0.5)
+
+    assert list(retimed.deadlines) == [0.5, 0.75, 1.25, 1.75]
+
+
+def test_release_keeps_minimum_hold():
+    original = plan([0.0, 0.2, 0.3], [OP_PRESS, OP_RELEASE, OP_MOVE])
+    retimed = retime_plan(original, speed=MAX_SPEED)
+
+    assert retimed.deadlines[1] == pytest.approx(MIN_HOLD)
+    # Later events keep their order after the shifted release
+    assert retimed.deadlines[2] == pytest.approx(MIN_HOLD + 0.1 / MAX_SPEED)
+
+
+def test_short_recorded_hold_is_not_lengthened():
+    retimed = retime_plan(plan([0.0, 0.01], [OP_PRESS, OP_RELEASE]), speed=4.0)
+
+    assert retimed.deadlines[1] == pytest.approx(0.01)
+
+
+def test_retimer_in_pieces_matches_whole():
+    deadlines = [0.0, 0.1, 0.15, 2.0, 2.02, 2.5, 9.0, 9.5]
+    ops = [OP_MOVE, OP_PRESS, OP_MOVE, OP_MOVE, OP_RELEASE, OP_MOVE, OP_PRESS, OP_RELEASE]
+    whole = retime_plan(plan(deadlines, ops), speed=3.0, max_gap=1.0)
+
+    retimer = Retimer(speed=3.0, max_gap=1.0)
+    pieced = []
+    for start, end in ((0, 3), (3, 5), (5, 8)):
+        pieced.extend(retimer.retime(plan(deadlines[start:end], ops[start:end])).deadlines)
+
+    assert pieced == list(whole.deadlines)
+
+
+@pytest.mark.parametrize('speed', [MIN_SPEED / 2, MAX_SPEED * 2])
+def test_speed_out_of_range(speed):
+    with pytest.raises(ValueError):
+        retime_plan(plan([0.0], [OP_MOVE]), speed=speed)
+
+
+def test_clicks_only_keeps_presses_and_releases():
+    original = plan([0.0, 0.1, 0.2, 0.3, 0.4], [OP_MOVE, OP_PRESS, OP_MOVE, OP_RELEASE, OP_MOVE])
+    clicks = clicks_only_plan(original)
+
+    assert list(clicks.ops) == [OP_PRESS, OP_RELEASE]
+    assert list(clicks.deadlines) == [0.1, 0.3]
+    assert list(clicks.xs) == [1.0, 3.0]
+    assert list(clicks.buttons) == [1, 1]
+    assert clicks.button_objects == original.button_objects
+
+
+def test_clicks_only_without_clicks_is_empty():
+    assert len(clicks_only_plan(plan([0.0, 1.0], [OP_MOVE, OP_MOVE]))) == 0
@@ -0,0 +1,111 @@
+import os
+
+import pytest
+from capture import CaptureBuffer
+from recording_format import ROW_SIZE, export_json, from_events, save_recording
+from recording_cache import RecordingCache
+
+
+def moves(*xs):
+    return from_events([{'type': 'move', 'time': i * 0.1, 'x': x, 'y': 0} for i, x in enumerate(xs)])
+
+
+@pytest.fixture(params=['.rmrec', '.json'])
+def saved(request, tmp_path):
+    """Save a recording in one of the formats the cache hashes differently."""
+    path = tmp_path / f"r{request.param}"
+
+    def save(recording):
+        if request.param == '.rmrec':
+            save_recording(recording, path)
+        else:
+            export_json(recording, path)
+        return path
+    return save
+
+
+def test_second_get_is_a_hit(saved):
+    path = saved(moves(1, 2, 3))
+    cache = RecordingCache()
+
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_changed_mtime_reloads(saved):
+    path = saved(moves(1, 2, 3))
+    cache = RecordingCache()
+    first = cache.get(path)
+    saved(moves(4, 5, 6))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    reloaded = cache.get(path)
+    assert reloaded is not first
+    assert list(reloaded.xs) == [4, 5, 6]
+
+
+def test_changed_size_reloads(saved):
+    path = saved(moves(1, 2, 3))
+    cache = RecordingCache()
+    cache.get(path)
+    mtime_ns = path.stat().st_mtime_ns
+    saved(moves(1, 2, 3, 4))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    assert list(cache.get(path).xs) == [1, 2, 3, 4]
+
+
+def test_rewrite_with_same_size_and_mtime_reloads(saved):
+    path = saved(moves(1, 2, 3))
+    cache = RecordingCache()
+    cache.get(path)
+    stat = path.stat()
+    saved(moves(7, 8, 9))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert path.stat().st_size == stat.st_size
+
+    assert cache.peek(path) is None
+    assert list(cache.get(path).xs) == [7, 8, 9]
+
+
+def test_deleted_file_is_dropped(saved):
+    path = saved(moves(1, 2, 3))
+    cache = RecordingCache()
+    cache.get(path)
+    path.unlink()
+
+    assert cache.peek(path) is None
+    assert not cache.known(path)
+
+
+def test_published_capture_is_copied(tmp_path):
+    buffer = CaptureBuffer()
+    for x in (1, 2, 3):
+        buffer.append_move(x * 0.1, x, 0)
+    path = tmp_path / "r.rmrec"
+    save_recording(buffer.view(), path)
+    cache = RecordingCache()
+    cache.publish(path, buffer.view())
+
+    # The recorder reuses its buffer for the next session
+    buffer.clear()
+    buffer.append_move(0.0, 99, 99)
+    assert list(cache.peek(path).xs) == [1, 2, 3]
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    paths = []
+    for name in 'abc':
+        paths.append(tmp_path / f"{name}.rmrec")
+        save_recording(moves(1, 2, 3, 4), paths[-1])
+    cache = RecordingCache(max_bytes=2 * 4 * ROW_SIZE)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+
+    assert [cache.known(path) for path in paths] == [True, False, True]
+    assert cache.stats()['bytes'] == 2 * 4 * ROW_SIZE
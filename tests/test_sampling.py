@@ -0,0 +1,126 @@
+import pytest
+from headless import HeadlessListener
+from record import MouseRecorder, StatusBarApp
+from sampling import DROP, KEEP, KEEP_PENDING, PRESETS, SamplingPolicy
+
+STEP = 0.001  # Seconds between offered moves, well under every preset's max_gap
+
+
+def kept_points(policy, points):
+    """Offer ``points`` in order and return the ones stored, as the recorder would."""
+    kept = []
+    for i, (x, y) in enumerate(points):
+        decision = policy.offer(i * STEP, x, y)
+        if decision == KEEP_PENDING:
+            kept.append((policy.pending_x, policy.pending_y))
+        if decision != DROP:
+            kept.append((x, y))
+    if policy.flush():
+        kept.append((policy.pending_x, policy.pending_y))
+    return kept
+
+
+@pytest.mark.parametrize('start', [(0, 0), (500, 300), (1900, 20)])
+def test_straight_run_collapses_to_its_ends(start):
+    x0, y0 = start
+    points = [(x0 + 5 * i, y0) for i in range(50)]
+
+    assert kept_points(SamplingPolicy(), points) == [points[0], points[-1]]
+
+
+def test_first_sample_sets_no_direction():
+    policy = SamplingPolicy()
+    assert policy.offer(0.0, 500, 300) == KEEP
+    # Moving across the direction of (500, 300) from the origin is still no turn
+    assert policy.offer(STEP, 505, 300) == DROP
+    assert policy.offer(2 * STEP, 510, 300) == DROP
+
+
+def test_corner_is_kept_with_the_turn():
+    policy = SamplingPolicy()
+    points = [(5 * i, 0) for i in range(20)] + [(95, 5 * i) for i in range(1, 20)]
+    kept = kept_points(policy, points)
+
+    assert kept[0] == (0, 0)
+    assert (95, 0) in kept
+    assert kept[-1] == (95, 95)
+
+
+def test_sharp_corner_returns_keep_pending():
+    policy = SamplingPolicy()
+    for i in range(10):
+        policy.offer(i * STEP, 5 * i, 0)
+    assert policy.has_pending
+    assert policy.offer(10 * STEP, 45, 20) == KEEP_PENDING
+    assert (policy.pending_x, policy.pending_y) == (45, 0)
+
+
+def test_jitter_is_dropped():
+    policy = SamplingPolicy(min_distance=2.0)
+    policy.offer(0.0, 100, 100)
+    for i in range(1, 50):
+        assert policy.offer(i * STEP, 100 + (i % 2), 100) == DROP
+    assert policy.kept == 1
+    assert policy.dropped == 49
+
+
+def test_slow_paths_keep_a_sample_every_max_gap():
+    policy = SamplingPolicy(max_gap=0.125)
+    decisions = [policy.offer(i * 0.0625, 5 * i, 0) for i in range(9)]
+
+    # Each gap also keeps the sample dropped in between, which ended the last run
+    assert decisions == [KEEP, DROP, KEEP_PENDING, DROP, KEEP_PENDING, DROP, KEEP_PENDING, DROP, KEEP_PENDING]
+    assert not policy.has_pending
+
+
+def test_idle_gap_keeps_the_end_of_the_flick():
+    policy = SamplingPolicy.preset('balanced')
+    samples = [(i * STEP, 10 * i, 0) for i in range(51)] + [(3.05, 510, 0)]
+    kept = []
+    for t, x, y in samples:
+        decision = policy.offer(t, x, y)
+        if decision == KEEP_PENDING:
+            kept.append((policy.pending_t, policy.pending_x, policy.pending_y))
+        if decision != DROP:
+            kept.append((t, x, y))
+
+    assert kept == [(0.0, 0, 0), (50 * STEP, 500, 0), (3.05, 510, 0)]
+    assert policy.kept + policy.dropped == len(samples)
+
+
+def test_stopping_keeps_the_last_move():
+    recorder = MouseRecorder(StatusBarApp(), listener_factory=HeadlessListener)
+    recorder.start_recording()
+    for i in range(20):
+        recorder.mouse_listener.feed_move(5 * i, 0)
+    recorder.stop_recording()
+
+    recording = recorder.editor.materialize()
+    assert list(zip(recording.xs, recording.ys)) == [(0, 0), (95, 0)]
+
+
+def test_counts_add_up():
+    policy = SamplingPolicy()
+    points = [(i * 3, (i * i) % 40) for i in range(200)]
+    kept = kept_points(policy, points)
+
+    assert policy.kept == len(kept)
+    assert policy.kept + policy.dropped == len(points)
+
+
+def test_reset_forgets_the_last_run():
+    policy = SamplingPolicy()
+    kept_points(policy, [(5 * i, 0) for i in range(20)])
+    policy.reset()
+
+    assert (policy.kept, policy.dropped, policy.has_pending) == (0, 0, False)
+    assert policy.offer(0.0, 0, 500) == KEEP
+    # Perpendicular to the previous session's run, but there is no run yet
+    assert policy.offer(STEP, 0, 505) == DROP
+
+
+@pytest.mark.parametrize('name', sorted(PRESETS))
+def test_presets(name):
+    policy = SamplingPolicy.preset(name)
+    assert policy.max_gap == PRESETS[name]['max_gap']
+    assert kept_points(policy, [(10 * i, 0) for i in range(30)]) == [(0, 0), (290, 0)]
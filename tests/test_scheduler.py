@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+from scheduler import PlaybackCancelled, PlaybackScheduler, lateness_summary
+from simulate import VirtualClock
+
+SPIN = 0.002
+TICK = 0.0001  # How far the clock moves per spin
+
+
+class FakeClock:
+    """A clock that logs every sleep and moves only by it, a tick per spin."""
+
+    def __init__(self, start=100.0):
+        self.now = start
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds if seconds > 0 else TICK
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = PlaybackScheduler(spin_threshold=SPIN, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    return scheduler
+
+
+def test_sleeps_coarsely_then_spins_to_the_deadline(scheduler, clock):
+    lateness = scheduler.wait_until(0.5)
+
+    assert clock.sleeps[0] == pytest.approx(0.5 - SPIN)
+    assert all(seconds == 0 for seconds in clock.sleeps[1:])
+    assert len(clock.sleeps) - 1 == pytest.approx(SPIN / TICK, abs=1)
+    assert 0 <= lateness < TICK
+    assert clock.now - 100.0 == pytest.approx(0.5, abs=TICK)
+
+
+def test_work_between_events_does_not_shift_later_deadlines(scheduler, clock):
+    fired = []
+    for offset in (0.1, 0.2, 0.3, 0.4):
+        scheduler.wait_until(offset)
+        fired.append(clock.now - 100.0)
+        clock.now += 0.03  # The event itself takes a while
+
+    assert fired == pytest.approx([0.1, 0.2, 0.3, 0.4], abs=TICK)
+
+
+def test_late_events_fire_at_once_and_record_lateness(scheduler, clock):
+    clock.now += 0.25
+    lateness = [scheduler.wait_until(offset) for offset in (0.1, 0.2, 0.3)]
+
+    assert clock.sleeps[0] == pytest.approx(0.05 - SPIN)
+    assert lateness[:2] == pytest.approx([0.15, 0.05])
+    assert list(scheduler.lateness) == lateness
+    # Lateness never carries over into the next deadline
+    assert 0 <= lateness[2] < TICK
+
+
+def test_start_resets_the_anchor_and_lateness(scheduler, clock):
+    scheduler.wait_until(1.0)
+    clock.now += 5.0
+    scheduler.start()
+
+    assert len(scheduler.lateness) == 0
+    scheduler.wait_until(0.5)
+    assert clock.now - 106.0 == pytest.approx(0.5, abs=TICK)
+
+
+def test_cancel_raises_before_the_deadline(scheduler, clock):
+    scheduler.cancelled.set()
+
+    with pytest.raises(PlaybackCancelled):
+        scheduler.wait_until(10.0)
+    with pytest.raises(PlaybackCancelled):
+        scheduler.wait_until(-1.0)
+    assert scheduler.pause(1.0) is True
+    assert len(scheduler.lateness) == 0
+
+
+def test_real_sleep_waits_on_the_cancel_event():
+    cancelled = threading.Event()
+    scheduler = PlaybackScheduler(cancelled=cancelled)
+    scheduler.start()
+    threading.Timer(0.01, cancelled.set).start()
+
+    # Would take a minute if the coarse wait weren't woken by the event
+    with pytest.raises(PlaybackCancelled):
+        scheduler.wait_until(60.0)
+
+
+def test_fire_all_matches_waiting_per_event():
+    offsets = [0.0, 0.5, 0.25, 0.75, 0.75, 2.0]
+    clock = VirtualClock(start=10.0)
+    scheduler = PlaybackScheduler(spin_threshold=0.0, clock=clock, sleep=clock.sleep)
+    scheduler.start()
+    clock.now += 0.1  # Starts late
+
+    times = scheduler.fire_all(offsets)
+    # Out-of-order deadlines fire right after the one before them
+    assert list(times) == pytest.approx([10.1, 10.5, 10.5, 10.75, 10.75, 12.0])
+    assert list(scheduler.lateness) == pytest.approx([0.1, 0.0, 0.25, 0.0, 0.0, 0.0])
+    assert clock() == times[-1]
+
+
+def test_lateness_summary():
+    summary = lateness_summary([0.004, 0.001, 0.002, 0.003])
+
+    assert summary['count'] == 4
+    assert summary['mean_ms'] == pytest.approx(2.5)
+    assert summary['p50_ms'] == pytest.approx(2.0)
+    assert summary['max_ms'] == pytest.approx(4.0)
+    assert lateness_summary([])['count'] == 0
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+from capture import CaptureBuffer
+from recording_format import BYTE_COLUMNS, EVENT_CLICK, FLOAT_COLUMNS, load_binary
+from segments import SEGMENT_SUFFIX, SegmentWriter, finalize_segment, recover_segments
+
+
+def column_bytes(recording):
+    return {name: memoryview(getattr(recording, name)).tobytes() for name in FLOAT_COLUMNS + BYTE_COLUMNS}
+
+
+def capture(recording, buffer):
+    """Append ``recording`` to ``buffer`` as the recorder's callbacks would."""
+    for t, x, y, kind, button, pressed in zip(recording.times, recording.xs, recording.ys,
+                                              recording.types, recording.buttons, recording.pressed):
+        if kind == EVENT_CLICK:
+            buffer.append_click(t, x, y, recording.button_names[button], bool(pressed))
+        else:
+            buffer.append_move(t, x, y)
+    return buffer
+
+
+@pytest.fixture
+def writer(tmp_path):
+    # Flushed by hand; the background thread never gets to run
+    path = tmp_path / f"session{SEGMENT_SUFFIX}"
+    writer = SegmentWriter(CaptureBuffer(), threading.Lock(), path, flush_interval=3600)
+    writer.start()
+    yield writer
+    if not writer._file.closed:
+        writer.close()
+
+
+def test_holdback_keeps_the_tail_in_memory(writer, random_recording):
+    recording = random_recording(1000)
+    capture(recording, writer.buffer)
+    cutoff = recording.times[-1] - 2.0
+
+    written = writer.flush(holdback=2.0)
+    assert written == sum(1 for t in recording.times if t <= cutoff)
+    assert writer.buffer.length == len(recording) - written
+
+
+def test_finalized_segment_matches_the_capture(tmp_path, writer, random_recording):
+    recording = random_recording(3000)
+    capture(recording.slice(0, 1000), writer.buffer)
+    writer.flush()
+    capture(recording.slice(1000, len(recording)), writer.buffer)
+    writer.flush(holdback=1.0)
+    writer.close()
+
+    out = tmp_path / "session.rmrec"
+    assert finalize_segment(writer.path, out) == len(recording)
+    assert column_bytes(load_binary(out)) == column_bytes(recording)
+
+
+def test_close_writes_the_edited_tail(tmp_path, writer, random_recording):
+    recording = random_recording(1000)
+    capture(recording, writer.buffer)
+    writer.flush(holdback=2.0)
+    tail = writer.buffer.view().slice(0, 10)
+    writer.close(tail=tail)
+
+    out = tmp_path / "session.rmrec"
+    kept = len(recording) - writer.buffer.length + 10
+    assert finalize_segment(writer.path, out) == kept
+    assert column_bytes(load_binary(out)) == column_bytes(recording.slice(0, kept))
+
+
+def test_recovery_skips_segments_still_being_written(tmp_path, writer, random_recording):
+    capture(random_recording(100), writer.buffer)
+    writer.flush()
+
+    assert recover_segments(tmp_path) == []
+    assert writer.path.exists()
+    assert not writer.path.with_suffix('.rmrec').exists()
+
+
+def test_recovery_after_a_crash_keeps_the_intact_blocks(tmp_path, writer, random_recording):
+    recording = random_recording(2000)
+    capture(recording.slice(0, 1500), writer.buffer)
+    writer.flush()
+    capture(recording.slice(1500, len(recording)), writer.buffer)
+    writer.flush()
+    # The recorder dies halfway through its next block
+    writer.stop()
+    writer._file.write(b'\x10\x00\x00\x00\x02\x00\x00\x00[]\x00\x01')
+    writer._file.close()
+
+    recovered = recover_segments(tmp_path)
+    assert recovered == [writer.path.with_suffix('.rmrec')]
+    assert column_bytes(load_binary(recovered[0])) == column_bytes(recording)
+    assert not writer.path.exists()
+
+
+def test_recovery_discards_empty_segments(tmp_path, writer):
+    writer.close()
+
+    assert recover_segments(tmp_path) == []
+    assert list(tmp_path.glob('session*')) == []
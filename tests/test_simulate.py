@@ -0,0 +1,151 @@
+import logging
+import sys
+
+import cli
+import pytest
+from logging_setup import shutdown_logging
+from recording_format import from_events, save_recording
+from simulate import VirtualClock, simulate, simulated_player
+
+EVENTS = [
+    {'type': 'move', 'time': 0.0, 'x': 1, 'y': 2},
+    {'type': 'click', 'time': 0.5, 'x': 3, 'y': 4, 'button': 'Button.left', 'pressed': True},
+    {'type': 'click', 'time': 0.51, 'x': 3, 'y': 4, 'button': 'Button.left', 'pressed': False},
+    {'type': 'move', 'time': 2.0, 'x': 5, 'y': 6},
+]
+
+
+@pytest.fixture
+def recording_file(tmp_path):
+    path = tmp_path / "clicks.rmrec"
+    save_recording(from_events(EVENTS), path)
+    return path
+
+
+def one_run(start=0.0):
+    """The timeline of EVENTS played once from ``start``: each press and release follows its move."""
+    return [
+        (start + 0.0, 'move', 1.0, 2.0, ''),
+        (start + 0.5, 'move', 3.0, 4.0, ''),
+        (start + 0.5, 'press', 3.0, 4.0, 'Button.left'),
+        (start + 0.51, 'move', 3.0, 4.0, ''),
+        (start + 0.51, 'release', 3.0, 4.0, 'Button.left'),
+        (start + 2.0, 'move', 5.0, 6.0, ''),
+    ]
+
+
+def assert_timeline(simulation, expected):
+    rows = list(simulation.rows())
+    assert [row[1:] for row in rows] == [row[1:] for row in expected]
+    assert [row[0] for row in rows] == pytest.approx([row[0] for row in expected], abs=1e-12)
+
+
+def test_virtual_clock_only_moves_when_slept_on():
+    clock = VirtualClock(start=1.0)
+    assert clock() == 1.0
+    clock.sleep(0.25)
+    assert clock() == 1.25
+    clock.advance_to(1.0)
+    assert clock() == 1.25
+    clock.sleep(0)
+    assert 1.25 < clock() < 1.25 + 1e-12
+
+
+@pytest.mark.parametrize('per_event', [False, True])
+def test_repeats_are_gap_apart(recording_file, per_event):
+    simulation = simulate(simulated_player(per_event=per_event), recording_file, repeat_count=2, gap=1.0)
+
+    assert simulation.success
+    assert_timeline(simulation, one_run() + one_run(start=3.0))
+    assert simulation.simulated_s == pytest.approx(5.0)
+    assert simulation.summary()['presses'] == 2
+    assert simulation.summary()['releases'] == 2
+
+
+@pytest.mark.parametrize('per_event', [False, True])
+def test_speed_keeps_minimum_hold(recording_file, per_event):
+    player = simulated_player(per_event=per_event)
+    player.speed = 2.0
+    simulation = simulate(player, recording_file)
+
+    # The 10 ms hold would be 5 ms at 2x, so the release keeps the recorded 10 ms
+    # and the last move follows (2.0 - 0.51) / 2 after it
+    assert_timeline(simulation, [
+        (0.0, 'move', 1.0, 2.0, ''),
+        (0.25, 'move', 3.0, 4.0, ''),
+        (0.25, 'press', 3.0, 4.0, 'Button.left'),
+        (0.26, 'move', 3.0, 4.0, ''),
+        (0.26, 'release', 3.0, 4.0, 'Button.left'),
+        (0.26 + 0.745, 'move', 5.0, 6.0, ''),
+    ])
+
+
+def test_max_gap_caps_idle_time(recording_file):
+    player = simulated_player()
+    player.max_gap = 0.25
+    simulation = simulate(player, recording_file)
+
+    assert [row[0] for row in simulation.rows()] == pytest.approx([0.0, 0.25, 0.25, 0.26, 0.26, 0.51])
+
+
+def test_clicks_only_jumps_between_clicks(recording_file):
+    player = simulated_player()
+    player.clicks_only = True
+    simulation = simulate(player, recording_file)
+
+    assert_timeline(simulation, one_run()[1:5])
+
+
+def test_section_counts_from_its_start(recording_file):
+    player = simulated_player()
+    plan, error_msg = player.load_plan(recording_file, start=0.4, end=1.0)
+    assert error_msg is None
+    assert player.play_plan(plan) == (True, None)
+
+    rows = list(player.mouse.times)
+    assert rows == pytest.approx([0.1, 0.1, 0.11, 0.11])
+
+
+def test_missing_recording_fails_without_actions(tmp_path):
+    simulation = simulate(simulated_player(), tmp_path / "missing.rmrec")
+
+    assert not simulation.success
+    assert simulation.error_msg
+    assert len(simulation) == 0
+
+
+def test_batch_matches_per_event(tmp_path, random_recording):
+    path = tmp_path / "random.rmrec"
+    save_recording(random_recording(2000, seed=3, click_every=50), path)
+
+    batch = simulate(simulated_player(), path, repeat_count=2, gap=0.5).timeline
+    per_event = simulate(simulated_player(per_event=True), path, repeat_count=2, gap=0.5).timeline
+
+    assert batch.kinds == per_event.kinds
+    assert batch.xs == per_event.xs
+    assert batch.ys == per_event.ys
+    assert list(batch.times) == pytest.approx(list(per_event.times), abs=1e-9)
+
+
+def test_timeline_csv(tmp_path, recording_file):
+    simulation = simulate(simulated_player(), recording_file)
+    path = tmp_path / "timeline.csv"
+    simulation.write_csv(path)
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == 'time,action,x,y,button'
+    assert lines[3] == '0.5,press,3.0,4.0,Button.left'
+    assert len(lines) == 1 + len(simulation)
+
+
+@pytest.mark.parametrize('command', [['simulate'], ['play', '--headless', '--speed', '8']])
+def test_cli_runs_without_pynput(recording_file, monkeypatch, capsys, command):
+    monkeypatch.setitem(sys.modules, 'pynput', None)
+    level = logging.getLogger().level
+    try:
+        assert cli.main(command + [str(recording_file)]) == 0
+    finally:
+        # play sets up logging for the whole process
+        shutdown_logging()
+        logging.getLogger().setLevel(level)
+    assert 'Failed' not in capsys.readouterr().err
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from headless import ACTION_MOVE, ACTION_PRESS, ACTION_RELEASE, HeadlessController
+from play import MousePlayer
+from recording_format import from_events, save_recording
+
+# A button held across a long gap, so a stop always lands while it is down
+HELD = [
+    {'type': 'move', 'time': 0.0, 'x': 1, 'y': 2},
+    {'type': 'click', 'time': 0.01, 'x': 1, 'y': 2, 'button': 'Button.left', 'pressed': True},
+    {'type': 'move', 'time': 0.02, 'x': 3, 'y': 4},
+    {'type': 'click', 'time': 60.0, 'x': 3, 'y': 4, 'button': 'Button.left', 'pressed': False},
+]
+TIMEOUT = 5.0  # Seconds; generous, a stop normally takes a few milliseconds
+
+
+@pytest.fixture
+def held_file(tmp_path):
+    path = tmp_path / "held.rmrec"
+    save_recording(from_events(HELD), path)
+    return path
+
+
+def wait_for(condition):
+    deadline = time.perf_counter() + TIMEOUT
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def play_in_background(player, path, **kwargs):
+    plan, error_msg = player.load_plan(path)
+    assert error_msg is None
+    results = []
+    thread = threading.Thread(target=lambda: results.append(player.play_plan(plan, **kwargs)))
+    thread.start()
+    return thread, results
+
+
+def test_stop_mid_gap_releases_the_held_button(held_file):
+    controller = HeadlessController()
+    player = MousePlayer(controller=controller)
+    thread, results = play_in_background(player, held_file)
+    wait_for(lambda: len(controller) == 4)  # Everything up to the gap: the press comes with its own move
+
+    player.stop()
+    thread.join(TIMEOUT)
+
+    assert not thread.is_alive()
+    assert results == [(False, None)]
+    assert list(controller.kinds) == [ACTION_MOVE, ACTION_MOVE, ACTION_PRESS, ACTION_MOVE, ACTION_RELEASE]
+    assert controller.button_names[controller.buttons[-1]] == 'Button.left'
+    assert player.last_stop_latency < TIMEOUT
+    assert player.stats()['counters']['stops'] == 1
+
+
+def test_stop_between_repeats(tmp_path):
+    path = tmp_path / "short.rmrec"
+    save_recording(from_events(HELD[:3]), path)
+    controller = HeadlessController()
+    player = MousePlayer(controller=controller)
+    thread, results = play_in_background(player, path, repeat_count=3, gap=60.0)
+    wait_for(lambda: player.stats()['counters'].get('iterations') == 1)
+
+    player.stop()
+    thread.join(TIMEOUT)
+
+    assert not thread.is_alive()
+    assert results == [(False, None)]
+    # The section ends with the button down: it is released at the end of the run, not pressed again
+    assert list(controller.kinds).count(ACTION_PRESS) == 1
+    assert list(controller.kinds).count(ACTION_RELEASE) == 1
+
+
+def test_stopped_player_starts_again_after_reset(tmp_path):
+    path = tmp_path / "short.rmrec"
+    save_recording(from_events(HELD[:3]), path)
+    player = MousePlayer(controller=HeadlessController())
+    player.stop()
+    plan, _ = player.load_plan(path)
+
+    assert player.play_plan(plan) == (False, None)
+    player.reset_stop()
+    assert player.play_plan(plan) == (True, None)
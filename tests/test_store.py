@@ -0,0 +1,193 @@
+import math
+from array import array
+
+import pytest
+import store
+from recording_format import (
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    MANIFEST_SUFFIX,
+    Recording,
+    load_recording,
+    read_summary,
+    save_as,
+    summarize,
+)
+from store import (
+    ENCODING_ABSOLUTE,
+    ENCODING_DELTA,
+    MAX_CHUNK,
+    MIN_CHUNK,
+    RecordingStore,
+    chunk_boundaries,
+    decode_chunk,
+    encode_chunk,
+)
+
+
+def column_bytes(recording):
+    # Compared as bytes, so NaNs and signed zeros must match bit for bit
+    return {name: memoryview(getattr(recording, name)).tobytes() for name in FLOAT_COLUMNS + BYTE_COLUMNS}
+
+
+def concatenate(*recordings):
+    columns = {name: array('d') for name in FLOAT_COLUMNS}
+    columns.update({name: array('B') for name in BYTE_COLUMNS})
+    offset = 0.0
+    for recording in recordings:
+        columns['times'].extend(t + offset for t in recording.times)
+        offset = columns['times'][-1]
+        for name in ('xs', 'ys') + BYTE_COLUMNS:
+            columns[name].extend(getattr(recording, name))
+    return Recording(button_names=recordings[0].button_names, **columns)
+
+
+@pytest.fixture
+def recording_store(tmp_path):
+    return RecordingStore(tmp_path / "store")
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def hashing(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(store, 'np', None)
+    elif store.np is None:
+        pytest.skip("numpy is not installed")
+    return request.param
+
+
+def test_boundaries_cover_the_recording(random_recording, hashing):
+    recording = random_recording(20000)
+    boundaries = chunk_boundaries(recording)
+
+    assert boundaries[-1] == len(recording)
+    sizes = [end - start for start, end in zip([0] + boundaries, boundaries)]
+    assert all(MIN_CHUNK <= size <= MAX_CHUNK for size in sizes[:-1])
+    assert 0 < sizes[-1] <= MAX_CHUNK
+
+
+def test_numpy_and_python_cut_the_same_chunks(random_recording, monkeypatch):
+    if store.np is None:
+        pytest.skip("numpy is not installed")
+    recording = random_recording(20000, seed=7)
+    with_numpy = chunk_boundaries(recording)
+    monkeypatch.setattr(store, 'np', None)
+
+    assert chunk_boundaries(recording) == with_numpy
+
+
+def test_boundaries_depend_only_on_the_last_window(random_recording, hashing, monkeypatch):
+    # With no size limits every place the rolling hash picks is a boundary
+    monkeypatch.setattr(store, 'MIN_CHUNK', 1)
+    monkeypatch.setattr(store, 'MAX_CHUNK', 1 << 30)
+    recording = random_recording(20000, seed=11)
+    boundaries = chunk_boundaries(recording)
+    boundary = boundaries[len(boundaries) // 2]
+
+    # Rows are hashed as deltas, so an event also depends on the x of the one before it
+    variant = recording.slice(0, len(recording))
+    for i in range(boundary - store.WINDOW - 1):
+        variant.xs[i] = -1.0 - i
+    assert boundary in chunk_boundaries(variant)
+
+
+def test_small_recordings_are_one_chunk(random_recording):
+    assert chunk_boundaries(random_recording(MIN_CHUNK - 1, click_every=MIN_CHUNK)) == [MIN_CHUNK - 1]
+    assert chunk_boundaries(random_recording(0)) == []
+
+
+def test_chunk_round_trip_delta(random_recording):
+    recording = random_recording(1000)
+    payload = encode_chunk(recording, 400, 700)
+    previous = tuple(getattr(recording, name)[399] for name in FLOAT_COLUMNS)
+    decoded = decode_chunk(payload, previous)
+
+    assert payload[0] == ENCODING_DELTA
+    assert {name: column.tobytes() for name, column in decoded.items()} == column_bytes(recording.slice(400, 700))
+
+
+def test_chunk_falls_back_to_absolute_when_deltas_are_inexact():
+    values = [0.1, 1e16, 0.3, -0.0, math.inf, math.nan]
+    recording = Recording(
+        times=array('d', range(len(values))), xs=array('d', values), ys=array('d', reversed(values)),
+        types=array('B', bytes(len(values))), buttons=array('B', bytes(len(values))),
+        pressed=array('B', bytes(len(values))), button_names=[''],
+    )
+    payload = encode_chunk(recording, 0, len(values))
+    decoded = decode_chunk(payload, (0.0, 0.0, 0.0))
+
+    assert payload[0] == ENCODING_ABSOLUTE
+    assert {name: column.tobytes() for name, column in decoded.items()} == column_bytes(recording)
+
+
+def test_save_and_load_round_trip(recording_store, random_recording):
+    recording = random_recording(5000)
+    written = recording_store.save('session', recording)
+    loaded = recording_store.load('session')
+
+    assert written['chunks'] == written['new_chunks'] == len(chunk_boundaries(recording))
+    assert column_bytes(loaded) == column_bytes(recording)
+    assert loaded.button_names == recording.button_names
+    assert recording_store.names() == ['session']
+
+
+def test_variants_only_write_new_chunks(recording_store, random_recording):
+    base = random_recording(20000, seed=1)
+    recording_store.save('base', base)
+    variant = concatenate(base.slice(0, 15000), random_recording(2000, seed=2))
+    written = recording_store.save('variant', variant)
+
+    assert written['new_chunks'] < written['chunks'] / 2
+    assert column_bytes(recording_store.load('variant')) == column_bytes(variant)
+    assert recording_store.save('base', base)['new_chunks'] == 0
+
+
+def test_gc_removes_only_unreferenced_chunks(recording_store, random_recording):
+    kept = random_recording(5000, seed=1)
+    recording_store.save('a', kept)
+    recording_store.save('b', random_recording(5000, seed=2))
+    recording_store.delete('b')
+
+    assert recording_store.gc(grace=3600) == (0, 0)
+    removed, freed = recording_store.gc(dry_run=True, grace=0)
+    assert removed and freed
+    assert recording_store.gc(grace=0) == (removed, freed)
+    assert recording_store.gc(grace=0) == (0, 0)
+    assert column_bytes(recording_store.load('a')) == column_bytes(kept)
+
+
+def test_corrupted_chunk_is_detected(recording_store, random_recording):
+    recording_store.save('a', random_recording(500))
+    chunk = next(recording_store._chunk_files())
+    chunk.write_bytes(store.zlib.compress(b'\0' * 100))
+
+    with pytest.raises(ValueError):
+        recording_store.load('a')
+
+
+@pytest.mark.parametrize('name', ['', '.hidden', 'a/b'])
+def test_invalid_names(recording_store, random_recording, name):
+    with pytest.raises(ValueError):
+        recording_store.save(name, random_recording(10))
+
+
+def test_manifest_paths_work_like_recording_files(tmp_path, random_recording):
+    recording = random_recording(3000)
+    path = tmp_path / "store" / store.MANIFEST_DIRNAME / f"walk{MANIFEST_SUFFIX}"
+    save_as(recording, path)
+
+    assert column_bytes(load_recording(path)) == column_bytes(recording)
+    summary = read_summary(path)
+    expected = summarize(recording)
+    assert {key: summary[key] for key in expected} == expected
+
+
+def test_stats(recording_store, random_recording):
+    recording = random_recording(5000)
+    recording_store.save('a', recording)
+    recording_store.save('copy', recording)
+    stats = recording_store.stats()
+
+    assert stats['recordings'] == 2
+    assert stats['events'] == 2 * len(recording)
+    assert stats['stored_bytes'] < stats['logical_bytes'] / 2
@@ -0,0 +1,129 @@
+import builtins
+import json
+
+import pytest
+import streaming
+from archive import BLOCK_EVENTS
+from recording_format import (
+    BYTE_COLUMNS,
+    FLOAT_COLUMNS,
+    MANIFEST_SUFFIX,
+    RecordingFormatError,
+    export_json,
+    save_as,
+    save_recording,
+)
+from store import MAX_CHUNK
+from streaming import CHUNK_EVENTS, FIRST_CHUNK_EVENTS, iter_chunks, iter_json_events
+
+
+def write(tmp_path, text, name="r.json"):
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+def column_bytes(recording):
+    return {name: memoryview(getattr(recording, name)).tobytes() for name in FLOAT_COLUMNS + BYTE_COLUMNS}
+
+
+@pytest.fixture
+def events(random_recording):
+    return random_recording(3000).to_events()
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 100, 1 << 16])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_events_round_trip(tmp_path, events, read_size, indent):
+    path = write(tmp_path, json.dumps(events, indent=indent))
+
+    assert list(iter_json_events(path, read_size)) == events
+
+
+@pytest.mark.parametrize('text', ['[]', '  [ \n ]  ', '[\n]'])
+def test_empty_lists(tmp_path, text):
+    assert list(iter_json_events(write(tmp_path, text), read_size=1)) == []
+
+
+@pytest.mark.parametrize('text', ['', '   ', '{"events": []}', '[{"type": "move"}, ', '[{"type": "mo'])
+def test_malformed_files_raise_format_errors(tmp_path, text):
+    with pytest.raises(RecordingFormatError):
+        list(iter_json_events(write(tmp_path, text), read_size=4))
+
+
+def test_events_before_an_error_are_still_yielded(tmp_path, events):
+    text = json.dumps(events[:10])[:-1] + ', {"type": nope}]'
+    reader = iter_json_events(write(tmp_path, text), read_size=64)
+
+    assert [next(reader) for _ in range(10)] == events[:10]
+    with pytest.raises(RecordingFormatError):
+        next(reader)
+
+
+def test_malformed_event_fails_without_reading_on(tmp_path, events, monkeypatch):
+    # A broken event far from the end of the buffer is not cut off, so reading more can't help
+    text = '[{"type": nope}, ' + json.dumps(events)[1:]
+    path = write(tmp_path, text)
+    reads = []
+
+    class CountingFile:
+        def __init__(self, f):
+            self.f = f
+
+        def read(self, size):
+            reads.append(size)
+            return self.f.read(size)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.f.close()
+
+    monkeypatch.setattr(streaming, 'open', lambda *args: CountingFile(builtins.open(*args)), raising=False)
+    with pytest.raises(RecordingFormatError):
+        list(iter_json_events(path, read_size=4096))
+
+    assert len(text) > 10 * 4096
+    assert len(reads) == 1
+
+
+@pytest.mark.parametrize('suffix', ['.json', '.rmrec', '.rmz', MANIFEST_SUFFIX])
+def test_chunks_in_every_format_match_the_recording(tmp_path, random_recording, suffix):
+    recording = random_recording(20000)
+    path = tmp_path / "store" / "manifests" / f"r{suffix}"
+    path.parent.mkdir(parents=True)
+    if suffix == '.json':
+        export_json(recording, path)
+    else:
+        save_as(recording, path)
+
+    chunks = list(iter_chunks(path))
+    assert sum(len(chunk) for chunk in chunks) == len(recording)
+    assert all(len(chunk) <= max(CHUNK_EVENTS, BLOCK_EVENTS, MAX_CHUNK) for chunk in chunks)
+    joined = {name: b''.join(memoryview(getattr(chunk, name)).tobytes() for chunk in chunks)
+              for name in FLOAT_COLUMNS + BYTE_COLUMNS}
+    assert joined == column_bytes(recording)
+
+
+def test_binary_chunks_start_small_and_grow(tmp_path, random_recording):
+    recording = random_recording(20000)
+    path = tmp_path / "r.rmrec"
+    save_recording(recording, path)
+
+    sizes = [len(chunk) for chunk in iter_chunks(path)]
+    assert sizes[0] == FIRST_CHUNK_EVENTS
+    assert sizes[1] == 2 * FIRST_CHUNK_EVENTS
+    assert max(sizes) <= CHUNK_EVENTS
+
+
+def test_sections_cut_chunks_by_time(tmp_path, random_recording):
+    recording = random_recording(5000)
+    path = tmp_path / "r.json"
+    export_json(recording, path)
+    start, end = recording.times[1000], recording.times[3000]
+
+    chunks = list(iter_chunks(path, start=start, end=end))
+    assert sum(len(chunk) for chunk in chunks) == 2000
+    assert chunks[0].times[0] == start
+    assert chunks[-1].times[-1] < end